@@ -4,11 +4,16 @@ Credenciales admin:
     Contrasena: admin123
 """
 
+# primer import: marca el inicio para el informe de tiempos de arranque
+from controllers.tiempos_arranque import tiempos
+import os
 import sys
 from PyQt5.QtWidgets import QApplication, QDialog
+from PyQt5.QtCore import QTimer
+# solo lo que necesita el login; el resto (vigilante, tema, temporizadores y lo que
+# importan) se prepara al aceptarlo
 from controllers.datos_controller import cargar_datos
 from controllers.login_controller import ControladorLogin
-from controllers.principal_controller import ControladorPrincipal
 
 
 class Aplicacion:
@@ -18,22 +23,137 @@ class Aplicacion:
         self.app = QApplication(sys.argv)
         self.app.setStyle("Fusion")
         self.ventana = None
+        self.datos = None
+        # se crean en preparar_sesion, tras el primer login
+        self.vigilante = None
+        tiempos.marcar("qapplication lista")
+
+    def preparar_sesion(self):
+        """tema, guardados agrupados, barrido de papelera y vigilancia de datos.json (una vez)"""
+        if self.vigilante is not None:
+            return
+        from PyQt5.QtCore import QFileSystemWatcher
+        from controllers.datos_controller import persistencia, compartido
+        from controllers.tema import aplicar_tema
+        aplicar_tema(self.app)
+
+        # los guardados agrupados se programan en el bucle de eventos de qt
+        persistencia.programador = QTimer.singleShot
+        self.app.aboutToQuit.connect(persistencia.guardar_pendiente)
+
+        # barrido periodico de la papelera (solo mira las tareas caducadas) y de las
+        # completadas que pasan al archivo
+        self.temporizador_purga = QTimer()
+        self.temporizador_purga.timeout.connect(self.purgar_papelera)
+
+        # otras instancias pueden escribir el mismo datos.json: se vigila el archivo
+        # y su carpeta (un reemplazo atomico saca al archivo de la lista de vigilados)
+        self.vigilante = QFileSystemWatcher()
+        self.vigilante.fileChanged.connect(self.al_cambiar_archivo)
+        self.vigilante.directoryChanged.connect(self.al_cambiar_archivo)
+        # los avisos seguidos (temporal, renombrado...) se juntan en una sola recarga
+        self.temporizador_recarga = QTimer()
+        self.temporizador_recarga.setSingleShot(True)
+        self.temporizador_recarga.setInterval(300)
+        self.temporizador_recarga.timeout.connect(self.recargar_datos)
+        compartido.avisar = self.avisar_cambios
+        tiempos.marcar("sesion preparada")
 
     def iniciar(self):
         """inicia la aplicacion mostrando login"""
         datos = cargar_datos()
+        tiempos.marcar("datos cargados")
 
         login = ControladorLogin(datos)
+        tiempos.marcar_al_mostrar("login visible")
         if login.exec_() == QDialog.Accepted:
+            tiempos.marcar("login aceptado")
+            self.preparar_sesion()
+            # import local: la ventana principal (y lo que importa) no retrasa el login
+            from controllers.principal_controller import ControladorPrincipal
+            tiempos.marcar("ventana principal importada")
             self.ventana = ControladorPrincipal(
                 login.usuario_logueado,
                 datos,
                 self.reiniciar
             )
             self.ventana.show()
+            tiempos.marcar_al_mostrar("ventana principal visible", tiempos.mostrar_informe)
+            self.programar_purga(datos)
+            self.vigilar_datos()
             return True
         return False
 
+    def programar_purga(self, datos):
+        """purga la papelera al poco de entrar y despues cada intervalo_purga_min"""
+        from controllers.datos_controller import CONFIGURACION
+        self.datos = datos
+        minutos = CONFIGURACION["papelera"]["intervalo_purga_min"]
+        if minutos > 0:
+            # el primer barrido espera a que la ventana ya este en uso
+            QTimer.singleShot(60 * 1000, self.purgar_papelera)
+            self.temporizador_purga.start(minutos * 60 * 1000)
+
+    def purgar_papelera(self):
+        """elimina las tareas de papelera que superan los dias de retencion y archiva las completadas antiguas"""
+        from controllers.datos_controller import purgar_papelera_caducada, archivar_completadas, persistencia
+        if persistencia.en_pausa():
+            # importacion o exportacion en curso: se purga cuando termine
+            QTimer.singleShot(1000, self.purgar_papelera)
+            return
+        if self.datos is not None:
+            purgar_papelera_caducada(self.datos)
+            archivadas = archivar_completadas(self.datos)
+            if len(archivadas) > 0:
+                # las vistas abiertas quitan sus tarjetas como si las quitara otra instancia
+                self.avisar_cambios({
+                    "usuarios": False,
+                    "proyectos": set(),
+                    "tareas": {tarea.get("proyecto_id") for tarea in archivadas},
+                    "papelera": False
+                })
+
+    def vigilar_datos(self):
+        """vigila datos.json (si se comparte) y su carpeta"""
+        from controllers.datos_controller import ruta_vigilada
+        ruta = ruta_vigilada()
+        if ruta is None:
+            return
+        vigiladas = self.vigilante.files() + self.vigilante.directories()
+        for vigilada in (ruta, os.path.dirname(os.path.abspath(ruta))):
+            if vigilada not in vigiladas and os.path.exists(vigilada):
+                self.vigilante.addPath(vigilada)
+
+    def al_cambiar_archivo(self, ruta):
+        """aviso del vigilante: la recarga espera a que acaben los avisos"""
+        self.temporizador_recarga.start()
+
+    def recargar_datos(self):
+        """trae los cambios de otra instancia y refresca las vistas afectadas"""
+        from controllers.datos_controller import recargar_datos, persistencia
+        if persistencia.en_pausa():
+            # importacion o exportacion en curso: no se cambian los datos entre sus bloques
+            self.temporizador_recarga.start()
+            return
+        self.vigilar_datos()
+        if self.datos is None:
+            return
+        try:
+            cambios = recargar_datos(self.datos)
+        except (OSError, ValueError):
+            # archivo a medio escribir por otro programa: se reintenta en el proximo aviso
+            return
+        if cambios is not None:
+            self.avisar_cambios(cambios)
+
+    def avisar_cambios(self, cambios):
+        """pasa a la ventana los cambios que entraron de otra instancia"""
+        from controllers.compartido import hay_cambios
+        if self.ventana is not None and hay_cambios(cambios):
+            # al guardar en modo inmediato llega en mitad de una accion de la vista:
+            # se refresca cuando esta termine
+            QTimer.singleShot(0, lambda: self.ventana.al_cambiar_datos(cambios))
+
     def reiniciar(self):
         """reinicia la app para volver al login"""
         self.iniciar()
@@ -1,7 +1,14 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import sys
+sys.path.insert(0, SPECPATH)
+from controllers.vistas_compiladas import compilar_vistas
+
 block_cipher = None
 
+# compila los .ui antes de empaquetar: la aplicacion no lee xml al abrir vistas
+compilar_vistas()
+
 a = Analysis(
     ['Main.py'],
     pathex=['C:\\Repositorios\\Aplicacioncliente'],
@@ -19,6 +26,29 @@ a = Analysis(
         'controllers.principal_controller',
         'controllers.proyecto_controller',
         'controllers.admin_controller',
+        'controllers.repositorio',
+        'controllers.configuracion',
+        'controllers.persistencia',
+        'controllers.almacen_sqlite',
+        'controllers.almacen_fragmentos',
+        'controllers.diario',
+        'controllers.carga_diferida',
+        'controllers.lista_tareas',
+        'controllers.vistas_compiladas',
+        'controllers.tiempos_arranque',
+        'controllers.tema',
+        'controllers.trazas',
+        'controllers.busqueda',
+        'controllers.intercambio',
+        'controllers.compartido',
+        'controllers.protocolo',
+        'controllers.servidor',
+        'controllers.cliente_servidor',
+        'controllers.cambios',
+        'controllers.sincronizacion',
+        'controllers.instantanea_binaria',
+        'controllers.tarea_compacta',
+        'controllers.archivo_completadas',
         'PyQt5',
         'PyQt5.QtWidgets',
         'PyQt5.QtCore',
@@ -0,0 +1,265 @@
+"""
+benchmark de las funciones de controllers/datos_controller.py sobre datos sinteticos
+
+cada escala se genera en una carpeta temporal; el resultado se guarda en json para
+comparar ejecuciones (por defecto en benchmarks/resultados/)
+
+uso:
+    python benchmarks/bench_datos_controller.py
+    python benchmarks/bench_datos_controller.py --escalas pequena mediana grande --salida resultados.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRECTORIO_BENCHMARKS))
+
+from controllers import datos_controller
+from controllers.diario import Diario
+from controllers.persistencia import MODO_SALIDA, escribir_json_atomico
+from controllers.instantanea_binaria import escribir_binario_atomico, abrir_datos_binarios, cargar_instantanea
+from controllers.tarea_compacta import json_por_defecto
+from controllers.almacen_fragmentos import DatosFragmentados, crear_fragmentos
+from controllers.configuracion import CONFIGURACION_DEFECTO
+from generar_datos import ESCALAS, generar_archivo
+
+
+def preparar_controlador(ruta):
+    """apunta datos_controller a un datos.json de prueba con la configuracion por defecto"""
+    datos_controller.ARCHIVO_DATOS = ruta
+    datos_controller.CONFIGURACION = CONFIGURACION_DEFECTO
+    # los cambios solo se marcan; la escritura se mide aparte en guardar_datos
+    datos_controller.MODO_PERSISTENCIA = MODO_SALIDA
+    datos_controller.persistencia.configurar(modo=MODO_SALIDA)
+    datos_controller.diario = Diario(ruta, datos_controller.crear_datos_defecto)
+
+
+def medir(funcion, argumentos):
+    """llama a funcion con cada argumento; devuelve los tiempos en milisegundos"""
+    tiempos = []
+    for argumento in argumentos:
+        inicio = time.perf_counter()
+        funcion(argumento)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def resumen(funcion, tiempos):
+    """fila de resultados de una funcion"""
+    ordenados = sorted(tiempos)
+    return {
+        "funcion": funcion,
+        "repeticiones": len(tiempos),
+        "media_ms": sum(tiempos) / len(tiempos),
+        "mediana_ms": ordenados[len(ordenados) // 2],
+        "min_ms": ordenados[0],
+        "max_ms": ordenados[-1]
+    }
+
+
+def usuario_con_proyectos(datos):
+    """un usuario normal que participa en algun proyecto"""
+    for proyecto in datos_controller.obtener_proyectos(datos):
+        for usuario in proyecto["participantes"]:
+            if not datos_controller.es_admin(datos, usuario):
+                return usuario
+    return "admin"
+
+
+def medir_escala(escala, directorio, repeticiones):
+    """mide todas las funciones en una escala; devuelve la lista de filas"""
+    num_usuarios, num_proyectos, num_tareas = ESCALAS[escala]
+    ruta = os.path.join(directorio, "datos_" + escala + ".json")
+    generar_archivo(ruta, num_usuarios, num_proyectos, num_tareas)
+    preparar_controlador(ruta)
+
+    filas = []
+
+    # carga: lo que necesita el login y la carga completa de todas las secciones
+    filas.append(resumen("cargar_datos", medir(lambda i: datos_controller.cargar_datos(), range(repeticiones))))
+    filas.append(resumen("cargar_datos_completo", medir(
+        lambda i: datos_controller.obtener_papelera(datos_controller.cargar_datos()), range(repeticiones)
+    )))
+
+    datos = datos_controller.cargar_datos()
+    usuario = usuario_con_proyectos(datos)
+
+    # consultas: la primera llamada construye indices y feed
+    filas.append(resumen("obtener_tareas_usuario_en_frio", medir(
+        lambda i: datos_controller.obtener_tareas_usuario(datos, usuario), range(1)
+    )))
+    filas.append(resumen("obtener_tareas_usuario", medir(
+        lambda i: datos_controller.obtener_tareas_usuario(datos, usuario), range(repeticiones * 10)
+    )))
+    filas.append(resumen("obtener_tareas_usuario_admin", medir(
+        lambda i: datos_controller.obtener_tareas_usuario(datos, "admin"), range(repeticiones)
+    )))
+    filas.append(resumen("obtener_proyectos_usuario", medir(
+        lambda i: datos_controller.obtener_proyectos_usuario(datos, usuario), range(repeticiones * 10)
+    )))
+    filas.append(resumen("obtener_tareas_proyecto", medir(
+        lambda i: datos_controller.obtener_tareas_proyecto(datos, (i % num_proyectos) + 1), range(repeticiones * 10)
+    )))
+
+    # cambios de tareas
+    filas.append(resumen("crear_tarea", medir(
+        lambda i: datos_controller.crear_tarea(datos, "Tarea de prueba", (i % num_proyectos) + 1, "alta"),
+        range(repeticiones * 100)
+    )))
+    # una copia sincronizada hasta aqui: mas abajo se mide lo que tendria que pedir
+    desde = datos_controller.cambios_desde(datos, 0)["hasta"]
+    ids = [tarea["id"] for tarea in datos["tareas"][-repeticiones * 10:]]
+    filas.append(resumen("cambiar_estado_tarea", medir(
+        lambda tarea_id: datos_controller.cambiar_estado_tarea(datos, tarea_id, "en_curso"), ids
+    )))
+    filas.append(resumen("eliminar_tarea", medir(lambda tarea_id: datos_controller.eliminar_tarea(datos, tarea_id), ids)))
+    # la papelera se direcciona por id: recuperar la primera no recorre por posicion
+    filas.append(resumen("recuperar_tareas", medir(
+        lambda i: datos_controller.recuperar_tareas(datos, [datos["papelera"][0]["id"]]),
+        range(repeticiones * 10)
+    )))
+    filas.append(resumen("recuperar_tareas_x100", medir(
+        lambda i: datos_controller.recuperar_tareas(datos, [tarea["id"] for tarea in datos["papelera"][:100]]),
+        range(repeticiones)
+    )))
+    # barrido de retencion sin nada caducado (el caso de cada intervalo)
+    filas.append(resumen("purgar_papelera_caducada", medir(
+        lambda i: datos_controller.purgar_papelera_caducada(datos, 30), range(repeticiones * 10)
+    )))
+
+    # lotes de 1000 operaciones (un solo guardado)
+    filas.append(resumen("aplicar_lote_crear_tarea_x1000", medir(
+        lambda i: datos_controller.aplicar_lote(datos, [
+            ("crear_tarea", ("Tarea de lote", (i % num_proyectos) + 1, "media")) for j in range(1000)
+        ]), range(repeticiones)
+    )))
+    filas.append(resumen("aplicar_lote_eliminar_tarea_x1000", medir(
+        lambda i: datos_controller.aplicar_lote(datos, [
+            ("eliminar_tarea", (tarea["id"],)) for tarea in datos["tareas"][-1000:]
+        ]), range(repeticiones)
+    )))
+
+    # sincronizacion: todo frente a lo cambiado desde la copia (bytes: tamano en json)
+    for funcion, desde_copia in (("cambios_desde_completo", 0), ("cambios_desde", desde)):
+        fila = resumen(funcion, medir(
+            lambda i: datos_controller.cambios_desde(datos, desde_copia), range(repeticiones)
+        ))
+        fila["bytes"] = len(json.dumps(
+            datos_controller.cambios_desde(datos, desde_copia), default=json_por_defecto
+        ).encode("utf-8"))
+        filas.append(fila)
+
+    # usuarios y proyectos
+    filas.append(resumen("asignar_usuario_proyecto", medir(
+        lambda i: datos_controller.asignar_usuario_proyecto(datos, "admin", (i % num_proyectos) + 1), range(repeticiones)
+    )))
+    usuarios = [nombre for nombre in datos_controller.obtener_usuarios(datos) if nombre != "admin"][:repeticiones]
+    filas.append(resumen("eliminar_usuario", medir(lambda nombre: datos_controller.eliminar_usuario(datos, nombre), usuarios)))
+    # los primeros proyectos son los de mas tareas
+    filas.append(resumen("eliminar_proyecto", medir(
+        lambda proyecto_id: datos_controller.eliminar_proyecto(datos, proyecto_id), range(1, repeticiones + 1)
+    )))
+
+    # guardado completo de lo que quede pendiente
+    filas.append(resumen("guardar_datos", medir(
+        lambda i: (datos_controller.guardar_datos(datos), datos_controller.guardar_pendientes()), range(repeticiones)
+    )))
+
+    # instantanea binaria frente a json con los mismos datos (bytes: tamano del archivo)
+    ruta_binaria = os.path.join(directorio, "datos_" + escala + ".bin")
+    for funcion, ruta_archivo, escribir in (
+        ("escribir_json", ruta, escribir_json_atomico),
+        ("escribir_binario", ruta_binaria, escribir_binario_atomico)
+    ):
+        fila = resumen(funcion, medir(lambda i: escribir(ruta_archivo, datos), range(repeticiones)))
+        fila["bytes"] = os.path.getsize(ruta_archivo)
+        filas.append(fila)
+    filas.append(resumen("cargar_binario", medir(lambda i: abrir_datos_binarios(ruta_binaria), range(repeticiones))))
+    filas.append(resumen("cargar_binario_completo", medir(
+        lambda i: cargar_instantanea(ruta_binaria), range(repeticiones)
+    )))
+
+    # nucleo + un archivo por proyecto: abrir, leer el tablero del proyecto mas grande
+    # y guardar un cambio en un proyecto pequeno (comparar con escribir_json)
+    carpeta = os.path.join(directorio, "fragmentos_" + escala)
+    crear_fragmentos(datos, carpeta)
+    filas.append(resumen("cargar_fragmentos", medir(lambda i: DatosFragmentados(carpeta), range(repeticiones))))
+    filas.append(resumen("abrir_tablero_fragmento", medir(
+        lambda i: DatosFragmentados(carpeta).repositorio.obtener_pagina_tareas_proyecto(repeticiones + 1),
+        range(repeticiones)
+    )))
+    fragmentados = DatosFragmentados(carpeta)
+    filas.append(resumen("guardar_fragmento", medir(
+        lambda i: (fragmentados.repositorio.crear_tarea("cambio", num_proyectos), fragmentados.repositorio.guardar()),
+        range(repeticiones)
+    )))
+
+    for fila in filas:
+        fila["escala"] = escala
+        fila["usuarios"] = num_usuarios
+        fila["proyectos"] = num_proyectos
+        fila["tareas"] = num_tareas
+    return filas
+
+
+def commit_actual():
+    """hash del commit actual si es un repositorio git"""
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO_BENCHMARKS,
+            capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    if salida.returncode != 0:
+        return None
+    return salida.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark de datos_controller")
+    parser.add_argument("--escalas", nargs="+", choices=sorted(ESCALAS), default=["pequena", "mediana"])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--salida")
+    argumentos = parser.parse_args()
+
+    salida = argumentos.salida
+    if salida is None:
+        salida = os.path.join(DIRECTORIO_BENCHMARKS, "resultados", time.strftime("datos_controller-%Y%m%d-%H%M%S.json"))
+
+    directorio = tempfile.mkdtemp(prefix="bench-datos-")
+    resultados = []
+    try:
+        for escala in argumentos.escalas:
+            for fila in medir_escala(escala, directorio, argumentos.repeticiones):
+                resultados.append(fila)
+                print("%-8s %-32s %10.3f ms" % (escala, fila["funcion"], fila["media_ms"]))
+    finally:
+        shutil.rmtree(directorio)
+
+    informe = {
+        "benchmark": "datos_controller",
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit_actual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticiones": argumentos.repeticiones,
+        "resultados": resultados
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    archivo = open(salida, "w", encoding="utf-8")
+    json.dump(informe, archivo, ensure_ascii=False, indent=2)
+    archivo.close()
+    print("resultados en " + salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+memoria de las tareas en dict (como salen de json.load) frente a TareaCompacta
+
+las tareas se generan, se pasan a json y se vuelven a leer, asi cada dict tiene sus
+propios textos como al cargar datos.json; la memoria se mide con tracemalloc
+
+uso:
+    python benchmarks/bench_memoria_tareas.py
+    python benchmarks/bench_memoria_tareas.py --tareas 100000
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+DIRECTORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIRECTORIO_BENCHMARKS))
+
+from controllers.tarea_compacta import compactar_lista
+from generar_datos import ESCALAS, generar_datos
+
+
+def memoria_actual():
+    """bytes reservados ahora mismo segun tracemalloc"""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def recorrer(tareas):
+    """milisegundos en leer tres campos de todas las tareas (lo que hacen las vistas)"""
+    inicio = time.perf_counter()
+    for tarea in tareas:
+        tarea.get("titulo")
+        tarea["estado"]
+        tarea.get("prioridad")
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memoria de las tareas: dict frente a TareaCompacta")
+    parser.add_argument("--tareas", type=int, default=ESCALAS["grande"][2])
+    argumentos = parser.parse_args()
+
+    num_usuarios, num_proyectos, num_tareas = ESCALAS["grande"]
+    texto = json.dumps(generar_datos(num_usuarios, num_proyectos, argumentos.tareas)["tareas"])
+
+    # tiempos sin tracemalloc, que hace mucho mas lentas las reservas de memoria
+    tareas = json.loads(texto)
+    tiempo_dict = recorrer(tareas)
+    inicio = time.perf_counter()
+    compactar_lista(tareas)
+    tiempo_compactar = (time.perf_counter() - inicio) * 1000
+    tiempo_compactas = recorrer(tareas)
+    del tareas
+
+    tracemalloc.start()
+    base = memoria_actual()
+    tareas = json.loads(texto)
+    del texto
+    en_dict = memoria_actual() - base
+    compactar_lista(tareas)
+    compactas = memoria_actual() - base
+    tracemalloc.stop()
+
+    print("%d tareas" % len(tareas))
+    print("dict            %8.1f MB  %5d bytes/tarea  recorrido %6.0f ms" % (
+        en_dict / 1e6, en_dict / len(tareas), tiempo_dict
+    ))
+    print("TareaCompacta   %8.1f MB  %5d bytes/tarea  recorrido %6.0f ms  (compactar %.0f ms)" % (
+        compactas / 1e6, compactas / len(tareas), tiempo_compactas, tiempo_compactar
+    ))
+
+
+if __name__ == "__main__":
+    main()
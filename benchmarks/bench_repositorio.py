@@ -0,0 +1,71 @@
+"""
+benchmark de busquedas: recorrido lineal antiguo contra el repositorio con indices
+
+uso: python benchmarks/bench_repositorio.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controllers.repositorio import Datos
+
+
+def generar_datos(num_proyectos, num_tareas):
+    """crea un diccionario de datos sintetico en memoria"""
+    proyectos = []
+    for i in range(num_proyectos):
+        proyectos.append({"id": i + 1, "nombre": "Proyecto " + str(i + 1), "descripcion": "", "participantes": []})
+
+    tareas = []
+    for i in range(num_tareas):
+        proyecto_id = (i % num_proyectos) + 1
+        tareas.append({
+            "id": i + 1,
+            "titulo": "Tarea " + str(i + 1),
+            "proyecto_id": proyecto_id,
+            "proyecto_nombre": "Proyecto " + str(proyecto_id),
+            "estado": "pendiente",
+            "prioridad": "media"
+        })
+
+    return {"usuarios": {}, "proyectos": proyectos, "tareas": tareas, "papelera": []}
+
+
+def buscar_tarea_lineal(datos, tarea_id):
+    """busqueda como la hacia cambiar_estado_tarea antes del repositorio"""
+    for tarea in datos["tareas"]:
+        if tarea.get("id") == tarea_id:
+            return tarea
+    return None
+
+
+def medir(funcion, repeticiones):
+    """devuelve el tiempo medio por llamada en microsegundos"""
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        funcion(i)
+    return (time.perf_counter() - inicio) / repeticiones * 1000000
+
+
+def main():
+    print("tareas      lineal (us)   indice (us)   tareas_proyecto (us)")
+    for num_tareas in (1000, 10000, 100000, 200000):
+        datos = generar_datos(100, num_tareas)
+        repositorio = Datos(datos).repositorio
+
+        # se buscan tareas del final, el peor caso del recorrido lineal
+        ultimas = [num_tareas - i for i in range(100)]
+
+        lineal = medir(lambda i: buscar_tarea_lineal(datos, ultimas[i % 100]), 20)
+        indice = medir(lambda i: repositorio.obtener_tarea(ultimas[i % 100]), 10000)
+        por_proyecto = medir(lambda i: repositorio.tareas_por_proyecto[(i % 100) + 1], 10000)
+
+        print(str(num_tareas).ljust(12) + ("%.2f" % lineal).ljust(14)
+              + ("%.3f" % indice).ljust(14) + "%.3f" % por_proyecto)
+
+
+if __name__ == "__main__":
+    main()
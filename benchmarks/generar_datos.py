@@ -0,0 +1,128 @@
+"""
+generador de datos.json sinteticos a varias escalas (usuarios, proyectos, tareas y papelera)
+
+uso:
+    python benchmarks/generar_datos.py --escala mediana --salida /tmp/datos.json
+    python benchmarks/generar_datos.py --usuarios 500 --proyectos 100 --tareas 50000 --salida datos.json
+"""
+
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controllers.persistencia import escribir_json_atomico
+
+
+# nombre -> (usuarios, proyectos, tareas)
+ESCALAS = {
+    "pequena": (100, 50, 10000),
+    "mediana": (1000, 500, 100000),
+    "grande": (10000, 5000, 1000000)
+}
+
+# parte de las tareas que ademas hay en la papelera
+PROPORCION_PAPELERA = 0.05
+
+PALABRAS = (
+    "revisar", "preparar", "enviar", "corregir", "disenar", "probar", "documentar",
+    "informe", "presupuesto", "reunion", "cliente", "pantalla", "login", "factura",
+    "pedido", "servidor", "copia", "manual", "entrega", "version", "error", "datos"
+)
+
+ESTADOS = ("pendiente", "en_curso", "completada")
+PESOS_ESTADOS = (40, 20, 40)
+PRIORIDADES = ("alta", "media", "baja")
+PESOS_PRIORIDADES = (20, 50, 30)
+
+
+def generar_titulo(aleatorio):
+    """titulo de tarea de dos a cinco palabras"""
+    return " ".join(aleatorio.choice(PALABRAS) for i in range(aleatorio.randint(2, 5))).capitalize()
+
+
+def generar_tarea(aleatorio, tarea_id, proyecto):
+    """una tarea de un proyecto con estado y prioridad al azar"""
+    return {
+        "id": tarea_id,
+        "titulo": generar_titulo(aleatorio),
+        "proyecto_id": proyecto["id"],
+        "proyecto_nombre": proyecto["nombre"],
+        "estado": aleatorio.choices(ESTADOS, PESOS_ESTADOS)[0],
+        "prioridad": aleatorio.choices(PRIORIDADES, PESOS_PRIORIDADES)[0]
+    }
+
+
+def generar_datos(num_usuarios, num_proyectos, num_tareas, semilla=1):
+    """diccionario con el formato de datos.json; la misma semilla da los mismos datos"""
+    aleatorio = random.Random(semilla)
+
+    usuarios = {"admin": {"password": "admin123", "rol": "admin", "nombre": "Administrador"}}
+    nombres = []
+    for i in range(1, num_usuarios):
+        nombre = "usuario" + str(i).zfill(6)
+        # uno de cada cincuenta es administrador
+        rol = "admin" if i % 50 == 0 else "user"
+        usuarios[nombre] = {"password": "clave" + str(i), "rol": rol, "nombre": "Usuario " + str(i)}
+        nombres.append(nombre)
+
+    proyectos = []
+    for i in range(1, num_proyectos + 1):
+        participantes = aleatorio.sample(nombres, min(len(nombres), aleatorio.randint(3, 20)))
+        proyectos.append({
+            "id": i,
+            "nombre": "Proyecto " + str(i),
+            "descripcion": generar_titulo(aleatorio),
+            "participantes": participantes
+        })
+
+    # unos pocos proyectos concentran muchas tareas, como en el uso real
+    pesos = [1.0 / (i + 1) for i in range(num_proyectos)]
+    elegidos = aleatorio.choices(proyectos, pesos, k=num_tareas)
+    tareas = [generar_tarea(aleatorio, i + 1, elegidos[i]) for i in range(num_tareas)]
+
+    num_papelera = int(num_tareas * PROPORCION_PAPELERA)
+    papelera = []
+    for i in range(num_papelera):
+        tarea = generar_tarea(aleatorio, num_tareas + i + 1, aleatorio.choice(proyectos))
+        papelera.append(tarea)
+
+    return {"usuarios": usuarios, "proyectos": proyectos, "tareas": tareas, "papelera": papelera}
+
+
+def generar_archivo(ruta, num_usuarios, num_proyectos, num_tareas, semilla=1):
+    """escribe un datos.json sintetico como lo guarda la aplicacion"""
+    datos = generar_datos(num_usuarios, num_proyectos, num_tareas, semilla)
+    escribir_json_atomico(ruta, datos)
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="genera un datos.json sintetico")
+    parser.add_argument("--escala", choices=sorted(ESCALAS), default="pequena")
+    parser.add_argument("--usuarios", type=int)
+    parser.add_argument("--proyectos", type=int)
+    parser.add_argument("--tareas", type=int)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--salida", default="datos_sinteticos.json")
+    argumentos = parser.parse_args()
+
+    num_usuarios, num_proyectos, num_tareas = ESCALAS[argumentos.escala]
+    if argumentos.usuarios is not None:
+        num_usuarios = argumentos.usuarios
+    if argumentos.proyectos is not None:
+        num_proyectos = argumentos.proyectos
+    if argumentos.tareas is not None:
+        num_tareas = argumentos.tareas
+
+    datos = generar_archivo(argumentos.salida, num_usuarios, num_proyectos, num_tareas, argumentos.semilla)
+    print("%s: %d usuarios, %d proyectos, %d tareas, %d en papelera" % (
+        argumentos.salida, len(datos["usuarios"]), len(datos["proyectos"]),
+        len(datos["tareas"]), len(datos["papelera"])
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,19 @@
 controlador para el panel de administracion
 """
 
-from PyQt5.QtWidgets import QDialog, QLineEdit, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QMessageBox
-from PyQt5 import uic
+from PyQt5.QtWidgets import (
+    QDialog, QLineEdit, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QMessageBox, QListWidgetItem,
+    QFileDialog, QProgressDialog, QApplication
+)
+from PyQt5.QtCore import Qt
 from controllers.datos_controller import (
-    obtener_ruta_vista, crear_usuario, eliminar_usuario, cambiar_rol_usuario,
+    crear_usuario, eliminar_usuario, cambiar_rol_usuario,
     crear_proyecto, eliminar_proyecto, asignar_usuario_proyecto,
-    desasignar_usuario_proyecto
+    desasignar_usuario_proyecto, obtener_usuarios, obtener_usuario,
+    obtener_proyectos, aplicar_lote, consultar_varias, persistencia
 )
+from controllers.vistas_compiladas import cargar_vista
+from controllers.intercambio import SECCIONES, importar, exportar
 
 
 class DialogoCrearUsuario(QDialog):
@@ -169,7 +175,7 @@ class ControladorAdmin(QDialog):
 
     def __init__(self, datos):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("admin.ui"), self)
+        cargar_vista("admin.ui", self)
         self.datos = datos
 
         # conecta botones de usuarios
@@ -186,6 +192,10 @@ class ControladorAdmin(QDialog):
         self.btnDesasignar.clicked.connect(self.desasignar)
         self.comboProyecto.currentIndexChanged.connect(self.mostrar_participantes)
 
+        # conecta botones de importar y exportar
+        self.btnImportar.clicked.connect(self.importar_archivo)
+        self.btnExportar.clicked.connect(self.exportar_archivo)
+
         # carga datos iniciales
         self.cargar_usuarios()
         self.cargar_proyectos()
@@ -194,8 +204,9 @@ class ControladorAdmin(QDialog):
     def cargar_usuarios(self):
         """carga la lista de usuarios"""
         self.listaUsuarios.clear()
-        for usuario in self.datos["usuarios"]:
-            info = self.datos["usuarios"][usuario]
+        usuarios = obtener_usuarios(self.datos)
+        for usuario in usuarios:
+            info = usuarios[usuario]
             if info["rol"] == "admin":
                 rol = "Admin"
             else:
@@ -206,7 +217,7 @@ class ControladorAdmin(QDialog):
     def cargar_proyectos(self):
         """carga la lista de proyectos"""
         self.listaProyectos.clear()
-        for proyecto in self.datos["proyectos"]:
+        for proyecto in obtener_proyectos(self.datos):
             participantes = proyecto.get("participantes", [])
             num_participantes = len(participantes)
             texto = proyecto["nombre"] + " (" + str(num_participantes) + " participantes)"
@@ -216,32 +227,58 @@ class ControladorAdmin(QDialog):
         """carga los combos de asignacion"""
         # combo de proyectos
         self.comboProyecto.clear()
-        for proyecto in self.datos["proyectos"]:
+        for proyecto in obtener_proyectos(self.datos):
             self.comboProyecto.addItem(proyecto["nombre"], proyecto["id"])
 
         # combo de usuarios
         self.comboUsuario.clear()
-        for usuario in self.datos["usuarios"]:
-            info = self.datos["usuarios"][usuario]
+        usuarios = obtener_usuarios(self.datos)
+        for usuario in usuarios:
+            info = usuarios[usuario]
             texto = info["nombre"] + " (" + usuario + ")"
             self.comboUsuario.addItem(texto, usuario)
 
         self.mostrar_participantes()
 
     def mostrar_participantes(self):
-        """muestra los participantes del proyecto seleccionado"""
+        """muestra los participantes del proyecto seleccionado y los usuarios que faltan"""
         self.listaParticipantes.clear()
+        self.listaSinAsignar.clear()
         indice = self.comboProyecto.currentIndex()
+        # con el servidor de datos las dos consultas van en una sola ida y vuelta
+        proyectos, usuarios = consultar_varias(
+            self.datos, [("obtener_proyectos", ()), ("obtener_usuarios", ())]
+        )
         
-        if indice >= 0 and indice < len(self.datos["proyectos"]):
-            proyecto = self.datos["proyectos"][indice]
+        if indice >= 0 and indice < len(proyectos):
+            proyecto = proyectos[indice]
             participantes = proyecto.get("participantes", [])
             
             for usuario in participantes:
-                if usuario in self.datos["usuarios"]:
-                    nombre = self.datos["usuarios"][usuario]["nombre"]
+                info = usuarios.get(usuario)
+                if info is not None:
+                    nombre = info["nombre"]
                     texto = nombre + " (" + usuario + ")"
-                    self.listaParticipantes.addItem(texto)
+                    self.agregar_usuario_lista(self.listaParticipantes, texto, usuario)
+
+            asignados = set(participantes)
+            for usuario in usuarios:
+                if usuario not in asignados:
+                    texto = usuarios[usuario]["nombre"] + " (" + usuario + ")"
+                    self.agregar_usuario_lista(self.listaSinAsignar, texto, usuario)
+
+    def agregar_usuario_lista(self, lista, texto, usuario):
+        """anade una fila que recuerda su usuario"""
+        item = QListWidgetItem(texto)
+        item.setData(Qt.UserRole, usuario)
+        lista.addItem(item)
+
+    def usuarios_seleccionados(self, lista):
+        """usuarios de las filas seleccionadas de una lista"""
+        usuarios = []
+        for item in lista.selectedItems():
+            usuarios.append(item.data(Qt.UserRole))
+        return usuarios
 
     def nuevo_usuario(self):
         """crea un nuevo usuario"""
@@ -266,7 +303,7 @@ class ControladorAdmin(QDialog):
             return
 
         # obtiene el nombre de usuario de la lista
-        lista_usuarios = list(self.datos["usuarios"].keys())
+        lista_usuarios = list(obtener_usuarios(self.datos).keys())
         if fila < len(lista_usuarios):
             usuario = lista_usuarios[fila]
             
@@ -291,7 +328,7 @@ class ControladorAdmin(QDialog):
             QMessageBox.warning(self, "Error", "Selecciona un usuario")
             return
 
-        lista_usuarios = list(self.datos["usuarios"].keys())
+        lista_usuarios = list(obtener_usuarios(self.datos).keys())
         if fila < len(lista_usuarios):
             usuario = lista_usuarios[fila]
             
@@ -300,7 +337,7 @@ class ControladorAdmin(QDialog):
                 return
 
             # obtiene rol actual y lo cambia
-            rol_actual = self.datos["usuarios"][usuario]["rol"]
+            rol_actual = obtener_usuario(self.datos, usuario)["rol"]
             if rol_actual == "admin":
                 nuevo_rol = "user"
                 rol_texto = "Usuario"
@@ -337,8 +374,9 @@ class ControladorAdmin(QDialog):
             QMessageBox.warning(self, "Error", "Selecciona un proyecto")
             return
 
-        if fila < len(self.datos["proyectos"]):
-            proyecto = self.datos["proyectos"][fila]
+        proyectos = obtener_proyectos(self.datos)
+        if fila < len(proyectos):
+            proyecto = proyectos[fila]
             respuesta = QMessageBox.question(
                 self, "Confirmar",
                 "Eliminar proyecto '" + proyecto["nombre"] + "'?\nSe eliminaran todas sus tareas.",
@@ -350,11 +388,19 @@ class ControladorAdmin(QDialog):
                 self.cargar_combos()
 
     def asignar(self):
-        """asigna un usuario al proyecto seleccionado"""
+        """asigna al proyecto los usuarios seleccionados (o el del combo)"""
         proyecto_id = self.comboProyecto.currentData()
         usuario = self.comboUsuario.currentData()
 
-        if proyecto_id is not None and usuario is not None:
+        seleccionados = self.usuarios_seleccionados(self.listaSinAsignar)
+        if proyecto_id is not None and len(seleccionados) > 0:
+            # varios usuarios: un solo lote y un solo guardado
+            aplicar_lote(self.datos, [
+                ("asignar_usuario_proyecto", (seleccionado, proyecto_id)) for seleccionado in seleccionados
+            ])
+            self.mostrar_participantes()
+            self.cargar_proyectos()
+        elif proyecto_id is not None and usuario is not None:
             if asignar_usuario_proyecto(self.datos, usuario, proyecto_id):
                 self.mostrar_participantes()
                 self.cargar_proyectos()
@@ -362,11 +408,93 @@ class ControladorAdmin(QDialog):
                 QMessageBox.information(self, "Info", "El usuario ya esta asignado")
 
     def desasignar(self):
-        """quita un usuario del proyecto seleccionado"""
+        """quita del proyecto los participantes seleccionados (o el usuario del combo)"""
         proyecto_id = self.comboProyecto.currentData()
         usuario = self.comboUsuario.currentData()
 
-        if proyecto_id is not None and usuario is not None:
+        seleccionados = self.usuarios_seleccionados(self.listaParticipantes)
+        if proyecto_id is not None and len(seleccionados) > 0:
+            aplicar_lote(self.datos, [
+                ("desasignar_usuario_proyecto", (seleccionado, proyecto_id)) for seleccionado in seleccionados
+            ])
+            self.mostrar_participantes()
+            self.cargar_proyectos()
+        elif proyecto_id is not None and usuario is not None:
             if desasignar_usuario_proyecto(self.datos, usuario, proyecto_id):
                 self.mostrar_participantes()
                 self.cargar_proyectos()
+
+    def crear_progreso(self, texto):
+        """dialogo de progreso cancelable; devuelve (dialogo, funcion de progreso)"""
+        dialogo = QProgressDialog(texto, "Cancelar", 0, 1000, self)
+        dialogo.setWindowTitle("Archivos")
+        dialogo.setWindowModality(Qt.WindowModal)
+        dialogo.setMinimumDuration(300)
+
+        def progreso(hechas, total):
+            if total > 0:
+                dialogo.setValue(int(1000 * hechas / total))
+            # la importacion corre en este hilo: se atienden los eventos entre bloques
+            # (con la persistencia en pausa, ver pausar en importar_archivo y exportar_archivo)
+            QApplication.processEvents()
+            return not dialogo.wasCanceled()
+
+        return dialogo, progreso
+
+    def importar_archivo(self):
+        """importa la seccion elegida desde un archivo csv o ndjson"""
+        seccion = SECCIONES[self.comboSeccion.currentIndex()]
+        ruta, filtro = QFileDialog.getOpenFileName(
+            self, "Importar " + seccion, "", "Datos (*.csv *.ndjson *.jsonl)"
+        )
+        if ruta == "":
+            return
+
+        dialogo, progreso = self.crear_progreso("Importando " + seccion + "...")
+        # entre bloques no se guarda en lote, ni se purga, ni se recargan cambios de otra instancia
+        persistencia.pausar()
+        try:
+            resumen = importar(self.datos, seccion, ruta, progreso=progreso)
+        except (OSError, ValueError, UnicodeDecodeError) as error:
+            dialogo.close()
+            QMessageBox.warning(self, "Error", "No se pudo importar: " + str(error))
+            return
+        finally:
+            persistencia.reanudar()
+        cancelado = dialogo.wasCanceled()
+        dialogo.close()
+
+        texto = str(resumen["importadas"]) + " importadas, " + str(resumen["descartadas"]) + " descartadas"
+        if cancelado:
+            texto = "Importacion cancelada: " + texto
+        QMessageBox.information(self, "Importar", texto)
+        self.cargar_proyectos()
+        self.cargar_combos()
+
+    def exportar_archivo(self):
+        """exporta la seccion elegida a un archivo csv o ndjson"""
+        seccion = SECCIONES[self.comboSeccion.currentIndex()]
+        ruta, filtro = QFileDialog.getSaveFileName(
+            self, "Exportar " + seccion, seccion + ".csv", "CSV (*.csv);;NDJSON (*.ndjson)"
+        )
+        if ruta == "":
+            return
+        if not ruta.lower().endswith((".csv", ".ndjson", ".jsonl")):
+            ruta = ruta + (".ndjson" if "ndjson" in filtro else ".csv")
+
+        dialogo, progreso = self.crear_progreso("Exportando " + seccion + "...")
+        # la exportacion recorre las tareas vivas: nada las cambia entre bloques
+        persistencia.pausar()
+        try:
+            filas = exportar(self.datos, seccion, ruta, progreso=progreso)
+        except InterruptedError:
+            dialogo.close()
+            return
+        except (OSError, ValueError) as error:
+            dialogo.close()
+            QMessageBox.warning(self, "Error", "No se pudo exportar: " + str(error))
+            return
+        finally:
+            persistencia.reanudar()
+        dialogo.close()
+        QMessageBox.information(self, "Exportar", str(filas) + " filas exportadas a " + ruta)
@@ -0,0 +1,421 @@
+"""
+almacen en varios archivos: un nucleo pequeno y un fragmento por proyecto
+
+    carpeta/nucleo.json           usuarios, proyectos y el resto de datos.json sin tareas
+    carpeta/proyecto_<id>.json    tareas y papelera de un proyecto
+
+el repositorio es el de memoria, pero cada fragmento se lee la primera vez que hace
+falta (al abrir el tablero del proyecto, al montar el feed de un usuario...) y al
+guardar solo se reescriben el nucleo y los fragmentos que cambiaron; eliminar un
+proyecto borra su fragmento sin leerlo
+
+uso del migrador: python -m controllers.almacen_fragmentos datos.json carpeta
+"""
+
+import os
+import sys
+import time
+
+from controllers.repositorio import Datos, Repositorio, TAMANO_PAGINA, LIMITE_RESULTADOS
+from controllers.cambios import TIPO_TAREA
+from controllers.persistencia import escribir_json_atomico
+from controllers.instantanea_binaria import cargar_instantanea
+from controllers.tarea_compacta import compactar_lista
+
+
+ARCHIVO_NUCLEO = "nucleo.json"
+PREFIJO_FRAGMENTO = "proyecto_"
+
+# secciones que van en los fragmentos; el resto de claves va en el nucleo
+SECCIONES_FRAGMENTADAS = ("tareas", "papelera")
+
+
+def ruta_fragmento(carpeta, proyecto_id):
+    """archivo del fragmento de un proyecto"""
+    return os.path.join(carpeta, PREFIJO_FRAGMENTO + str(proyecto_id) + ".json")
+
+
+def fragmentos_en_disco(carpeta):
+    """ids de proyecto de los fragmentos que hay en la carpeta"""
+    proyectos_ids = []
+    for nombre in os.listdir(carpeta):
+        if not nombre.startswith(PREFIJO_FRAGMENTO) or not nombre.endswith(".json"):
+            continue
+        try:
+            proyectos_ids.append(int(nombre[len(PREFIJO_FRAGMENTO):-len(".json")]))
+        except ValueError:
+            # tareas sin proyecto valido: se quedan en su archivo
+            pass
+    return proyectos_ids
+
+
+def resumen_papelera(papelera):
+    """[cantidad, hora de borrado mas antigua] de la papelera de un fragmento"""
+    horas = [tarea["eliminada"] for tarea in papelera if "eliminada" in tarea]
+    return [len(papelera), min(horas) if len(horas) > 0 else None]
+
+
+class RepositorioFragmentado(Repositorio):
+    """repositorio en memoria que lee los fragmentos al necesitarlos y sabe cuales cambiaron"""
+
+    def __init__(self, datos, carpeta, fragmentos):
+        super().__init__(datos)
+        self.carpeta = carpeta
+        # "fragmentos" del nucleo: lo necesario sin leer ningun fragmento
+        self.siguiente_id_guardado = fragmentos.get("siguiente_id_tarea", 1)
+        # proyecto_id -> [cantidad, hora mas antigua] de su papelera segun el ultimo guardado
+        self.papelera_guardada = {}
+        for proyecto_id, cantidad, mas_antigua in fragmentos.get("papelera", []):
+            self.papelera_guardada[proyecto_id] = [cantidad, mas_antigua]
+        # fragmentos ya leidos (o que no hay que leer: proyectos eliminados)
+        self.cargados = set()
+        self.todos_cargados = False
+        # fragmentos que hay que reescribir o borrar en el proximo guardado
+        self.sucios = set()
+        self.borrados = set()
+
+    def reconstruir(self):
+        super().reconstruir()
+        # los ids de las tareas de fragmentos sin leer tampoco se pueden repetir
+        self.siguiente_id_tarea = max(self.siguiente_id_tarea, self.siguiente_id_guardado)
+
+    # fragmentos
+
+    def cargar_fragmento(self, proyecto_id):
+        """lee el fragmento de un proyecto (si no se leyo ya) y anade sus tareas a los indices"""
+        if proyecto_id in self.cargados:
+            return
+        # indices antes de anadir nada
+        papelera_por_id = self.papelera_por_id
+        self.cargados.add(proyecto_id)
+        ruta = ruta_fragmento(self.carpeta, proyecto_id)
+        if not os.path.exists(ruta):
+            return
+        contenido = cargar_instantanea(ruta)
+        tareas = contenido.get("tareas", [])
+        papelera = contenido.get("papelera", [])
+        compactar_lista(tareas)
+        compactar_lista(papelera)
+
+        ahora = time.time()
+        for tarea in papelera:
+            if "eliminada" not in tarea:
+                tarea["eliminada"] = ahora
+            self.datos["papelera"].append(tarea)
+            papelera_por_id[tarea["id"]] = tarea
+            self._asignar_orden(tarea)
+            self.siguiente_id_tarea = max(self.siguiente_id_tarea, tarea["id"] + 1)
+        for tarea in tareas:
+            self.datos["tareas"].append(tarea)
+            self._indexar_tarea(tarea)
+            self.siguiente_id_tarea = max(self.siguiente_id_tarea, tarea["id"] + 1)
+        # el registro de cambios se vuelve a montar con las tareas nuevas
+        self.cambios.recientes = None
+
+    def cargar_todos(self):
+        """lee todos los fragmentos (consultas sobre todas las tareas)"""
+        if self.todos_cargados:
+            return
+        for proyecto in list(self.datos["proyectos"]):
+            self.cargar_fragmento(proyecto.get("id"))
+        for proyecto_id in fragmentos_en_disco(self.carpeta):
+            self.cargar_fragmento(proyecto_id)
+        self.todos_cargados = True
+
+    def _cargar_visibles(self, usuario):
+        """lee los fragmentos de los proyectos que ve el usuario"""
+        proyectos_ids = self.proyectos_visibles(usuario)
+        if proyectos_ids is None:
+            self.cargar_todos()
+            return
+        for proyecto_id in proyectos_ids:
+            self.cargar_fragmento(proyecto_id)
+
+    def _asegurar_tarea(self, tarea_id):
+        """lee lo necesario para encontrar una tarea por id
+
+        sin un indice id -> proyecto una tarea que nunca se vio solo se encuentra
+        leyendo todo; las vistas solo piden tareas que ya mostraron
+        """
+        if self.todos_cargados or tarea_id in self.orden_tareas:
+            return
+        if type(tarea_id) is int and tarea_id >= self.siguiente_id_tarea:
+            # no existe
+            return
+        self.cargar_todos()
+
+    def _tocar(self, tareas):
+        """marca para reescribir los fragmentos de las tareas indicadas"""
+        for tarea in tareas:
+            if tarea is not None:
+                self.sucios.add(tarea.get("proyecto_id"))
+
+    def guardar(self):
+        """escribe el nucleo y los fragmentos que cambiaron desde el ultimo guardado"""
+        papelera_por_proyecto = {}
+        if len(self.sucios) > 0:
+            for tarea in self.datos["papelera"]:
+                proyecto_id = tarea.get("proyecto_id")
+                if proyecto_id in self.sucios:
+                    papelera_por_proyecto.setdefault(proyecto_id, []).append(tarea)
+        for proyecto_id in self.sucios:
+            self.papelera_guardada[proyecto_id] = resumen_papelera(papelera_por_proyecto.get(proyecto_id, []))
+        for proyecto_id in self.borrados:
+            self.papelera_guardada.pop(proyecto_id, None)
+
+        # el nucleo primero: si se corta a medias ningun id nuevo queda sin reservar
+        nucleo = {}
+        for clave, valor in self.datos.items():
+            if clave not in SECCIONES_FRAGMENTADAS:
+                nucleo[clave] = valor
+        nucleo["fragmentos"] = {
+            "siguiente_id_tarea": vars(self).get("siguiente_id_tarea", self.siguiente_id_guardado),
+            "papelera": [
+                [proyecto_id, cantidad, mas_antigua]
+                for proyecto_id, (cantidad, mas_antigua) in self.papelera_guardada.items()
+                if cantidad > 0
+            ]
+        }
+        escribir_json_atomico(os.path.join(self.carpeta, ARCHIVO_NUCLEO), nucleo)
+
+        tareas_por_proyecto = vars(self).get("tareas_por_proyecto", {})
+        for proyecto_id in self.sucios:
+            tareas = list(tareas_por_proyecto.get(proyecto_id, {}).values())
+            papelera = papelera_por_proyecto.get(proyecto_id, [])
+            ruta = ruta_fragmento(self.carpeta, proyecto_id)
+            if len(tareas) == 0 and len(papelera) == 0:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+                continue
+            escribir_json_atomico(ruta, {"proyecto_id": proyecto_id, "tareas": tareas, "papelera": papelera})
+        for proyecto_id in self.borrados:
+            ruta = ruta_fragmento(self.carpeta, proyecto_id)
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        self.sucios = set()
+        self.borrados = set()
+
+    # consultas
+
+    def obtener_feed(self, usuario):
+        if usuario not in self.feeds:
+            self._cargar_visibles(usuario)
+        return super().obtener_feed(usuario)
+
+    def obtener_tarea(self, tarea_id):
+        self._asegurar_tarea(tarea_id)
+        return super().obtener_tarea(tarea_id)
+
+    def obtener_tareas_proyecto(self, proyecto_id):
+        self.cargar_fragmento(proyecto_id)
+        return super().obtener_tareas_proyecto(proyecto_id)
+
+    def obtener_pagina_tareas_proyecto(self, proyecto_id, cursor=None, limite=TAMANO_PAGINA,
+                                       recientes_primero=False):
+        self.cargar_fragmento(proyecto_id)
+        return super().obtener_pagina_tareas_proyecto(proyecto_id, cursor, limite, recientes_primero)
+
+    def buscar_tareas(self, usuario, consulta, limite=LIMITE_RESULTADOS):
+        self._cargar_visibles(usuario)
+        return super().buscar_tareas(usuario, consulta, limite)
+
+    def obtener_papelera(self):
+        self.cargar_todos()
+        return super().obtener_papelera()
+
+    def obtener_pagina_papelera(self, cursor=None, limite=TAMANO_PAGINA):
+        self.cargar_todos()
+        return super().obtener_pagina_papelera(cursor, limite)
+
+    def contar_papelera(self):
+        """numero de tareas en la papelera sin leer los fragmentos que faltan"""
+        cantidad = len(self.datos["papelera"])
+        for proyecto_id, (guardadas, mas_antigua) in self.papelera_guardada.items():
+            if proyecto_id not in self.cargados:
+                cantidad += guardadas
+        return cantidad
+
+    def contar_tareas(self):
+        self.cargar_todos()
+        return super().contar_tareas()
+
+    def recorrer_tareas(self, papelera=False):
+        self.cargar_todos()
+        return super().recorrer_tareas(papelera)
+
+    def obtener_pagina_tareas(self, cursor=None, limite=TAMANO_PAGINA, papelera=False):
+        self.cargar_todos()
+        return super().obtener_pagina_tareas(cursor, limite, papelera)
+
+    def cambios_desde(self, desde, origen=None):
+        self.cargar_todos()
+        return super().cambios_desde(desde, origen)
+
+    # cambios
+
+    def eliminar_proyecto(self, proyecto_id):
+        """elimina un proyecto; si su fragmento no se leyo, se borra el archivo sin leerlo
+
+        las copias sincronizadas quitan las tareas de un proyecto con lapida aunque
+        no reciban la lapida de cada tarea (ver controllers/sincronizacion.py)
+        """
+        eliminado = super().eliminar_proyecto(proyecto_id)
+        # ya no se lee aunque el archivo siga ahi hasta el proximo guardado
+        self.cargados.add(proyecto_id)
+        self.sucios.discard(proyecto_id)
+        self.borrados.add(proyecto_id)
+        return eliminado
+
+    def crear_tarea(self, titulo, proyecto_id, prioridad="media", tarea_id=None):
+        self.cargar_fragmento(proyecto_id)
+        tarea = super().crear_tarea(titulo, proyecto_id, prioridad, tarea_id)
+        self._tocar([tarea])
+        return tarea
+
+    def cambiar_estado_tarea(self, tarea_id, nuevo_estado, momento=None):
+        self._asegurar_tarea(tarea_id)
+        self._tocar([self.tareas_por_id.get(tarea_id)])
+        return super().cambiar_estado_tarea(tarea_id, nuevo_estado, momento)
+
+    def eliminar_tarea(self, tarea_id, momento=None):
+        self._asegurar_tarea(tarea_id)
+        self._tocar([self.tareas_por_id.get(tarea_id)])
+        return super().eliminar_tarea(tarea_id, momento)
+
+    def _eliminar_tareas(self, borrados):
+        for argumentos in borrados:
+            self._asegurar_tarea(argumentos[0])
+            self._tocar([self.tareas_por_id.get(argumentos[0])])
+        return super()._eliminar_tareas(borrados)
+
+    def recuperar_tareas(self, ids):
+        for tarea_id in ids:
+            self._asegurar_tarea(tarea_id)
+            self._tocar([self.papelera_por_id.get(tarea_id)])
+        return super().recuperar_tareas(ids)
+
+    def eliminar_tareas_permanente(self, ids):
+        for tarea_id in ids:
+            self._asegurar_tarea(tarea_id)
+            self._tocar([self.papelera_por_id.get(tarea_id)])
+        return super().eliminar_tareas_permanente(ids)
+
+    def purgar_papelera(self, limite):
+        """purgar_papelera leyendo solo los fragmentos con tareas caducadas
+
+        con fragmentos leidos en distinto momento la papelera no esta en orden de
+        borrado: se recorre entera
+        """
+        for proyecto_id, (cantidad, mas_antigua) in list(self.papelera_guardada.items()):
+            if mas_antigua is not None and mas_antigua < limite:
+                self.cargar_fragmento(proyecto_id)
+        caducadas = [tarea for tarea in self.datos["papelera"] if tarea.get("eliminada", limite) < limite]
+        if len(caducadas) == 0:
+            return 0
+        ids = [tarea["id"] for tarea in caducadas]
+        self._tocar(caducadas)
+        self._quitar_de_papelera(ids)
+        self.cambios.lapidas(TIPO_TAREA, ids)
+        return len(caducadas)
+
+    def vaciar_papelera(self):
+        for proyecto_id, (cantidad, mas_antigua) in list(self.papelera_guardada.items()):
+            if cantidad > 0:
+                self.cargar_fragmento(proyecto_id)
+        self._tocar(self.datos["papelera"])
+        return super().vaciar_papelera()
+
+    def sellar_completadas(self, momento):
+        """sellar_completadas solo en los fragmentos leidos (el resto, al leerlos)"""
+        selladas = [
+            tarea for tarea in self.datos["tareas"]
+            if tarea.get("estado") == "completada" and "completada" not in tarea
+        ]
+        self._tocar(selladas)
+        return super().sellar_completadas(momento)
+
+    def archivar_tareas(self, ids):
+        self._tocar([self.tareas_por_id.get(tarea_id) for tarea_id in ids])
+        return super().archivar_tareas(ids)
+
+    def restaurar_archivadas(self, tareas, momento=None):
+        for registro in tareas:
+            self.cargar_fragmento(registro.get("proyecto_id"))
+        resultados = super().restaurar_archivadas(tareas, momento)
+        self._tocar([registro for registro, restaurada in zip(tareas, resultados) if restaurada])
+        return resultados
+
+    def recuperar_tarea(self, indice):
+        self.cargar_todos()
+        return super().recuperar_tarea(indice)
+
+    def eliminar_tarea_permanente(self, indice):
+        self.cargar_todos()
+        return super().eliminar_tarea_permanente(indice)
+
+
+class DatosFragmentados(Datos):
+    """datos del nucleo; tareas y papelera tienen solo las de los fragmentos ya leidos"""
+
+    def __init__(self, carpeta):
+        nucleo = cargar_instantanea(os.path.join(carpeta, ARCHIVO_NUCLEO))
+        fragmentos = nucleo.pop("fragmentos", {})
+        dict.__init__(self, nucleo)
+        for seccion in SECCIONES_FRAGMENTADAS:
+            self[seccion] = []
+        self.carpeta = carpeta
+        self.repositorio = RepositorioFragmentado(self, carpeta, fragmentos)
+
+
+def crear_fragmentos(datos, carpeta):
+    """reparte unos datos completos en nucleo y fragmentos en una carpeta nueva"""
+    ruta_nucleo = os.path.join(carpeta, ARCHIVO_NUCLEO)
+    if os.path.exists(ruta_nucleo):
+        raise FileExistsError("ya hay datos en fragmentos: " + ruta_nucleo)
+    os.makedirs(carpeta, exist_ok=True)
+
+    ids = [tarea.get("id") for seccion in SECCIONES_FRAGMENTADAS for tarea in datos.get(seccion, [])]
+    siguiente_id = max([tarea_id for tarea_id in ids if type(tarea_id) is int] + [0]) + 1
+    por_proyecto = {}
+    ids_usados = set()
+    for seccion in SECCIONES_FRAGMENTADAS:
+        for tarea in datos.get(seccion, []):
+            if tarea.get("id") in ids_usados or type(tarea.get("id")) is not int:
+                # ids repetidos de versiones antiguas: cada fragmento se lee por separado
+                tarea = dict(tarea)
+                tarea["id"] = siguiente_id
+                siguiente_id += 1
+            ids_usados.add(tarea["id"])
+            fragmento = por_proyecto.setdefault(tarea.get("proyecto_id"), {"tareas": [], "papelera": []})
+            fragmento[seccion].append(tarea)
+
+    for proyecto_id, fragmento in por_proyecto.items():
+        escribir_json_atomico(ruta_fragmento(carpeta, proyecto_id), dict({"proyecto_id": proyecto_id}, **fragmento))
+
+    # el nucleo al final: mientras no existe la migracion no ha terminado
+    nucleo = {}
+    for clave, valor in datos.items():
+        if clave not in SECCIONES_FRAGMENTADAS:
+            nucleo[clave] = valor
+    nucleo["fragmentos"] = {
+        "siguiente_id_tarea": siguiente_id,
+        "papelera": [
+            [proyecto_id] + resumen_papelera(fragmento["papelera"])
+            for proyecto_id, fragmento in por_proyecto.items()
+            if len(fragmento["papelera"]) > 0
+        ]
+    }
+    escribir_json_atomico(ruta_nucleo, nucleo)
+
+
+def migrar_a_fragmentos(ruta_datos, carpeta):
+    """copia de una vez datos.json (o la instantanea binaria) a nucleo y fragmentos"""
+    crear_fragmentos(cargar_instantanea(ruta_datos), carpeta)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("uso: python -m controllers.almacen_fragmentos datos.json carpeta")
+        sys.exit(1)
+    migrar_a_fragmentos(sys.argv[1], sys.argv[2])
+    print("migracion completada: " + sys.argv[2])
@@ -0,0 +1,795 @@
+"""
+almacen sqlite (wal) con las mismas operaciones que el repositorio en memoria
+
+uso del migrador: python -m controllers.almacen_sqlite datos.json datos.sqlite3
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import contextlib
+
+from controllers.repositorio import TAMANO_PAGINA, codificar_cursor, decodificar_cursor, validar_lote
+from controllers.busqueda import LIMITE_RESULTADOS, extraer_palabras
+from controllers.cambios import MAXIMO_LAPIDAS, delta_vacio, necesita_completo
+from controllers.instantanea_binaria import cargar_instantanea
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    usuario TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    rol TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    cambio INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS proyectos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    descripcion TEXT NOT NULL DEFAULT '',
+    cambio INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS participantes (
+    proyecto_id INTEGER NOT NULL REFERENCES proyectos(id) ON DELETE CASCADE,
+    usuario TEXT NOT NULL,
+    orden INTEGER NOT NULL,
+    PRIMARY KEY (proyecto_id, usuario)
+);
+CREATE TABLE IF NOT EXISTS tareas (
+    id INTEGER PRIMARY KEY,
+    titulo TEXT NOT NULL,
+    proyecto_id INTEGER,
+    proyecto_nombre TEXT NOT NULL DEFAULT '',
+    estado TEXT NOT NULL,
+    prioridad TEXT NOT NULL,
+    papelera INTEGER NOT NULL DEFAULT 0,
+    orden INTEGER NOT NULL,
+    eliminada REAL,
+    cambio INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tareas_proyecto ON tareas (proyecto_id, papelera, orden);
+CREATE INDEX IF NOT EXISTS idx_tareas_estado ON tareas (estado);
+CREATE INDEX IF NOT EXISTS idx_tareas_prioridad ON tareas (papelera, prioridad, orden);
+CREATE INDEX IF NOT EXISTS idx_tareas_papelera ON tareas (papelera, orden);
+CREATE INDEX IF NOT EXISTS idx_tareas_eliminada ON tareas (papelera, eliminada);
+CREATE INDEX IF NOT EXISTS idx_tareas_orden ON tareas (orden);
+CREATE INDEX IF NOT EXISTS idx_participantes_usuario ON participantes (usuario);
+CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_tareas USING fts5 (
+    titulo, proyecto_nombre,
+    content='tareas', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+);
+CREATE TRIGGER IF NOT EXISTS tareas_busqueda_insertar AFTER INSERT ON tareas BEGIN
+    INSERT INTO busqueda_tareas (rowid, titulo, proyecto_nombre) VALUES (new.id, new.titulo, new.proyecto_nombre);
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_busqueda_borrar AFTER DELETE ON tareas BEGIN
+    INSERT INTO busqueda_tareas (busqueda_tareas, rowid, titulo, proyecto_nombre)
+    VALUES ('delete', old.id, old.titulo, old.proyecto_nombre);
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_busqueda_cambiar AFTER UPDATE OF titulo, proyecto_nombre ON tareas BEGIN
+    INSERT INTO busqueda_tareas (busqueda_tareas, rowid, titulo, proyecto_nombre)
+    VALUES ('delete', old.id, old.titulo, old.proyecto_nombre);
+    INSERT INTO busqueda_tareas (rowid, titulo, proyecto_nombre) VALUES (new.id, new.titulo, new.proyecto_nombre);
+END;
+CREATE TABLE IF NOT EXISTS cambios (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    secuencia INTEGER NOT NULL,
+    lapidas_desde INTEGER NOT NULL,
+    origen TEXT NOT NULL
+);
+INSERT OR IGNORE INTO cambios (id, secuencia, lapidas_desde, origen) VALUES (1, 0, 0, lower(hex(randomblob(16))));
+CREATE TABLE IF NOT EXISTS lapidas (
+    cambio INTEGER PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    clave NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usuarios_cambio ON usuarios (cambio);
+CREATE INDEX IF NOT EXISTS idx_proyectos_cambio ON proyectos (cambio);
+CREATE INDEX IF NOT EXISTS idx_tareas_cambio ON tareas (cambio);
+"""
+
+# cada fila que cambia recibe el siguiente numero de cambio y cada borrado deja una
+# lapida (ver controllers/cambios.py); con disparadores no se escapa ninguna operacion
+DISPARADORES_CAMBIOS = """
+CREATE TRIGGER IF NOT EXISTS usuarios_cambio_insertar AFTER INSERT ON usuarios BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE usuarios SET cambio = (SELECT secuencia FROM cambios) WHERE usuario = new.usuario;
+END;
+CREATE TRIGGER IF NOT EXISTS usuarios_cambio_actualizar AFTER UPDATE OF password, rol, nombre ON usuarios BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE usuarios SET cambio = (SELECT secuencia FROM cambios) WHERE usuario = new.usuario;
+END;
+CREATE TRIGGER IF NOT EXISTS usuarios_cambio_borrar AFTER DELETE ON usuarios BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    INSERT INTO lapidas (cambio, tipo, clave) SELECT secuencia, 'usuario', old.usuario FROM cambios;
+END;
+CREATE TRIGGER IF NOT EXISTS proyectos_cambio_insertar AFTER INSERT ON proyectos BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE proyectos SET cambio = (SELECT secuencia FROM cambios) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS proyectos_cambio_actualizar AFTER UPDATE OF nombre, descripcion ON proyectos BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE proyectos SET cambio = (SELECT secuencia FROM cambios) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS proyectos_cambio_borrar AFTER DELETE ON proyectos BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    INSERT INTO lapidas (cambio, tipo, clave) SELECT secuencia, 'proyecto', old.id FROM cambios;
+END;
+CREATE TRIGGER IF NOT EXISTS participantes_cambio_insertar AFTER INSERT ON participantes BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE proyectos SET cambio = (SELECT secuencia FROM cambios) WHERE id = new.proyecto_id;
+END;
+CREATE TRIGGER IF NOT EXISTS participantes_cambio_borrar AFTER DELETE ON participantes BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE proyectos SET cambio = (SELECT secuencia FROM cambios) WHERE id = old.proyecto_id;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_cambio_insertar AFTER INSERT ON tareas BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE tareas SET cambio = (SELECT secuencia FROM cambios) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_cambio_actualizar
+AFTER UPDATE OF titulo, proyecto_id, proyecto_nombre, estado, prioridad, papelera, eliminada ON tareas BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    UPDATE tareas SET cambio = (SELECT secuencia FROM cambios) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS tareas_cambio_borrar AFTER DELETE ON tareas BEGIN
+    UPDATE cambios SET secuencia = secuencia + 1;
+    INSERT INTO lapidas (cambio, tipo, clave) SELECT secuencia, 'tarea', old.id FROM cambios;
+END;
+"""
+
+# columnas anadidas despues de crear las primeras bases: (tabla, columna, definicion)
+COLUMNAS_ANADIDAS = (
+    # retencion de la papelera
+    ("tareas", "eliminada", "REAL"),
+    # sincronizacion por cambios
+    ("usuarios", "cambio", "INTEGER NOT NULL DEFAULT 0"),
+    ("proyectos", "cambio", "INTEGER NOT NULL DEFAULT 0"),
+    ("tareas", "cambio", "INTEGER NOT NULL DEFAULT 0")
+)
+
+COLUMNAS_TAREA = "id, titulo, proyecto_id, proyecto_nombre, estado, prioridad"
+
+# las de papelera llevan ademas la hora de borrado
+COLUMNAS_PAPELERA = COLUMNAS_TAREA + ", eliminada"
+
+# misma ordenacion por prioridad que el repositorio en memoria
+ORDEN_PRIORIDAD = "CASE prioridad WHEN 'alta' THEN 0 WHEN 'baja' THEN 2 ELSE 1 END"
+
+
+def abrir_conexion(ruta):
+    """abre la base de datos en modo wal y crea el esquema si falta"""
+    conexion = sqlite3.connect(ruta)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.execute("PRAGMA foreign_keys=ON")
+    sin_busqueda = conexion.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'busqueda_tareas'"
+    ).fetchone() is None
+    for tabla, columna, definicion in COLUMNAS_ANADIDAS:
+        columnas = [fila["name"] for fila in conexion.execute("PRAGMA table_info(" + tabla + ")")]
+        if len(columnas) > 0 and columna not in columnas:
+            # base creada antes de existir la columna
+            with conexion:
+                conexion.execute("ALTER TABLE " + tabla + " ADD COLUMN " + columna + " " + definicion)
+    conexion.executescript(ESQUEMA)
+    conexion.executescript(DISPARADORES_CAMBIOS)
+    if sin_busqueda:
+        # bases creadas antes de la busqueda: se indexan las tareas que ya tenian
+        with conexion:
+            conexion.execute("INSERT INTO busqueda_tareas (busqueda_tareas) VALUES ('rebuild')")
+    with conexion:
+        # papelera sin hora de borrado: cuenta desde ahora (igual que en memoria)
+        conexion.execute(
+            "UPDATE tareas SET eliminada = ? WHERE papelera = 1 AND eliminada IS NULL", (time.time(),)
+        )
+        podar_lapidas(conexion)
+    return conexion
+
+
+def podar_lapidas(conexion):
+    """si hay mas de MAXIMO_LAPIDAS se quitan las mas antiguas (igual que en memoria)"""
+    if conexion.execute("SELECT 1 FROM lapidas LIMIT 1 OFFSET ?", (MAXIMO_LAPIDAS,)).fetchone() is None:
+        return
+    limite = conexion.execute(
+        "SELECT cambio FROM lapidas ORDER BY cambio DESC LIMIT 1 OFFSET ?", (MAXIMO_LAPIDAS // 2,)
+    ).fetchone()[0]
+    conexion.execute("DELETE FROM lapidas WHERE cambio <= ?", (limite,))
+    conexion.execute("UPDATE cambios SET lapidas_desde = ?", (limite,))
+
+
+def fila_a_tarea(fila):
+    """convierte una fila de la tabla tareas en el dict de siempre"""
+    tarea = {
+        "id": fila["id"],
+        "titulo": fila["titulo"],
+        "proyecto_id": fila["proyecto_id"],
+        "proyecto_nombre": fila["proyecto_nombre"],
+        "estado": fila["estado"],
+        "prioridad": fila["prioridad"]
+    }
+    if "eliminada" in fila.keys():
+        tarea["eliminada"] = fila["eliminada"]
+    return tarea
+
+
+class RepositorioSqlite:
+    """mismas operaciones que Repositorio pero cada cambio es una fila en sqlite"""
+
+    # cada operacion confirma su propia transaccion
+    persistente = True
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        # dentro de aplicar_lote las operaciones no confirman por separado
+        self.en_lote = False
+        # fin del ultimo bloque de ids reservado (aun puede no estar insertado)
+        self.siguiente_id_reservado = 1
+
+    def transaccion(self):
+        """bloque que confirma al salir (o nada si lo confirma el lote que lo contiene)"""
+        if self.en_lote:
+            return contextlib.nullcontext()
+        return self.conexion
+
+    def _siguiente_orden(self, tabla):
+        """posicion al final de la lista (sustituye al append de las listas json)"""
+        fila = self.conexion.execute("SELECT COALESCE(MAX(orden), 0) + 1 FROM " + tabla).fetchone()
+        return fila[0]
+
+    def _participantes(self, proyecto_id):
+        """lista de usuarios de un proyecto en orden de asignacion"""
+        filas = self.conexion.execute(
+            "SELECT usuario FROM participantes WHERE proyecto_id = ? ORDER BY orden",
+            (proyecto_id,)
+        ).fetchall()
+        return [fila["usuario"] for fila in filas]
+
+    def _fila_a_proyecto(self, fila):
+        """convierte una fila de proyectos en el dict de siempre"""
+        return {
+            "id": fila["id"],
+            "nombre": fila["nombre"],
+            "descripcion": fila["descripcion"],
+            "participantes": self._participantes(fila["id"])
+        }
+
+    # consultas de listas completas
+
+    def obtener_usuarios(self):
+        """devuelve el diccionario usuario -> info"""
+        usuarios = {}
+        for fila in self.conexion.execute("SELECT * FROM usuarios ORDER BY orden"):
+            usuarios[fila["usuario"]] = {
+                "password": fila["password"],
+                "rol": fila["rol"],
+                "nombre": fila["nombre"]
+            }
+        return usuarios
+
+    def obtener_usuario(self, usuario):
+        """devuelve la info de un usuario o None si no existe"""
+        fila = self.conexion.execute(
+            "SELECT password, rol, nombre FROM usuarios WHERE usuario = ?", (usuario,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return {"password": fila["password"], "rol": fila["rol"], "nombre": fila["nombre"]}
+
+    def obtener_proyectos(self):
+        """devuelve la lista de proyectos"""
+        filas = self.conexion.execute("SELECT * FROM proyectos ORDER BY id").fetchall()
+        return [self._fila_a_proyecto(fila) for fila in filas]
+
+    def obtener_papelera(self):
+        """devuelve la lista de tareas en papelera"""
+        filas = self.conexion.execute(
+            "SELECT " + COLUMNAS_PAPELERA + " FROM tareas WHERE papelera = 1 ORDER BY orden"
+        ).fetchall()
+        return [fila_a_tarea(fila) for fila in filas]
+
+    def cambios_desde(self, desde, origen=None):
+        """lo cambiado despues del cambio desde (ver controllers/cambios.py)"""
+        # la secuencia se lee antes que las filas: lo que se escriba entre medias
+        # llevara un numero mayor y volvera a llegar en la siguiente peticion
+        fila = self.conexion.execute("SELECT secuencia, lapidas_desde, origen FROM cambios").fetchone()
+        completo = necesita_completo(desde, fila["secuencia"], fila["lapidas_desde"], fila["origen"], origen)
+        delta = delta_vacio(fila["origen"], desde, fila["secuencia"], completo)
+        if completo:
+            # todas las filas, tambien las anteriores a los numeros de cambio
+            desde = -1
+
+        # en el orden de sus listas: la copia anade los nuevos al final en el mismo orden
+        for fila in self.conexion.execute(
+            "SELECT * FROM usuarios WHERE cambio > ? ORDER BY orden", (desde,)
+        ):
+            delta["usuarios"][fila["usuario"]] = {
+                "password": fila["password"],
+                "rol": fila["rol"],
+                "nombre": fila["nombre"],
+                "cambio": fila["cambio"]
+            }
+        for fila in self.conexion.execute(
+            "SELECT * FROM proyectos WHERE cambio > ? ORDER BY id", (desde,)
+        ).fetchall():
+            proyecto = self._fila_a_proyecto(fila)
+            proyecto["cambio"] = fila["cambio"]
+            delta["proyectos"].append(proyecto)
+        for fila in self.conexion.execute(
+            "SELECT " + COLUMNAS_PAPELERA + ", papelera, cambio FROM tareas WHERE cambio > ? ORDER BY orden",
+            (desde,)
+        ):
+            tarea = fila_a_tarea(fila)
+            tarea["cambio"] = fila["cambio"]
+            if fila["papelera"]:
+                delta["papelera"].append(tarea)
+            else:
+                del tarea["eliminada"]
+                delta["tareas"].append(tarea)
+        if not completo:
+            for fila in self.conexion.execute(
+                "SELECT cambio, tipo, clave FROM lapidas WHERE cambio > ? ORDER BY cambio", (desde,)
+            ):
+                delta["lapidas"].append([fila["tipo"], fila["clave"], fila["cambio"]])
+        return delta
+
+    # paginacion: el cursor es (rango de prioridad, 0, orden) de la ultima fila entregada
+
+    def _pagina(self, consulta, parametros, limite, con_rango=False):
+        """ejecuta una consulta paginada (pide una fila de mas para saber si hay mas)"""
+        filas = self.conexion.execute(consulta + " LIMIT ?", parametros + (limite + 1,)).fetchall()
+        pagina = [fila_a_tarea(fila) for fila in filas[:limite]]
+        if len(filas) <= limite:
+            return pagina, None
+        ultima = filas[limite - 1]
+        rango = ultima["rango"] if con_rango else 0
+        return pagina, codificar_cursor([rango, 0, ultima["orden"]])
+
+    def obtener_pagina_tareas_usuario(self, usuario, cursor=None, limite=TAMANO_PAGINA, solo_pendientes=False):
+        """pagina de las tareas del usuario (mismo orden que obtener_tareas_usuario) y cursor siguiente
+
+        solo_pendientes deja fuera las completadas (lista de inicio)
+        """
+        rango, posicion, orden = -1, 0, 0
+        if cursor is not None:
+            rango, posicion, orden = decodificar_cursor(cursor)
+
+        consulta = (
+            "SELECT " + COLUMNAS_TAREA + ", orden, " + ORDEN_PRIORIDAD + " AS rango FROM tareas "
+            "WHERE papelera = 0 AND (" + ORDEN_PRIORIDAD + " > ? OR (" + ORDEN_PRIORIDAD + " = ? AND orden > ?)) "
+        )
+        parametros = (rango, rango, orden)
+        if solo_pendientes:
+            consulta += "AND estado != 'completada' "
+        if not self.es_admin(usuario):
+            consulta += "AND proyecto_id IN (SELECT proyecto_id FROM participantes WHERE usuario = ?) "
+            parametros += (usuario,)
+        return self._pagina(consulta + "ORDER BY rango, orden", parametros, limite, True)
+
+    def obtener_pagina_tareas_proyecto(self, proyecto_id, cursor=None, limite=TAMANO_PAGINA, recientes_primero=False):
+        """pagina de las tareas de un proyecto y cursor siguiente (None si no hay mas)"""
+        consulta = "SELECT " + COLUMNAS_TAREA + ", orden FROM tareas WHERE proyecto_id = ? AND papelera = 0 "
+        parametros = (proyecto_id,)
+        if cursor is not None:
+            orden = decodificar_cursor(cursor)[2]
+            if recientes_primero:
+                consulta += "AND orden < ? "
+            else:
+                consulta += "AND orden > ? "
+            parametros += (orden,)
+        if recientes_primero:
+            consulta += "ORDER BY orden DESC"
+        else:
+            consulta += "ORDER BY orden"
+        return self._pagina(consulta, parametros, limite)
+
+    def obtener_pagina_papelera(self, cursor=None, limite=TAMANO_PAGINA):
+        """pagina de la papelera en orden de borrado y cursor siguiente"""
+        orden = 0
+        if cursor is not None:
+            orden = decodificar_cursor(cursor)[2]
+        return self._pagina(
+            "SELECT " + COLUMNAS_PAPELERA + ", orden FROM tareas WHERE papelera = 1 AND orden > ? ORDER BY orden",
+            (orden,), limite
+        )
+
+    def contar_papelera(self):
+        """numero de tareas en la papelera"""
+        return self.conexion.execute("SELECT COUNT(*) FROM tareas WHERE papelera = 1").fetchone()[0]
+
+    def contar_tareas(self):
+        """numero de tareas activas"""
+        return self.conexion.execute("SELECT COUNT(*) FROM tareas WHERE papelera = 0").fetchone()[0]
+
+    def recorrer_tareas(self, papelera=False):
+        """iterador sobre las tareas activas (o las de papelera) sin cargarlas todas"""
+        cursor = self.conexion.execute(
+            "SELECT " + (COLUMNAS_PAPELERA if papelera else COLUMNAS_TAREA) + " FROM tareas WHERE papelera = ? ORDER BY orden",
+            (1 if papelera else 0,)
+        )
+        for fila in cursor:
+            yield fila_a_tarea(fila)
+
+    def obtener_pagina_tareas(self, cursor=None, limite=TAMANO_PAGINA, papelera=False):
+        """pagina de las tareas activas (o las de papelera) en el orden de recorrer_tareas y cursor siguiente"""
+        if papelera:
+            return self.obtener_pagina_papelera(cursor, limite)
+        orden = 0
+        if cursor is not None:
+            orden = decodificar_cursor(cursor)[2]
+        return self._pagina(
+            "SELECT " + COLUMNAS_TAREA + ", orden FROM tareas WHERE papelera = 0 AND orden > ? ORDER BY orden",
+            (orden,), limite
+        )
+
+    def reservar_ids_tarea(self, cantidad):
+        """reserva cantidad ids de tarea seguidos (importaciones); devuelve el primero"""
+        fila = self.conexion.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM tareas").fetchone()
+        primero = max(fila[0], self.siguiente_id_reservado)
+        self.siguiente_id_reservado = primero + cantidad
+        return primero
+
+    # busqueda
+
+    def buscar_tareas(self, usuario, consulta, limite=LIMITE_RESULTADOS):
+        """tareas visibles para el usuario cuyo titulo o proyecto contiene las palabras de la consulta"""
+        palabras = extraer_palabras(consulta)
+        if len(palabras) == 0:
+            return []
+        # cada palabra como prefijo ("revi"*), todas obligatorias
+        expresion = " ".join('"' + palabra + '"*' for palabra in palabras)
+
+        consulta_sql = (
+            "SELECT " + COLUMNAS_TAREA + " FROM tareas WHERE papelera = 0 "
+            "AND id IN (SELECT rowid FROM busqueda_tareas WHERE busqueda_tareas MATCH ?) "
+        )
+        parametros = (expresion,)
+        if not self.es_admin(usuario):
+            consulta_sql += "AND proyecto_id IN (SELECT proyecto_id FROM participantes WHERE usuario = ?) "
+            parametros += (usuario,)
+        filas = self.conexion.execute(consulta_sql + "ORDER BY orden DESC LIMIT ?", parametros + (limite,)).fetchall()
+        return [fila_a_tarea(fila) for fila in filas]
+
+    # usuarios
+
+    def crear_usuario(self, usuario, password, nombre):
+        """crea un nuevo usuario normal"""
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "INSERT OR IGNORE INTO usuarios (usuario, password, rol, nombre, orden) "
+                "VALUES (?, ?, 'user', ?, ?)",
+                (usuario, password, nombre, self._siguiente_orden("usuarios"))
+            )
+        return cursor.rowcount == 1
+
+    def asegurar_admin(self, password, nombre):
+        """crea el usuario admin si la base no lo tiene"""
+        with self.transaccion():
+            self.conexion.execute(
+                "INSERT OR IGNORE INTO usuarios (usuario, password, rol, nombre, orden) "
+                "VALUES ('admin', ?, 'admin', ?, 0)",
+                (password, nombre)
+            )
+
+    def eliminar_usuario(self, usuario):
+        """elimina un usuario y lo quita de todos los proyectos"""
+        if usuario == "admin":
+            return False
+        with self.transaccion():
+            cursor = self.conexion.execute("DELETE FROM usuarios WHERE usuario = ?", (usuario,))
+            if cursor.rowcount == 0:
+                return False
+            self.conexion.execute("DELETE FROM participantes WHERE usuario = ?", (usuario,))
+        return True
+
+    def es_admin(self, usuario):
+        """comprueba si el usuario es admin"""
+        fila = self.conexion.execute("SELECT rol FROM usuarios WHERE usuario = ?", (usuario,)).fetchone()
+        return fila is not None and fila["rol"] == "admin"
+
+    def cambiar_rol_usuario(self, usuario, nuevo_rol):
+        """cambia el rol de un usuario (no el del admin principal)"""
+        if usuario == "admin":
+            return False
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "UPDATE usuarios SET rol = ? WHERE usuario = ?", (nuevo_rol, usuario)
+            )
+        return cursor.rowcount == 1
+
+    # proyectos
+
+    def crear_proyecto(self, nombre, descripcion="", proyecto_id=None):
+        """crea un nuevo proyecto"""
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "INSERT INTO proyectos (id, nombre, descripcion) VALUES (?, ?, ?)",
+                (proyecto_id, nombre, descripcion)
+            )
+        return {"id": cursor.lastrowid, "nombre": nombre, "descripcion": descripcion, "participantes": []}
+
+    def eliminar_proyecto(self, proyecto_id):
+        """elimina un proyecto, sus tareas y sus tareas de papelera"""
+        with self.transaccion():
+            self.conexion.execute("DELETE FROM tareas WHERE proyecto_id = ?", (proyecto_id,))
+            cursor = self.conexion.execute("DELETE FROM proyectos WHERE id = ?", (proyecto_id,))
+        return cursor.rowcount == 1
+
+    def obtener_proyecto(self, proyecto_id):
+        """obtiene un proyecto por su id"""
+        fila = self.conexion.execute("SELECT * FROM proyectos WHERE id = ?", (proyecto_id,)).fetchone()
+        if fila is None:
+            return None
+        return self._fila_a_proyecto(fila)
+
+    def obtener_proyectos_usuario(self, usuario):
+        """obtiene los proyectos donde participa un usuario (admins ven todos)"""
+        if self.es_admin(usuario):
+            return self.obtener_proyectos()
+
+        filas = self.conexion.execute(
+            "SELECT proyectos.* FROM proyectos JOIN participantes ON participantes.proyecto_id = proyectos.id "
+            "WHERE participantes.usuario = ? ORDER BY proyectos.id",
+            (usuario,)
+        ).fetchall()
+        return [self._fila_a_proyecto(fila) for fila in filas]
+
+    def asignar_usuario_proyecto(self, usuario, proyecto_id):
+        """asigna un usuario a un proyecto"""
+        if self.conexion.execute("SELECT 1 FROM proyectos WHERE id = ?", (proyecto_id,)).fetchone() is None:
+            return False
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "INSERT OR IGNORE INTO participantes (proyecto_id, usuario, orden) VALUES (?, ?, ?)",
+                (proyecto_id, usuario, self._siguiente_orden("participantes"))
+            )
+        return cursor.rowcount == 1
+
+    def desasignar_usuario_proyecto(self, usuario, proyecto_id):
+        """quita un usuario de un proyecto"""
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "DELETE FROM participantes WHERE proyecto_id = ? AND usuario = ?", (proyecto_id, usuario)
+            )
+        return cursor.rowcount == 1
+
+    # tareas
+
+    def crear_tarea(self, titulo, proyecto_id, prioridad="media", tarea_id=None):
+        """crea una nueva tarea en un proyecto"""
+        proyecto = self.conexion.execute(
+            "SELECT nombre FROM proyectos WHERE id = ?", (proyecto_id,)
+        ).fetchone()
+        if proyecto is None:
+            return None
+
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "INSERT INTO tareas (id, titulo, proyecto_id, proyecto_nombre, estado, prioridad, orden) "
+                "VALUES (?, ?, ?, ?, 'pendiente', ?, ?)",
+                (tarea_id, titulo, proyecto_id, proyecto["nombre"], prioridad, self._siguiente_orden("tareas"))
+            )
+        return {
+            "id": cursor.lastrowid,
+            "titulo": titulo,
+            "proyecto_id": proyecto_id,
+            "proyecto_nombre": proyecto["nombre"],
+            "estado": "pendiente",
+            "prioridad": prioridad
+        }
+
+    def obtener_tarea(self, tarea_id):
+        """obtiene una tarea activa por su id"""
+        fila = self.conexion.execute(
+            "SELECT " + COLUMNAS_TAREA + " FROM tareas WHERE id = ? AND papelera = 0", (tarea_id,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return fila_a_tarea(fila)
+
+    def obtener_tareas_proyecto(self, proyecto_id):
+        """obtiene las tareas de un proyecto en orden de creacion"""
+        filas = self.conexion.execute(
+            "SELECT " + COLUMNAS_TAREA + " FROM tareas WHERE proyecto_id = ? AND papelera = 0 ORDER BY orden",
+            (proyecto_id,)
+        ).fetchall()
+        return [fila_a_tarea(fila) for fila in filas]
+
+    def obtener_tareas_usuario(self, usuario):
+        """obtiene las tareas visibles para el usuario ordenadas por prioridad"""
+        if self.es_admin(usuario):
+            filas = self.conexion.execute(
+                "SELECT " + COLUMNAS_TAREA + " FROM tareas WHERE papelera = 0 "
+                "ORDER BY " + ORDEN_PRIORIDAD + ", orden"
+            ).fetchall()
+        else:
+            filas = self.conexion.execute(
+                "SELECT " + COLUMNAS_TAREA + " FROM tareas WHERE papelera = 0 AND proyecto_id IN "
+                "(SELECT proyecto_id FROM participantes WHERE usuario = ?) "
+                "ORDER BY " + ORDEN_PRIORIDAD + ", orden",
+                (usuario,)
+            ).fetchall()
+        return [fila_a_tarea(fila) for fila in filas]
+
+    def cambiar_estado_tarea(self, tarea_id, nuevo_estado, momento=None):
+        """cambia el estado de una tarea (un solo UPDATE)
+
+        sqlite no pasa tareas al archivo de completadas: no guarda la hora (momento)
+        """
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "UPDATE tareas SET estado = ? WHERE id = ? AND papelera = 0", (nuevo_estado, tarea_id)
+            )
+        return cursor.rowcount == 1
+
+    def eliminar_tarea(self, tarea_id, momento=None):
+        """mueve una tarea a la papelera (momento: hora del borrado, al repetir el diario)"""
+        if momento is None:
+            momento = time.time()
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "UPDATE tareas SET papelera = 1, orden = ?, eliminada = ? WHERE id = ? AND papelera = 0",
+                (self._siguiente_orden("tareas"), momento, tarea_id)
+            )
+        return cursor.rowcount == 1
+
+    def recuperar_tareas(self, ids):
+        """recupera tareas de la papelera por id; devuelve True/False por cada una
+
+        solo se recuperan las de proyectos que siguen existiendo
+        """
+        resultados = []
+        with self.transaccion():
+            for tarea_id in ids:
+                cursor = self.conexion.execute(
+                    "UPDATE tareas SET papelera = 0, orden = ?, eliminada = NULL "
+                    "WHERE id = ? AND papelera = 1 AND proyecto_id IN (SELECT id FROM proyectos)",
+                    (self._siguiente_orden("tareas"), tarea_id)
+                )
+                resultados.append(cursor.rowcount == 1)
+        return resultados
+
+    def eliminar_tareas_permanente(self, ids):
+        """elimina tareas de la papelera para siempre; devuelve True/False por cada una"""
+        resultados = []
+        with self.transaccion():
+            for tarea_id in ids:
+                cursor = self.conexion.execute("DELETE FROM tareas WHERE id = ? AND papelera = 1", (tarea_id,))
+                resultados.append(cursor.rowcount == 1)
+        return resultados
+
+    def purgar_papelera(self, limite):
+        """elimina las tareas borradas antes de limite (segundos epoch); devuelve cuantas"""
+        with self.transaccion():
+            cursor = self.conexion.execute(
+                "DELETE FROM tareas WHERE papelera = 1 AND eliminada < ?", (limite,)
+            )
+        return cursor.rowcount
+
+    def _id_en_papelera(self, indice):
+        """id de la tarea en la posicion indice de la papelera (o None)"""
+        if indice < 0:
+            return None
+        fila = self.conexion.execute(
+            "SELECT id FROM tareas WHERE papelera = 1 ORDER BY orden LIMIT 1 OFFSET ?",
+            (indice,)
+        ).fetchone()
+        if fila is None:
+            return None
+        return fila["id"]
+
+    def recuperar_tarea(self, indice):
+        """recupera la tarea en la posicion indice de la papelera (diarios antiguos)"""
+        tarea_id = self._id_en_papelera(indice)
+        if tarea_id is None:
+            return False
+        return self.recuperar_tareas([tarea_id])[0]
+
+    def eliminar_tarea_permanente(self, indice):
+        """elimina la tarea en la posicion indice de la papelera (diarios antiguos)"""
+        tarea_id = self._id_en_papelera(indice)
+        if tarea_id is None:
+            return False
+        return self.eliminar_tareas_permanente([tarea_id])[0]
+
+    def vaciar_papelera(self):
+        """vacia la papelera"""
+        with self.transaccion():
+            self.conexion.execute("DELETE FROM tareas WHERE papelera = 1")
+        return True
+
+
+    # lotes
+
+    def aplicar_lote(self, operaciones, resultados=None):
+        """aplica varias operaciones en una sola transaccion; devuelve el resultado de cada una
+
+        si alguna no es valida no se aplica ninguna, y si una falla se deshacen todas
+        """
+        validar_lote(self, operaciones)
+        if resultados is None:
+            resultados = []
+        with self.conexion:
+            self.en_lote = True
+            try:
+                for nombre, argumentos in operaciones:
+                    resultados.append(getattr(self, nombre)(*argumentos))
+            finally:
+                self.en_lote = False
+        return resultados
+
+
+class DatosSqlite:
+    """datos respaldados por sqlite; se usan a traves de las funciones de datos_controller"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.repositorio = RepositorioSqlite(abrir_conexion(ruta))
+
+    def cerrar(self):
+        """cierra la conexion con la base de datos"""
+        self.repositorio.conexion.close()
+
+
+def migrar_json_a_sqlite(ruta_json, ruta_sqlite):
+    """copia de una vez el contenido de datos.json a una base sqlite nueva"""
+    if os.path.exists(ruta_sqlite):
+        raise FileExistsError("la base de datos ya existe: " + ruta_sqlite)
+
+    # datos.json o la instantanea binaria
+    datos = cargar_instantanea(ruta_json)
+
+    conexion = abrir_conexion(ruta_sqlite)
+    with conexion:
+        orden = 0
+        for usuario in datos.get("usuarios", {}):
+            info = datos["usuarios"][usuario]
+            orden += 1
+            conexion.execute(
+                "INSERT INTO usuarios (usuario, password, rol, nombre, orden) VALUES (?, ?, ?, ?, ?)",
+                (usuario, info.get("password", ""), info.get("rol", "user"), info.get("nombre", usuario), orden)
+            )
+
+        orden = 0
+        for proyecto in datos.get("proyectos", []):
+            conexion.execute(
+                "INSERT INTO proyectos (id, nombre, descripcion) VALUES (?, ?, ?)",
+                (proyecto["id"], proyecto.get("nombre", ""), proyecto.get("descripcion", ""))
+            )
+            for usuario in proyecto.get("participantes", []):
+                orden += 1
+                conexion.execute(
+                    "INSERT OR IGNORE INTO participantes (proyecto_id, usuario, orden) VALUES (?, ?, ?)",
+                    (proyecto["id"], usuario, orden)
+                )
+
+        # las tareas activas van primero y la papelera despues, conservando su orden
+        orden = 0
+        ids_usados = set()
+        for papelera, lista in ((0, datos.get("tareas", [])), (1, datos.get("papelera", []))):
+            for tarea in lista:
+                orden += 1
+                tarea_id = tarea.get("id")
+                if tarea_id in ids_usados:
+                    # ids repetidos de versiones antiguas: sqlite asigna uno nuevo
+                    tarea_id = None
+                ids_usados.add(tarea_id)
+                conexion.execute(
+                    "INSERT INTO tareas (id, titulo, proyecto_id, proyecto_nombre, estado, prioridad, papelera, orden, eliminada) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (tarea_id, tarea.get("titulo", ""), tarea.get("proyecto_id"),
+                     tarea.get("proyecto_nombre", ""), tarea.get("estado", "pendiente"),
+                     tarea.get("prioridad", "media"), papelera, orden, tarea.get("eliminada"))
+                )
+    conexion.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("uso: python -m controllers.almacen_sqlite datos.json datos.sqlite3")
+        sys.exit(1)
+    migrar_json_a_sqlite(sys.argv[1], sys.argv[2])
+    print("migracion completada: " + sys.argv[2])
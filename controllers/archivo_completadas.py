@@ -0,0 +1,287 @@
+"""
+archivo de las tareas completadas hace tiempo, fuera de los datos que se cargan
+
+    carpeta/completadas_<AAAA-MM>.gz    tareas completadas ese mes (.xz con lzma)
+
+los archivos solo crecen: cada archivado anade al final un bloque comprimido (con su
+longitud delante) con una tarea json por linea; restaurar una tarea anade la linea
+{"id": ..., "restaurada": hora} al archivo donde estaba y de cada id vale la ultima
+linea. un bloque cortado al final (se corto la luz) no se lee y se descarta antes de
+escribir el siguiente
+
+nada se lee al arrancar: los archivos se abren al pedir tareas archivadas ("cargar
+anteriores" del tablero, busqueda), del mes mas reciente al mas antiguo, y se quedan
+en memoria mientras no cambian
+"""
+
+import os
+import gzip
+import lzma
+import zlib
+import json
+import time
+import struct
+
+from controllers.busqueda import LIMITE_RESULTADOS, extraer_palabras
+from controllers.repositorio import TAMANO_PAGINA, codificar_cursor, decodificar_cursor
+from controllers.tarea_compacta import json_por_defecto
+
+
+PREFIJO_ARCHIVO = "completadas_"
+
+# compresion -> (extension, comprimir, descomprimir)
+COMPRESIONES = {
+    "gzip": (".gz", gzip.compress, gzip.decompress),
+    "lzma": (".xz", lzma.compress, lzma.decompress)
+}
+
+# longitud del bloque comprimido que va detras
+LONGITUD_BLOQUE = struct.Struct("<I")
+
+
+def mes_de(momento):
+    """"AAAA-MM" (hora local) de un momento en segundos epoch"""
+    return time.strftime("%Y-%m", time.localtime(momento))
+
+
+def compresion_de(ruta):
+    """(extension, comprimir, descomprimir) segun la extension del archivo"""
+    for extension, comprimir, descomprimir in COMPRESIONES.values():
+        if ruta.endswith(extension):
+            return extension, comprimir, descomprimir
+    raise ValueError("archivo de completadas desconocido: " + ruta)
+
+
+def leer_bloques(ruta):
+    """(texto de cada bloque entero, posicion donde acaba el ultimo entero)"""
+    descomprimir = compresion_de(ruta)[2]
+    archivo = open(ruta, "rb")
+    contenido = archivo.read()
+    archivo.close()
+
+    bloques = []
+    posicion = 0
+    while posicion + LONGITUD_BLOQUE.size <= len(contenido):
+        longitud = LONGITUD_BLOQUE.unpack_from(contenido, posicion)[0]
+        fin = posicion + LONGITUD_BLOQUE.size + longitud
+        if fin > len(contenido):
+            break
+        try:
+            bloques.append(descomprimir(contenido[posicion + LONGITUD_BLOQUE.size:fin]).decode("utf-8"))
+        except (OSError, EOFError, zlib.error, lzma.LZMAError):
+            break
+        posicion = fin
+    return bloques, posicion
+
+
+def fin_valido(ruta):
+    """posicion donde acaba el ultimo bloque entero (solo mira las longitudes)"""
+    tamano = os.path.getsize(ruta)
+    archivo = open(ruta, "rb")
+    posicion = 0
+    while posicion + LONGITUD_BLOQUE.size <= tamano:
+        archivo.seek(posicion)
+        longitud = LONGITUD_BLOQUE.unpack(archivo.read(LONGITUD_BLOQUE.size))[0]
+        if posicion + LONGITUD_BLOQUE.size + longitud > tamano:
+            break
+        posicion += LONGITUD_BLOQUE.size + longitud
+    archivo.close()
+    return posicion
+
+
+def coincide(palabras, terminos):
+    """cada termino es prefijo de alguna de las palabras (como en controllers/busqueda.py)"""
+    for termino in terminos:
+        encontrado = False
+        for palabra in palabras:
+            if palabra.startswith(termino):
+                encontrado = True
+                break
+        if not encontrado:
+            return False
+    return True
+
+
+def clave_reciente(tarea):
+    """orden de las tareas archivadas: la completada mas reciente primero"""
+    return tarea.get("completada", 0), tarea.get("id")
+
+
+class ArchivoCompletadas:
+    """archivos de completadas de una carpeta, con lo ya leido en memoria"""
+
+    def __init__(self, carpeta, compresion="gzip"):
+        if compresion not in COMPRESIONES:
+            raise ValueError("compresion desconocida: " + str(compresion))
+        self.carpeta = carpeta
+        self.compresion = compresion
+        # ruta -> [tamano, {tarea_id: tarea o None si se restauro}, {tarea_id: palabras} o None]
+        self.leidos = {}
+
+    def rutas(self):
+        """archivos de la carpeta, del mes mas reciente al mas antiguo"""
+        if not os.path.isdir(self.carpeta):
+            return []
+        encontrados = []
+        for nombre in os.listdir(self.carpeta):
+            if not nombre.startswith(PREFIJO_ARCHIVO):
+                continue
+            for extension, comprimir, descomprimir in COMPRESIONES.values():
+                if nombre.endswith(extension):
+                    encontrados.append((nombre[len(PREFIJO_ARCHIVO):-len(extension)], nombre))
+        return [os.path.join(self.carpeta, nombre) for mes, nombre in sorted(encontrados, reverse=True)]
+
+    def ruta_mes(self, mes):
+        """archivo donde se anaden las tareas completadas en un mes"""
+        return os.path.join(self.carpeta, PREFIJO_ARCHIVO + mes + COMPRESIONES[self.compresion][0])
+
+    def _leer(self, ruta):
+        """lo leido de un archivo (se vuelve a leer si cambio de tamano)"""
+        tamano = os.path.getsize(ruta)
+        leido = self.leidos.get(ruta)
+        if leido is not None and leido[0] == tamano:
+            return leido
+        tareas = {}
+        for bloque in leer_bloques(ruta)[0]:
+            for linea in bloque.splitlines():
+                self._aplicar_linea(tareas, json.loads(linea))
+        leido = [tamano, tareas, None]
+        self.leidos[ruta] = leido
+        return leido
+
+    def _aplicar_linea(self, tareas, registro):
+        """anota una linea del archivo: una tarea archivada o una restaurada"""
+        if "restaurada" in registro:
+            tareas[registro["id"]] = None
+        else:
+            tareas[registro["id"]] = registro
+
+    def _anadir(self, ruta, registros):
+        """anade un bloque con los registros al final de un archivo"""
+        lineas = [
+            json.dumps(registro, ensure_ascii=False, separators=(",", ":"), default=json_por_defecto)
+            for registro in registros
+        ]
+        bloque = compresion_de(ruta)[1]("\n".join(lineas).encode("utf-8"))
+        os.makedirs(self.carpeta, exist_ok=True)
+        leido = self.leidos.get(ruta)
+        if os.path.exists(ruta):
+            tamano = os.path.getsize(ruta)
+            archivo = open(ruta, "r+b")
+            # un bloque cortado al final impediria leer los siguientes
+            archivo.seek(fin_valido(ruta))
+            archivo.truncate()
+        else:
+            tamano = 0
+            archivo = open(ruta, "wb")
+        archivo.write(LONGITUD_BLOQUE.pack(len(bloque)) + bloque)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+        archivo.close()
+
+        if leido is not None and leido[0] == tamano:
+            # lo que ya estaba en memoria se actualiza sin volver a leer el archivo
+            for registro in registros:
+                self._aplicar_linea(leido[1], dict(registro.items()))
+            leido[0] = os.path.getsize(ruta)
+            leido[2] = None
+
+    def _vivas(self):
+        """(tarea_id, tarea, ruta) de las tareas archivadas, del mes mas reciente al mas antiguo"""
+        vistos = set()
+        for ruta in self.rutas():
+            for tarea_id, tarea in self._leer(ruta)[1].items():
+                if tarea_id in vistos:
+                    continue
+                vistos.add(tarea_id)
+                if tarea is not None:
+                    yield tarea_id, tarea, ruta
+
+    # escritura
+
+    def archivar(self, tareas):
+        """anade las tareas completadas al archivo del mes en que se completaron"""
+        por_ruta = {}
+        for tarea in tareas:
+            ruta = self.ruta_mes(mes_de(tarea.get("completada", time.time())))
+            por_ruta.setdefault(ruta, []).append(tarea)
+        for ruta, registros in por_ruta.items():
+            self._anadir(ruta, registros)
+
+    def marcar_restauradas(self, ids):
+        """anota que las tareas volvieron a los datos y ya no estan archivadas"""
+        ids = set(ids)
+        por_ruta = {}
+        ahora = time.time()
+        for tarea_id, tarea, ruta in self._vivas():
+            if tarea_id in ids:
+                por_ruta.setdefault(ruta, []).append({"id": tarea_id, "restaurada": ahora})
+        for ruta, registros in por_ruta.items():
+            self._anadir(ruta, registros)
+
+    # consultas
+
+    def obtener(self, tarea_id):
+        """tarea archivada por id (None si no esta o se restauro)"""
+        for ruta in self.rutas():
+            tareas = self._leer(ruta)[1]
+            if tarea_id in tareas:
+                return tareas[tarea_id]
+        return None
+
+    def pagina_proyecto(self, proyecto_id, cursor=None, limite=TAMANO_PAGINA):
+        """pagina de las tareas archivadas de un proyecto (la completada mas reciente primero) y cursor siguiente
+
+        cada mes se lee solo si la pagina llega hasta el
+        """
+        desde = None if cursor is None else tuple(decodificar_cursor(cursor))
+        pagina = []
+        vistos = set()
+        for ruta in self.rutas():
+            candidatas = []
+            for tarea_id, tarea in self._leer(ruta)[1].items():
+                if tarea_id in vistos:
+                    continue
+                vistos.add(tarea_id)
+                if tarea is None or tarea.get("proyecto_id") != proyecto_id:
+                    continue
+                if desde is None or clave_reciente(tarea) < desde:
+                    candidatas.append(tarea)
+            candidatas.sort(key=clave_reciente, reverse=True)
+            pagina.extend(candidatas[:limite - len(pagina)])
+            if len(pagina) >= limite:
+                return pagina, codificar_cursor(list(clave_reciente(pagina[-1])))
+        return pagina, None
+
+    def buscar(self, consulta, proyectos_ids, limite=LIMITE_RESULTADOS):
+        """tareas archivadas de esos proyectos cuyo titulo o proyecto contiene las palabras de la consulta
+
+        las completadas mas recientes primero, como mucho limite
+        """
+        terminos = extraer_palabras(consulta)
+        if len(terminos) == 0:
+            return []
+        resultados = []
+        vistos = set()
+        for ruta in self.rutas():
+            leido = self._leer(ruta)
+            if leido[2] is None:
+                # las palabras de cada tarea se sacan una vez por archivo
+                leido[2] = {
+                    tarea_id: extraer_palabras(tarea.get("titulo")) + extraer_palabras(tarea.get("proyecto_nombre"))
+                    for tarea_id, tarea in leido[1].items() if tarea is not None
+                }
+            candidatas = []
+            for tarea_id, tarea in leido[1].items():
+                if tarea_id in vistos:
+                    continue
+                vistos.add(tarea_id)
+                if tarea is None or tarea.get("proyecto_id") not in proyectos_ids:
+                    continue
+                if coincide(leido[2][tarea_id], terminos):
+                    candidatas.append(tarea)
+            candidatas.sort(key=clave_reciente, reverse=True)
+            resultados.extend(candidatas[:limite - len(resultados)])
+            if len(resultados) >= limite:
+                break
+        return resultados
@@ -0,0 +1,191 @@
+"""
+indice invertido para buscar tareas por palabras del titulo y del nombre del proyecto
+
+las palabras se guardan normalizadas (minusculas y sin tildes) y cada termino de la
+consulta se busca como prefijo, para poder buscar mientras se escribe
+"""
+
+import re
+import heapq
+import bisect
+import unicodedata
+
+from controllers.repositorio import LIMITE_RESULTADOS
+
+# letras y numeros (el guion bajo separa, igual que en el fts5 de sqlite)
+PATRON_PALABRA = re.compile(r"[^\W_]+")
+
+
+def normalizar(texto):
+    """minusculas y sin tildes: "Revisión" -> "revision" """
+    if texto.isascii():
+        return texto.lower()
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(letra for letra in descompuesto if not unicodedata.combining(letra))
+
+
+def extraer_palabras(texto):
+    """palabras normalizadas de un texto, sin repetir y en orden de aparicion"""
+    return list(dict.fromkeys(PATRON_PALABRA.findall(normalizar(texto or ""))))
+
+
+class IndiceBusqueda:
+    """palabra -> tareas (por titulo) y palabra -> proyectos (por nombre)
+
+    las tareas de cada palabra se guardan como dict en orden de entrada, igual que
+    tareas_por_proyecto, asi que todas las listas estan ordenadas por orden_tareas
+    """
+
+    def __init__(self, orden_tareas):
+        # el mismo dict tarea_id -> orden del repositorio
+        self.orden_tareas = orden_tareas
+        self.tareas_por_palabra = {}
+        self.proyectos_por_palabra = {}
+        # todas las palabras ordenadas: los prefijos se buscan con bisect
+        self.vocabulario = []
+
+    def _anadir_palabra(self, palabra):
+        """registra una palabra nueva en el vocabulario"""
+        if palabra not in self.tareas_por_palabra and palabra not in self.proyectos_por_palabra:
+            bisect.insort(self.vocabulario, palabra)
+
+    def _olvidar_palabra(self, palabra):
+        """quita una palabra del vocabulario si ya no la usa nada"""
+        if palabra not in self.tareas_por_palabra and palabra not in self.proyectos_por_palabra:
+            posicion = bisect.bisect_left(self.vocabulario, palabra)
+            if posicion < len(self.vocabulario) and self.vocabulario[posicion] == palabra:
+                del self.vocabulario[posicion]
+
+    def agregar_tarea(self, tarea):
+        """indexa el titulo de una tarea (va al final de cada palabra)"""
+        for palabra in extraer_palabras(tarea.get("titulo")):
+            self._anadir_palabra(palabra)
+            self.tareas_por_palabra.setdefault(palabra, {})[tarea["id"]] = tarea
+
+    def quitar_tarea(self, tarea):
+        """quita una tarea del indice"""
+        for palabra in extraer_palabras(tarea.get("titulo")):
+            tareas = self.tareas_por_palabra.get(palabra)
+            if tareas is not None:
+                tareas.pop(tarea["id"], None)
+                if len(tareas) == 0:
+                    del self.tareas_por_palabra[palabra]
+                    self._olvidar_palabra(palabra)
+
+    def cargar(self, proyectos, tareas):
+        """monta el indice entero de una pasada (el vocabulario se ordena al final)"""
+        for proyecto in proyectos:
+            self.agregar_proyecto(proyecto)
+        tareas_por_palabra = self.tareas_por_palabra
+        # los titulos repetidos se trocean una sola vez
+        palabras_titulo = {}
+        for tarea in tareas:
+            titulo = tarea.get("titulo")
+            palabras = palabras_titulo.get(titulo)
+            if palabras is None:
+                palabras = extraer_palabras(titulo)
+                palabras_titulo[titulo] = palabras
+            for palabra in palabras:
+                tareas_palabra = tareas_por_palabra.get(palabra)
+                if tareas_palabra is None:
+                    tareas_palabra = {}
+                    tareas_por_palabra[palabra] = tareas_palabra
+                tareas_palabra[tarea["id"]] = tarea
+        self.vocabulario = sorted(set(tareas_por_palabra) | set(self.proyectos_por_palabra))
+
+    def agregar_proyecto(self, proyecto):
+        """indexa el nombre de un proyecto"""
+        for palabra in extraer_palabras(proyecto.get("nombre")):
+            self._anadir_palabra(palabra)
+            self.proyectos_por_palabra.setdefault(palabra, set()).add(proyecto.get("id"))
+
+    def quitar_proyecto(self, proyecto):
+        """quita un proyecto del indice (sus tareas se quitan aparte)"""
+        for palabra in extraer_palabras(proyecto.get("nombre")):
+            proyectos = self.proyectos_por_palabra.get(palabra)
+            if proyectos is not None:
+                proyectos.discard(proyecto.get("id"))
+                if len(proyectos) == 0:
+                    del self.proyectos_por_palabra[palabra]
+                    self._olvidar_palabra(palabra)
+
+    def palabras_con_prefijo(self, prefijo):
+        """palabras del vocabulario que empiezan por el prefijo"""
+        palabras = []
+        posicion = bisect.bisect_left(self.vocabulario, prefijo)
+        while posicion < len(self.vocabulario) and self.vocabulario[posicion].startswith(prefijo):
+            palabras.append(self.vocabulario[posicion])
+            posicion += 1
+        return palabras
+
+    def _termino(self, prefijo, tareas_por_proyecto):
+        """(listas de tareas que lo cumplen, proyectos que lo cumplen por nombre)"""
+        listas = []
+        proyectos = set()
+        for palabra in self.palabras_con_prefijo(prefijo):
+            if palabra in self.tareas_por_palabra:
+                listas.append(self.tareas_por_palabra[palabra])
+            proyectos.update(self.proyectos_por_palabra.get(palabra, ()))
+        for proyecto_id in proyectos:
+            if proyecto_id in tareas_por_proyecto:
+                listas.append(tareas_por_proyecto[proyecto_id])
+        return listas, proyectos
+
+    def buscar(self, consulta, tareas_por_proyecto, proyectos_visibles=None, limite=LIMITE_RESULTADOS):
+        """tareas que cumplen todos los terminos de la consulta, las mas recientes primero
+
+        proyectos_visibles es None (ve todo) o el conjunto de proyectos del usuario;
+        se recorre solo la condicion con menos tareas y las demas se comprueban por tarea
+        """
+        condiciones = []
+        for prefijo in extraer_palabras(consulta):
+            listas, proyectos = self._termino(prefijo, tareas_por_proyecto)
+            condiciones.append((listas, proyectos))
+        if len(condiciones) == 0:
+            return []
+        if proyectos_visibles is not None:
+            # la visibilidad es una condicion mas: sirve de guia si es la mas pequena
+            listas = [tareas_por_proyecto[proyecto_id] for proyecto_id in proyectos_visibles
+                      if proyecto_id in tareas_por_proyecto]
+            condiciones.append((listas, proyectos_visibles))
+
+        # la mas pequena se recorre y el resto se comprueba de menor a mayor
+        condiciones.sort(key=lambda condicion: sum(len(tareas) for tareas in condicion[0]))
+        guia = condiciones[0]
+        resto = condiciones[1:]
+
+        if len(guia[0]) == 1:
+            candidatas = reversed(guia[0][0].values())
+        else:
+            # las listas ya estan ordenadas: mezclarlas al reves da las mas recientes primero
+            orden = self.orden_tareas
+            candidatas = heapq.merge(
+                *[reversed(tareas.values()) for tareas in guia[0]],
+                key=lambda tarea: orden[tarea["id"]], reverse=True
+            )
+
+        resultados = []
+        anterior = None
+        for tarea in candidatas:
+            tarea_id = tarea["id"]
+            # una tarea puede venir de varias listas, siempre seguidas
+            if tarea_id == anterior:
+                continue
+            anterior = tarea_id
+            if self._cumple(tarea_id, tarea.get("proyecto_id"), resto):
+                resultados.append(tarea)
+                if len(resultados) >= limite:
+                    break
+        return resultados
+
+    def _cumple(self, tarea_id, proyecto_id, condiciones):
+        """comprueba que la tarea cumple el resto de terminos (y la visibilidad)"""
+        for listas, proyectos in condiciones:
+            if proyecto_id in proyectos:
+                continue
+            for tareas in listas:
+                if tarea_id in tareas:
+                    break
+            else:
+                return False
+        return True
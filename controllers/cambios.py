@@ -0,0 +1,172 @@
+"""
+numeros de cambio por registro para sincronizar solo lo que cambio
+
+cada usuario, proyecto y tarea (activa o en papelera) lleva "cambio", el numero del
+ultimo cambio que lo toco, y lo que se borra deja una lapida; cambios_desde(n) devuelve
+lo posterior a n (para aplicarlo en otra copia ver controllers/sincronizacion.py)
+
+claves de datos.json:
+    "secuencia_cambios"  ultimo numero de cambio usado
+    "lapidas"            [["tarea", 7, 120], ...] (tipo, id, cambio) de la mas antigua a la mas nueva
+    "lapidas_desde"      las lapidas hasta este numero ya se podaron
+    "origen_cambios"     identificador de estos datos: con otro distinto se empieza de cero
+"""
+
+import uuid
+
+
+TIPO_USUARIO = "usuario"
+TIPO_PROYECTO = "proyecto"
+TIPO_TAREA = "tarea"
+
+# lapidas que se guardan como mucho; al pasar se poda la mitad mas antigua
+MAXIMO_LAPIDAS = 20000
+
+
+def delta_vacio(origen, desde, hasta, completo):
+    """respuesta de cambios_desde sin registros"""
+    return {
+        "origen": origen,
+        "desde": desde,
+        "hasta": hasta,
+        # True: trae todos los registros y la copia debe sustituir los suyos
+        "completo": completo,
+        "usuarios": {},
+        "proyectos": [],
+        "tareas": [],
+        "papelera": [],
+        "lapidas": []
+    }
+
+
+def necesita_completo(desde, hasta, lapidas_desde, origen, origen_copia):
+    """indica si una copia en el cambio desde tiene que recibir todos los datos"""
+    if desde <= 0 or desde > hasta or desde < lapidas_desde:
+        # copia nueva, de otros datos o con lapidas que ya se podaron
+        return True
+    return origen_copia is not None and origen_copia != origen
+
+
+def anadir_lapidas(datos, lapidas):
+    """anade lapidas al final de las de datos podando las mas antiguas si sobran"""
+    # con carga diferida "in" lee la seccion antes de crearla vacia
+    if "lapidas" not in datos:
+        datos["lapidas"] = []
+    todas = datos["lapidas"]
+    todas.extend(lapidas)
+    if len(todas) > MAXIMO_LAPIDAS:
+        podadas = len(todas) - MAXIMO_LAPIDAS // 2
+        datos["lapidas_desde"] = todas[podadas - 1][2]
+        del todas[:podadas]
+
+
+class RegistroCambios:
+    """numera los cambios de un repositorio en memoria y responde cambios_desde"""
+
+    def __init__(self, repositorio):
+        self.repositorio = repositorio
+        # (tipo, id) -> registro, del cambio mas antiguo al mas nuevo; se monta
+        # en la primera consulta y despues se mantiene con cada cambio
+        self.recientes = None
+
+    def siguiente(self):
+        """reserva el siguiente numero de cambio"""
+        datos = self.repositorio.datos
+        if "origen_cambios" not in datos:
+            datos["origen_cambios"] = uuid.uuid4().hex
+        numero = datos.get("secuencia_cambios", 0) + 1
+        datos["secuencia_cambios"] = numero
+        return numero
+
+    def sellar(self, tipo, clave, registro):
+        """marca un registro creado o modificado con un numero de cambio nuevo"""
+        registro["cambio"] = self.siguiente()
+        if self.recientes is not None:
+            # al final: el dict sigue ordenado por numero de cambio
+            self.recientes.pop((tipo, clave), None)
+            self.recientes[(tipo, clave)] = registro
+
+    def lapida(self, tipo, clave):
+        """deja constancia de un registro borrado"""
+        self.lapidas(tipo, [clave])
+
+    def lapidas(self, tipo, claves):
+        """lapida() para varios registros del mismo tipo con una sola escritura de la secuencia"""
+        if len(claves) == 0:
+            return
+        primero = self.siguiente()
+        datos = self.repositorio.datos
+        datos["secuencia_cambios"] = primero + len(claves) - 1
+        if self.recientes is not None:
+            for clave in claves:
+                self.recientes.pop((tipo, clave), None)
+        anadir_lapidas(datos, [[tipo, clave, primero + i] for i, clave in enumerate(claves)])
+
+    def _montar(self):
+        """ordena todos los registros con numero de cambio"""
+        datos = self.repositorio.datos
+        registros = []
+        for usuario, info in datos["usuarios"].items():
+            registros.append((info.get("cambio", 0), TIPO_USUARIO, usuario, info))
+        for proyecto in datos["proyectos"]:
+            registros.append((proyecto.get("cambio", 0), TIPO_PROYECTO, proyecto.get("id"), proyecto))
+        for seccion in ("papelera", "tareas"):
+            for tarea in datos[seccion]:
+                registros.append((tarea.get("cambio", 0), TIPO_TAREA, tarea.get("id"), tarea))
+        registros.sort(key=lambda registro: registro[0])
+        self.recientes = {}
+        for cambio, tipo, clave, registro in registros:
+            if cambio > 0:
+                self.recientes[(tipo, clave)] = registro
+
+    def cambios_desde(self, desde, origen=None):
+        """registros y lapidas con cambio mayor que desde (todo si la copia no puede seguir)"""
+        datos = self.repositorio.datos
+        hasta = datos.get("secuencia_cambios", 0)
+        completo = necesita_completo(
+            desde, hasta, datos.get("lapidas_desde", 0), datos.get("origen_cambios"), origen
+        )
+        delta = delta_vacio(datos.get("origen_cambios"), desde, hasta, completo)
+        if completo:
+            delta["usuarios"] = dict(datos["usuarios"])
+            delta["proyectos"] = list(datos["proyectos"])
+            delta["tareas"] = list(datos["tareas"])
+            delta["papelera"] = list(datos["papelera"])
+            return delta
+
+        if self.recientes is None:
+            self._montar()
+        # desde el final hasta el primer cambio ya conocido por la copia
+        nuevos = []
+        for (tipo, clave), registro in reversed(self.recientes.items()):
+            if registro.get("cambio", 0) <= desde:
+                break
+            nuevos.append((tipo, clave, registro))
+        usuarios = {}
+        papelera_por_id = self.repositorio.papelera_por_id
+        for tipo, clave, registro in nuevos:
+            if tipo == TIPO_USUARIO:
+                usuarios[clave] = registro
+            elif tipo == TIPO_PROYECTO:
+                delta["proyectos"].append(registro)
+            elif clave in papelera_por_id:
+                delta["papelera"].append(registro)
+            else:
+                delta["tareas"].append(registro)
+
+        # en el orden de sus listas: la copia anade los nuevos al final en el mismo orden
+        if len(usuarios) > 0:
+            for usuario in datos["usuarios"]:
+                if usuario in usuarios:
+                    delta["usuarios"][usuario] = usuarios[usuario]
+        delta["proyectos"].sort(key=lambda proyecto: proyecto["id"])
+        orden_tareas = self.repositorio.orden_tareas
+        delta["tareas"].sort(key=lambda tarea: orden_tareas[tarea["id"]])
+        delta["papelera"].sort(key=lambda tarea: orden_tareas[tarea["id"]])
+
+        lapidas = datos.get("lapidas", [])
+        posicion = len(lapidas)
+        while posicion > 0 and lapidas[posicion - 1][2] > desde:
+            posicion -= 1
+        delta["lapidas"] = lapidas[posicion:]
+        return delta
@@ -0,0 +1,119 @@
+"""
+carga diferida de datos.json: lee las secciones de primer nivel solo cuando se usan
+
+el login solo necesita "usuarios", que es la primera clave del archivo; "tareas" y
+"papelera" se leen la primera vez que una vista las toca
+"""
+
+import json
+import mmap
+
+from controllers.repositorio import Datos
+
+
+# con indent=2 cada clave de primer nivel empieza en una linea con dos espacios;
+# lo anidado va mas indentado y los textos no pueden tener saltos de linea sin escapar
+INICIO_SECCION = b'\n  "'
+
+
+class DatosDiferidos(Datos):
+    """Datos que leen cada seccion de datos.json la primera vez que se accede a ella"""
+
+    def __init__(self, mapa):
+        super().__init__()
+        self.mapa = mapa
+        # posicion del salto de linea que precede a la siguiente seccion sin leer
+        self.posicion = mapa.find(INICIO_SECCION)
+        # el login solo necesita los usuarios
+        self._leer_hasta("usuarios")
+
+    def _siguiente_seccion(self):
+        """devuelve la pareja (clave, valor) de la siguiente seccion o None"""
+        if self.posicion < 0:
+            return None
+
+        inicio = self.posicion + 1
+        fin = self.mapa.find(INICIO_SECCION, inicio)
+        self.posicion = fin
+        if fin < 0:
+            # la ultima seccion termina en la llave de cierre del archivo
+            fin = self.mapa.rfind(b"}")
+
+        texto = self.mapa[inicio:fin].rstrip().rstrip(b",")
+        seccion = json.loads(b"{" + texto + b"}")
+        for clave in seccion:
+            return clave, seccion[clave]
+        return None
+
+    def _leer_hasta(self, clave):
+        """lee secciones en orden hasta encontrar la clave (o el final)"""
+        while self.mapa is not None and not dict.__contains__(self, clave):
+            pareja = self._siguiente_seccion()
+            if pareja is None:
+                # todo leido: se suelta el archivo (en windows no se podria reemplazar)
+                self.mapa.close()
+                self.mapa = None
+                return
+            # una seccion reemplazada antes de leerla (p.ej. vaciar papelera) manda
+            if not dict.__contains__(self, pareja[0]):
+                dict.__setitem__(self, pareja[0], pareja[1])
+
+    def cargar_todo(self):
+        """lee todas las secciones pendientes"""
+        self._leer_hasta(None)
+
+    def __missing__(self, clave):
+        self._leer_hasta(clave)
+        if dict.__contains__(self, clave):
+            return dict.__getitem__(self, clave)
+        raise KeyError(clave)
+
+    def __contains__(self, clave):
+        self._leer_hasta(clave)
+        return dict.__contains__(self, clave)
+
+    def get(self, clave, defecto=None):
+        if clave in self:
+            return dict.__getitem__(self, clave)
+        return defecto
+
+    # cualquier recorrido completo (por ejemplo json.dump al guardar) lee todo antes
+
+    def __iter__(self):
+        self.cargar_todo()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.cargar_todo()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.cargar_todo()
+        return dict.keys(self)
+
+    def values(self):
+        self.cargar_todo()
+        return dict.values(self)
+
+    def items(self):
+        self.cargar_todo()
+        return dict.items(self)
+
+
+def abrir_datos_diferidos(ruta):
+    """abre datos.json en modo diferido, o devuelve None si el formato no lo permite"""
+    archivo = open(ruta, "rb")
+    try:
+        mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # archivo vacio
+        return None
+    finally:
+        archivo.close()
+
+    # solo archivos escritos con indent=2 (los que genera la aplicacion)
+    cabecera = mapa[:8].replace(b"\r\n", b"\n")
+    if not cabecera.startswith(b'{\n  "'):
+        mapa.close()
+        return None
+    return DatosDiferidos(mapa)
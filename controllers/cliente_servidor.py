@@ -0,0 +1,188 @@
+"""
+cliente del servidor de datos (backend "servidor", ver controllers/servidor.py)
+
+las conexiones se guardan en un pool y se reutilizan entre peticiones (keep-alive);
+pedir_varias manda varias peticiones seguidas y despues lee todas las respuestas,
+asi cuestan una sola ida y vuelta
+"""
+
+import socket
+import threading
+
+from controllers.repositorio import OPERACIONES_LOTE
+from controllers.protocolo import CABECERA, CONSULTAS, TAREAS_POR_BLOQUE, codificar, decodificar, longitud, excepcion
+
+
+class Conexion:
+    """socket abierto con el servidor"""
+
+    def __init__(self, host, puerto, espera_s):
+        self.socket = socket.create_connection((host, puerto), espera_s)
+        # las peticiones son pequenas: sin esperar a juntar paquetes
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.archivo = self.socket.makefile("rb")
+        # ya se uso para alguna peticion (el servidor pudo cerrarla mientras estaba libre)
+        self.usada = False
+
+    def enviar(self, peticiones):
+        """manda todas las peticiones de una vez"""
+        self.socket.sendall(b"".join(codificar(peticion) for peticion in peticiones))
+
+    def recibir(self):
+        """lee una respuesta"""
+        cabecera = self.archivo.read(CABECERA.size)
+        if len(cabecera) < CABECERA.size:
+            raise ConnectionError("el servidor cerro la conexion")
+        tamano = longitud(cabecera)
+        cuerpo = self.archivo.read(tamano)
+        if len(cuerpo) < tamano:
+            raise ConnectionError("el servidor cerro la conexion")
+        return decodificar(cuerpo)
+
+    def cerrar(self):
+        """cierra el socket"""
+        self.archivo.close()
+        self.socket.close()
+
+
+class ClienteServidor:
+    """pool de conexiones con el servidor de datos"""
+
+    def __init__(self, host, puerto, conexiones=4, espera_s=30):
+        self.host = host
+        self.puerto = puerto
+        self.conexiones = conexiones
+        self.espera_s = espera_s
+        # conexiones abiertas que no esta usando nadie
+        self.libres = []
+        self.cerrojo = threading.Lock()
+        self.siguiente_id = 1
+
+    def _tomar(self):
+        """una conexion libre del pool, o una nueva si no hay"""
+        with self.cerrojo:
+            if len(self.libres) > 0:
+                return self.libres.pop()
+        return Conexion(self.host, self.puerto, self.espera_s)
+
+    def _devolver(self, conexion):
+        """deja la conexion en el pool para la siguiente peticion"""
+        with self.cerrojo:
+            if len(self.libres) < self.conexiones:
+                self.libres.append(conexion)
+                return
+        conexion.cerrar()
+
+    def _numerar(self, peticiones):
+        """mensajes con un id cada uno"""
+        with self.cerrojo:
+            primero = self.siguiente_id
+            self.siguiente_id += len(peticiones)
+        return [
+            {"id": primero + i, "op": nombre, "args": list(argumentos)}
+            for i, (nombre, argumentos) in enumerate(peticiones)
+        ]
+
+    def _intercambiar(self, mensajes):
+        """envia los mensajes por una conexion del pool y lee sus respuestas (en el mismo orden)"""
+        conexion = self._tomar()
+        reutilizada = conexion.usada
+        respuestas = []
+        try:
+            conexion.usada = True
+            conexion.enviar(mensajes)
+            for mensaje in mensajes:
+                respuesta = conexion.recibir()
+                if respuesta.get("id") != mensaje["id"]:
+                    raise ConnectionError("respuesta fuera de orden del servidor")
+                respuestas.append(respuesta)
+        except (OSError, ValueError):
+            conexion.cerrar()
+            if reutilizada and len(respuestas) == 0:
+                # conexion que el servidor cerro mientras estaba en el pool: otra vez con una nueva
+                return self._intercambiar(mensajes)
+            raise
+        self._devolver(conexion)
+        return respuestas
+
+    def respuestas(self, peticiones):
+        """respuestas sin interpretar de varias peticiones [(operacion, argumentos)]"""
+        return self._intercambiar(self._numerar(peticiones))
+
+    def pedir_varias(self, peticiones):
+        """resultados de varias peticiones [(operacion, argumentos)] en una sola ida y vuelta"""
+        respuestas = self.respuestas(peticiones)
+        for respuesta in respuestas:
+            if "error" in respuesta:
+                raise excepcion(respuesta)
+        return [respuesta.get("resultado") for respuesta in respuestas]
+
+    def pedir(self, operacion, *argumentos):
+        """resultado de una peticion"""
+        return self.pedir_varias([(operacion, argumentos)])[0]
+
+    def cerrar(self):
+        """cierra las conexiones del pool"""
+        with self.cerrojo:
+            libres = self.libres
+            self.libres = []
+        for conexion in libres:
+            conexion.cerrar()
+
+
+class RepositorioRemoto:
+    """repositorio cuyas operaciones se ejecutan en el servidor"""
+
+    # el servidor guarda cada operacion por su cuenta
+    persistente = True
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def __getattr__(self, nombre):
+        if nombre not in CONSULTAS and nombre not in OPERACIONES_LOTE:
+            raise AttributeError(nombre)
+
+        def operacion(*argumentos):
+            return self.cliente.pedir(nombre, *argumentos)
+        operacion.__name__ = nombre
+        # la siguiente vez se encuentra sin pasar por aqui
+        setattr(self, nombre, operacion)
+        return operacion
+
+    def pedir_varias(self, consultas):
+        """varias consultas [(nombre, argumentos)] en una sola ida y vuelta"""
+        return self.cliente.pedir_varias(consultas)
+
+    def recorrer_tareas(self, papelera=False):
+        """tareas activas (o de papelera) del servidor, pidiendo un bloque cada vez"""
+        cursor = None
+        while True:
+            tareas, cursor = self.cliente.pedir("obtener_pagina_tareas", cursor, TAREAS_POR_BLOQUE, papelera)
+            for tarea in tareas:
+                yield tarea
+            if cursor is None:
+                return
+
+    def aplicar_lote(self, operaciones, resultados=None):
+        """aplica el lote en el servidor; resultados recibe tambien lo aplicado si falla a medias"""
+        if resultados is None:
+            resultados = []
+        lote = [list(operacion) for operacion in operaciones]
+        respuesta = self.cliente.respuestas([("aplicar_lote", (lote,))])[0]
+        resultados.extend(respuesta.get("resultado") or [])
+        if "error" in respuesta:
+            raise excepcion(respuesta)
+        return resultados
+
+
+class DatosRemotos:
+    """datos que viven en el servidor; se usan a traves de las funciones de datos_controller"""
+
+    def __init__(self, host, puerto, conexiones=4):
+        self.cliente = ClienteServidor(host, puerto, conexiones)
+        self.repositorio = RepositorioRemoto(self.cliente)
+
+    def cerrar(self):
+        """cierra las conexiones con el servidor"""
+        self.cliente.cerrar()
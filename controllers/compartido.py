@@ -0,0 +1,325 @@
+"""
+datos.json compartido entre varias instancias (por ejemplo en un disco de red)
+
+    datos.json          lleva "version" como primera clave; cada escritura la sube en uno
+    datos.json.lock     cerrojo consultivo que se toma solo mientras se escribe
+
+antes de escribir se mira si el archivo cambio desde la ultima lectura; si otra
+instancia escribio entre medias se lee su version y se repiten encima las operaciones
+propias sin guardar (concurrencia optimista: nadie bloquea mientras trabaja)
+"""
+
+import os
+import re
+import json
+import time
+
+from controllers.repositorio import Datos, Repositorio
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+
+# primera clave de datos.json: numero de escrituras
+CLAVE_VERSION = "version"
+
+PATRON_VERSION = re.compile(rb'^\{\s*"' + CLAVE_VERSION.encode() + rb'":\s*(\d+)')
+
+# posiciones de los argumentos que nombran una tarea o un proyecto ya existente
+# (una lista de ids cuenta igual); los ids que crea la operacion van aparte
+ARGUMENTOS_ID = {
+    "crear_tarea": ((), (1,)),
+    "cambiar_estado_tarea": ((0,), ()),
+    "eliminar_tarea": ((0,), ()),
+    "recuperar_tareas": ((0,), ()),
+    "eliminar_tareas_permanente": ((0,), ()),
+    "archivar_tareas": ((0,), ()),
+    "eliminar_proyecto": ((), (0,)),
+    "asignar_usuario_proyecto": ((), (1,)),
+    "desasignar_usuario_proyecto": ((), (1,))
+}
+
+
+def bloquear(archivo):
+    """intenta tomar el cerrojo sin esperar (OSError si lo tiene otro)"""
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+def desbloquear(archivo):
+    """suelta el cerrojo"""
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+    else:
+        archivo.seek(0)
+        msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Cerrojo:
+    """cerrojo de archivo entre procesos: with Cerrojo("datos.json.lock"): ..."""
+
+    def __init__(self, ruta, espera_s=10):
+        self.ruta = ruta
+        self.espera_s = espera_s
+        self.archivo = None
+
+    def __enter__(self):
+        archivo = open(self.ruta, "a+b")
+        limite = time.monotonic() + self.espera_s
+        while True:
+            try:
+                bloquear(archivo)
+                break
+            except OSError:
+                if time.monotonic() >= limite:
+                    archivo.close()
+                    raise TimeoutError("otra instancia esta escribiendo " + self.ruta)
+                time.sleep(0.05)
+        self.archivo = archivo
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        desbloquear(self.archivo)
+        self.archivo.close()
+        self.archivo = None
+        return False
+
+
+def firma_archivo(ruta):
+    """(mtime, tamano, inodo) del archivo o None si no existe: cambia con cada reemplazo"""
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+
+def leer_version(ruta):
+    """version de datos.json leyendo solo el principio del archivo (None si no tiene)"""
+    try:
+        archivo = open(ruta, "rb")
+    except FileNotFoundError:
+        return None
+    inicio = archivo.read(64)
+    archivo.close()
+    # import local: el formato binario (mmap) solo hace falta con datos.bin
+    from controllers.instantanea_binaria import MAGIA, leer_version_binaria
+    if inicio.startswith(MAGIA):
+        return leer_version_binaria(ruta)
+    coincidencia = PATRON_VERSION.match(inicio)
+    if coincidencia is None:
+        return None
+    return int(coincidencia.group(1))
+
+
+def leer_archivo(ruta):
+    """(contenido, firma) de datos.json; la firma es la del archivo que se leyo"""
+    from controllers.instantanea_binaria import InstantaneaBinaria, es_binaria
+    if es_binaria(ruta):
+        instantanea = InstantaneaBinaria(ruta)
+        try:
+            return instantanea.leer_todo(), instantanea.firma
+        finally:
+            instantanea.cerrar()
+    archivo = open(ruta, "r", encoding="utf-8")
+    try:
+        estado = os.fstat(archivo.fileno())
+        contenido = json.load(archivo)
+    finally:
+        archivo.close()
+    return contenido, (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+
+def expandir(operaciones):
+    """operaciones sueltas (un lote se abre en las suyas), con los argumentos como lista"""
+    for nombre, argumentos in operaciones:
+        if nombre == "aplicar_lote":
+            for sub_nombre, sub_argumentos in argumentos[0]:
+                yield sub_nombre, list(sub_argumentos)
+        else:
+            yield nombre, list(argumentos)
+
+
+def traducir(valor, ids):
+    """cambia un id (o una lista de ids) segun el mapa id viejo -> id nuevo"""
+    if isinstance(valor, list):
+        return [ids.get(elemento, elemento) for elemento in valor]
+    return ids.get(valor, valor)
+
+
+def repetir_operaciones(datos, operaciones):
+    """repite operaciones propias sobre los datos de otra instancia
+
+    si un id creado aqui ya lo uso la otra instancia se cambia por uno libre y las
+    operaciones siguientes que lo nombran usan el nuevo; devuelve las operaciones
+    tal como quedaron
+    """
+    repositorio = datos.repositorio
+    ids_tareas = {}
+    ids_proyectos = {}
+    repetidas = []
+    for nombre, argumentos in expandir(operaciones):
+        posiciones_tareas, posiciones_proyectos = ARGUMENTOS_ID.get(nombre, ((), ()))
+        for posicion in posiciones_tareas:
+            if posicion < len(argumentos):
+                argumentos[posicion] = traducir(argumentos[posicion], ids_tareas)
+        for posicion in posiciones_proyectos:
+            if posicion < len(argumentos):
+                argumentos[posicion] = traducir(argumentos[posicion], ids_proyectos)
+
+        if nombre == "crear_tarea" and len(argumentos) > 3:
+            tarea_id = argumentos[3]
+            if tarea_id in repositorio.tareas_por_id or tarea_id in repositorio.papelera_por_id:
+                argumentos[3] = repositorio.nuevo_id_tarea()
+                ids_tareas[tarea_id] = argumentos[3]
+        elif nombre == "crear_proyecto" and len(argumentos) > 2:
+            proyecto_id = argumentos[2]
+            if proyecto_id in repositorio.proyectos_por_id:
+                argumentos[2] = repositorio.nuevo_id_proyecto()
+                ids_proyectos[proyecto_id] = argumentos[2]
+
+        getattr(repositorio, nombre)(*argumentos)
+        repetidas.append((nombre, argumentos))
+    return repetidas
+
+
+def diferencias(anteriores, nuevos):
+    """que cambio entre dos versiones de los datos, para refrescar solo esas vistas
+
+    usuarios y papelera: True/False; proyectos: ids de proyectos cambiados;
+    tareas: ids de los proyectos cuyas tareas activas cambiaron
+    """
+    cambios = {
+        "usuarios": anteriores.get("usuarios") != nuevos.get("usuarios"),
+        "proyectos": set(),
+        "tareas": set(),
+        "papelera": anteriores.get("papelera") != nuevos.get("papelera")
+    }
+
+    proyectos_antes = {proyecto.get("id"): proyecto for proyecto in anteriores.get("proyectos", [])}
+    proyectos_despues = {proyecto.get("id"): proyecto for proyecto in nuevos.get("proyectos", [])}
+    for proyecto_id in proyectos_antes.keys() | proyectos_despues.keys():
+        if proyectos_antes.get(proyecto_id) != proyectos_despues.get(proyecto_id):
+            cambios["proyectos"].add(proyecto_id)
+
+    tareas_antes = {tarea.get("id"): tarea for tarea in anteriores.get("tareas", [])}
+    tareas_despues = {tarea.get("id"): tarea for tarea in nuevos.get("tareas", [])}
+    for tarea_id in tareas_antes.keys() | tareas_despues.keys():
+        antes = tareas_antes.get(tarea_id)
+        despues = tareas_despues.get(tarea_id)
+        if antes != despues:
+            for tarea in (antes, despues):
+                if tarea is not None:
+                    cambios["tareas"].add(tarea.get("proyecto_id"))
+    return cambios
+
+
+def hay_cambios(cambios):
+    """indica si unas diferencias afectan a algo"""
+    return (cambios["usuarios"] or cambios["papelera"]
+            or len(cambios["proyectos"]) > 0 or len(cambios["tareas"]) > 0)
+
+
+def reemplazar_datos(datos, nuevos):
+    """pone en datos (el mismo objeto que usan las vistas) el contenido de nuevos"""
+    anterior = datos.repositorio
+    if hasattr(datos, "cargar_todo"):
+        # datos diferidos: se termina de leer y se suelta el archivo viejo
+        datos.cargar_todo()
+    dict.clear(datos)
+    dict.update(datos, nuevos)
+    # el orden de las tareas se conserva para no romper los cursores de las vistas
+    datos.repositorio = Repositorio(datos, vars(anterior).get("orden_tareas"))
+
+
+class ArchivoCompartido:
+    """lo que se sabe de datos.json: firma de lo ultimo leido o escrito y operaciones sin guardar"""
+
+    def __init__(self, espera_s=10):
+        self.espera_s = espera_s
+        self.ruta = None
+        self.firma = None
+        # (nombre, argumentos) de los cambios propios que aun no estan en el archivo
+        self.pendientes = []
+        # hubo un cambio sin operacion: no se puede repetir y al guardar gana la copia propia
+        self.sin_repetir = False
+        # funcion(cambios) a la que se avisa si al guardar entraron cambios de otra instancia
+        self.avisar = None
+
+    def al_cargar(self, ruta):
+        """apunta la firma del archivo recien cargado"""
+        self.ruta = ruta
+        self.firma = firma_archivo(ruta)
+        self.pendientes = []
+        self.sin_repetir = False
+
+    def anotar(self, operacion, argumentos):
+        """registra un cambio propio hasta la proxima escritura"""
+        if operacion is None:
+            self.sin_repetir = True
+        else:
+            self.pendientes.append((operacion, list(argumentos)))
+
+    def _cambio_fuera(self, ruta, datos):
+        """indica si otra instancia escribio el archivo desde la ultima lectura"""
+        if ruta != self.ruta:
+            # archivo que no se ha leido (otra ruta): no hay con que comparar
+            return False
+        firma = firma_archivo(ruta)
+        if firma is None or firma == self.firma:
+            return False
+        if leer_version(ruta) == datos.get(CLAVE_VERSION):
+            # misma version (copiado o tocado sin cambiar): solo cambia la firma
+            self.firma = firma
+            return False
+        return True
+
+    def _mezclar(self, ruta, datos):
+        """trae la version del archivo y repite encima lo propio; devuelve los cambios"""
+        contenido, firma = leer_archivo(ruta)
+        nuevos = Datos(contenido)
+        self.pendientes = repetir_operaciones(nuevos, self.pendientes)
+        cambios = diferencias(datos, nuevos)
+        reemplazar_datos(datos, nuevos)
+        self.firma = firma
+        return cambios
+
+    def guardar(self, ruta, datos, escribir):
+        """escribe los datos con el cerrojo tomado, mezclando antes si otra instancia escribio"""
+        cambios = None
+        with Cerrojo(ruta + ".lock", self.espera_s):
+            version = datos.get(CLAVE_VERSION, 0)
+            if self._cambio_fuera(ruta, datos):
+                if self.sin_repetir:
+                    # no se puede repetir lo propio: se escribe encima con version mayor
+                    version = max(version, leer_version(ruta) or 0)
+                else:
+                    cambios = self._mezclar(ruta, datos)
+                    version = datos.get(CLAVE_VERSION, 0)
+
+            datos[CLAVE_VERSION] = version + 1
+            # la version va la primera para poder leerla sin cargar el archivo
+            contenido = {CLAVE_VERSION: version + 1}
+            contenido.update(datos)
+            escribir(ruta, contenido)
+            self.ruta = ruta
+            self.firma = firma_archivo(ruta)
+        self.pendientes = []
+        self.sin_repetir = False
+
+        if cambios is not None and hay_cambios(cambios) and self.avisar is not None:
+            self.avisar(cambios)
+
+    def recargar(self, ruta, datos):
+        """trae los cambios que otra instancia escribio; devuelve las diferencias o None"""
+        if self.sin_repetir or not self._cambio_fuera(ruta, datos):
+            # con un cambio sin operacion se espera a guardar (gana la copia propia)
+            return None
+        return self._mezclar(ruta, datos)
@@ -0,0 +1,88 @@
+"""
+configuracion de la aplicacion (configuracion.json opcional junto a datos.json)
+"""
+
+import os
+import json
+
+
+# valores por defecto si no hay archivo o falta alguna clave
+CONFIGURACION_DEFECTO = {
+    "almacenamiento": {
+        # json: datos.json en memoria; sqlite: base de datos con una fila por registro;
+        # servidor: los datos los tiene el proceso de controllers/servidor.py;
+        # fragmentos: un nucleo y un archivo por proyecto en carpeta_fragmentos
+        # (ver controllers/almacen_fragmentos.py)
+        "backend": "json",
+        "archivo_sqlite": "datos.sqlite3",
+        # json: lee tareas y papelera solo cuando una vista las necesita
+        "carga_diferida": True,
+        # json: datos.json; binario: archivo_binario, mas pequeno y leido con mmap
+        # (se convierte desde datos.json la primera vez, ver controllers/instantanea_binaria.py)
+        "formato": "json",
+        "archivo_binario": "datos.bin",
+        "carpeta_fragmentos": "datos_proyectos"
+    },
+    "servidor": {
+        # direccion del servidor de datos (backend "servidor" o --servidor host:puerto)
+        "host": "127.0.0.1",
+        "puerto": 8765,
+        # conexiones que se mantienen abiertas
+        "conexiones": 4
+    },
+    "persistencia": {
+        # inmediato: guarda en cada cambio
+        # lotes: agrupa los cambios de una ventana de tiempo en una escritura
+        # salida: solo guarda al cerrar la aplicacion
+        # diario: anade cada operacion a datos.json.diario y compacta al pasar el umbral
+        "modo": "lotes",
+        "ventana_ms": 500,
+        "umbral_diario_kb": 4096,
+        # varias instancias sobre el mismo datos.json (ver controllers/compartido.py)
+        "vigilar_archivo": True,
+        "espera_cerrojo_s": 10
+    },
+    "papelera": {
+        # las tareas borradas hace mas dias se eliminan solas para siempre; 0 (por
+        # defecto): no caducan nunca. se activa en configuracion.json, por ejemplo
+        # {"papelera": {"dias_retencion": 30}}
+        "dias_retencion": 0,
+        # cada cuanto se buscan tareas caducadas con la aplicacion abierta
+        "intervalo_purga_min": 60
+    },
+    "archivo_completadas": {
+        # las completadas hace mas dias salen de los datos al archivo comprimido
+        # (ver controllers/archivo_completadas.py); 0 (por defecto): no se archivan.
+        # se activa en configuracion.json, por ejemplo {"archivo_completadas": {"dias": 30}}
+        "dias": 0,
+        # gzip o lzma (mas lento, archivos mas pequenos)
+        "compresion": "gzip",
+        "carpeta": "archivo"
+    }
+}
+
+
+def mezclar(base, cambios):
+    """mezcla dos diccionarios de configuracion de forma recursiva"""
+    resultado = dict(base)
+    for clave in cambios:
+        valor = cambios[clave]
+        if isinstance(valor, dict) and isinstance(resultado.get(clave), dict):
+            resultado[clave] = mezclar(resultado[clave], valor)
+        else:
+            resultado[clave] = valor
+    return resultado
+
+
+def cargar_configuracion(ruta):
+    """lee la configuracion del archivo indicado, usando los valores por defecto"""
+    configuracion = CONFIGURACION_DEFECTO
+    if os.path.exists(ruta):
+        archivo = open(ruta, "r", encoding="utf-8")
+        try:
+            configuracion = mezclar(configuracion, json.load(archivo))
+        except ValueError:
+            # un archivo mal escrito no debe impedir arrancar la aplicacion
+            pass
+        archivo.close()
+    return configuracion
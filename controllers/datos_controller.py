@@ -5,6 +5,15 @@ controlador para manejo de datos (json)
 import os
 import sys
 import json
+import time
+from controllers.repositorio import Datos, obtener_repositorio, TAMANO_PAGINA, LIMITE_RESULTADOS
+from controllers.configuracion import cargar_configuracion
+from controllers.persistencia import Persistencia, escribir_json_atomico, MODO_INMEDIATO
+# diario y compartido son ligeros y se usan ya al cargar; el formato binario (mmap)
+# y el archivo de completadas (gzip, lzma) se importan donde se usan
+from controllers.diario import Diario, MODO_DIARIO
+from controllers.compartido import ArchivoCompartido
+from controllers.trazas import trazar
 
 
 def ruta_recurso(ruta_relativa):
@@ -21,6 +30,25 @@ def ruta_recurso(ruta_relativa):
 # rutas de archivos
 DIRECTORIO_VISTAS = ruta_recurso("vistas")
 ARCHIVO_DATOS = ruta_recurso("datos.json")
+ARCHIVO_CONFIGURACION = ruta_recurso("configuracion.json")
+
+CONFIGURACION = cargar_configuracion(ARCHIVO_CONFIGURACION)
+
+# con formato binario los datos se guardan en otro archivo (datos.json queda como estaba)
+FORMATO_BINARIO = CONFIGURACION["almacenamiento"]["formato"] == "binario"
+ARCHIVO_JSON = ARCHIVO_DATOS
+if FORMATO_BINARIO:
+    from controllers.instantanea_binaria import escribir_binario_atomico
+    ARCHIVO_DATOS = ruta_recurso(CONFIGURACION["almacenamiento"]["archivo_binario"])
+    escribir_instantanea = escribir_binario_atomico
+else:
+    escribir_instantanea = escribir_json_atomico
+
+# nucleo + un archivo por proyecto (ver controllers/almacen_fragmentos.py)
+BACKEND_FRAGMENTOS = CONFIGURACION["almacenamiento"]["backend"] == "fragmentos"
+
+# python Main.py --servidor [host:puerto] usa el servidor de datos aunque no este configurado
+ARGUMENTO_SERVIDOR = "--servidor"
 
 
 def obtener_ruta_vista(nombre):
@@ -28,15 +56,81 @@ def obtener_ruta_vista(nombre):
     return os.path.join(DIRECTORIO_VISTAS, nombre)
 
 
+def servidor_configurado(argumentos=None):
+    """(host, puerto) del servidor de datos si se usa, si no None"""
+    if argumentos is None:
+        argumentos = sys.argv
+    host = CONFIGURACION["servidor"]["host"]
+    puerto = CONFIGURACION["servidor"]["puerto"]
+    if ARGUMENTO_SERVIDOR in argumentos:
+        posicion = argumentos.index(ARGUMENTO_SERVIDOR) + 1
+        if posicion < len(argumentos) and not argumentos[posicion].startswith("-"):
+            host, _, valor = argumentos[posicion].rpartition(":")
+            puerto = int(valor)
+        return host, puerto
+    if CONFIGURACION["almacenamiento"]["backend"] == "servidor":
+        return host, puerto
+    return None
+
+
+@trazar("datos")
 def cargar_datos():
-    """carga los datos desde el archivo json"""
+    """carga los datos con el backend configurado (json por defecto)"""
+    # escribe antes lo que quede pendiente para no leer un archivo atrasado
+    persistencia.guardar_pendiente()
+
+    servidor = servidor_configurado()
+    if servidor is not None:
+        return cargar_datos_servidor(servidor[0], servidor[1])
+    return cargar_datos_locales()
+
+
+def cargar_datos_locales():
+    """carga los datos de este equipo: sqlite, fragmentos o datos.json (tambien para el servidor)"""
+    if CONFIGURACION["almacenamiento"]["backend"] == "sqlite":
+        return cargar_datos_sqlite()
+    if BACKEND_FRAGMENTOS:
+        return cargar_datos_fragmentos()
+
+    if FORMATO_BINARIO and not os.path.exists(ARCHIVO_DATOS) and os.path.exists(ARCHIVO_JSON):
+        # primera vez con formato binario: parte de datos.json
+        from controllers.instantanea_binaria import convertir
+        convertir(ARCHIVO_JSON, ARCHIVO_DATOS)
+
+    if MODO_PERSISTENCIA == MODO_DIARIO or diario.hay_registros():
+        # instantanea + operaciones del diario
+        datos = diario.cargar()
+        if MODO_PERSISTENCIA != MODO_DIARIO:
+            # se dejo de usar el diario: se funde en datos.json y se borra
+            diario.reiniciar(datos, escribir_datos)
+        return datos
+
+    if FORMATO_BINARIO and os.path.exists(ARCHIVO_DATOS):
+        # cada seccion se decodifica del mmap la primera vez que se usa
+        from controllers.instantanea_binaria import abrir_datos_binarios
+        compartido.al_cargar(ARCHIVO_DATOS)
+        return abrir_datos_binarios(ARCHIVO_DATOS)
+
+    if os.path.exists(ARCHIVO_DATOS) and CONFIGURACION["almacenamiento"]["carga_diferida"]:
+        # import local: solo hace falta con la carga diferida activada
+        from controllers.carga_diferida import abrir_datos_diferidos
+        datos = abrir_datos_diferidos(ARCHIVO_DATOS)
+        if datos is not None:
+            compartido.al_cargar(ARCHIVO_DATOS)
+            return datos
+
+    compartido.al_cargar(ARCHIVO_DATOS)
     if os.path.exists(ARCHIVO_DATOS):
         archivo = open(ARCHIVO_DATOS, "r", encoding="utf-8")
         datos = json.load(archivo)
         archivo.close()
-        return datos
+        return Datos(datos)
     
-    # datos por defecto con admin
+    return Datos(crear_datos_defecto())
+
+
+def crear_datos_defecto():
+    """datos por defecto con admin"""
     return {
         "usuarios": {
             "admin": {"password": "admin123", "rol": "admin", "nombre": "Administrador"}
@@ -47,66 +141,240 @@ def cargar_datos():
     }
 
 
-def guardar_datos(datos):
-    """guarda los datos en el archivo json"""
-    archivo = open(ARCHIVO_DATOS, "w", encoding="utf-8")
-    json.dump(datos, archivo, ensure_ascii=False, indent=2)
-    archivo.close()
+def cargar_datos_sqlite():
+    """abre la base sqlite, migrando datos.json la primera vez"""
+    # import local: solo se carga sqlite3 si se usa este backend
+    from controllers.almacen_sqlite import DatosSqlite, migrar_json_a_sqlite
+
+    ruta = ruta_recurso(CONFIGURACION["almacenamiento"]["archivo_sqlite"])
+    # con formato binario, datos.json si aun no se escribio el archivo binario
+    origen = ARCHIVO_DATOS if os.path.exists(ARCHIVO_DATOS) else ARCHIVO_JSON
+    if not os.path.exists(ruta) and os.path.exists(origen):
+        migrar_json_a_sqlite(origen, ruta)
+
+    datos = DatosSqlite(ruta)
+    # base nueva sin datos.json: crea el admin por defecto
+    datos.repositorio.asegurar_admin("admin123", "Administrador")
+    return datos
+
+
+def cargar_datos_fragmentos():
+    """abre el nucleo de la carpeta de fragmentos, repartiendo datos.json la primera vez"""
+    # import local: solo hace falta con este backend
+    from controllers.almacen_fragmentos import DatosFragmentados, crear_fragmentos, ARCHIVO_NUCLEO
+    from controllers.instantanea_binaria import cargar_instantanea
+
+    carpeta = ruta_recurso(CONFIGURACION["almacenamiento"]["carpeta_fragmentos"])
+    if not os.path.exists(os.path.join(carpeta, ARCHIVO_NUCLEO)):
+        origen = ARCHIVO_DATOS if os.path.exists(ARCHIVO_DATOS) else ARCHIVO_JSON
+        if os.path.exists(origen):
+            crear_fragmentos(cargar_instantanea(origen), carpeta)
+        else:
+            crear_fragmentos(crear_datos_defecto(), carpeta)
+    return DatosFragmentados(carpeta)
+
+
+def cargar_datos_servidor(host, puerto):
+    """conecta con el servidor de datos; los datos se quedan alli"""
+    # import local: solo hace falta con el backend servidor
+    from controllers.cliente_servidor import DatosRemotos
+
+    datos = DatosRemotos(host, puerto, CONFIGURACION["servidor"]["conexiones"])
+    try:
+        # comprueba la conexion antes de mostrar el login
+        datos.repositorio.contar_papelera()
+    except OSError as error:
+        raise ConnectionError(
+            "no se puede conectar con el servidor de datos en %s:%d (%s)" % (host, puerto, error)
+        )
+    return datos
+
+
+@trazar("io")
+def escribir_datos(datos):
+    """escribe los datos en el archivo (json o binario) de forma atomica"""
+    escribir_instantanea(ARCHIVO_DATOS, datos)
+
+
+@trazar("io")
+def escribir_fragmentos(datos):
+    """escribe el nucleo y los fragmentos de los proyectos que cambiaron"""
+    datos.repositorio.guardar()
+
+
+@trazar("io")
+def escribir_datos_compartidos(datos):
+    """escribe datos.json con el cerrojo, mezclando lo que otra instancia escribiera antes"""
+    compartido.guardar(ARCHIVO_DATOS, datos, escribir_instantanea)
+
+
+MODO_PERSISTENCIA = CONFIGURACION["persistencia"]["modo"]
+
+# datos.json compartido por varias instancias (ver controllers/compartido.py)
+compartido = ArchivoCompartido(CONFIGURACION["persistencia"]["espera_cerrojo_s"])
+
+# agrupa los guardados segun la configuracion (ver controllers/persistencia.py)
+if BACKEND_FRAGMENTOS:
+    # cada fragmento es pequeno: sin diario, el modo diario guarda en cada cambio
+    persistencia = Persistencia(
+        escribir_fragmentos,
+        MODO_INMEDIATO if MODO_PERSISTENCIA == MODO_DIARIO else MODO_PERSISTENCIA,
+        CONFIGURACION["persistencia"]["ventana_ms"]
+    )
+elif MODO_PERSISTENCIA == MODO_DIARIO:
+    # en modo diario solo se reescribe el archivo entero si no hay operacion que anotar
+    persistencia = Persistencia(escribir_datos, MODO_INMEDIATO)
+else:
+    persistencia = Persistencia(
+        escribir_datos_compartidos,
+        MODO_PERSISTENCIA,
+        CONFIGURACION["persistencia"]["ventana_ms"]
+    )
+
+# carpeta -> archivo de tareas completadas hace tiempo (ver controllers/archivo_completadas.py),
+# se crea al primer uso en obtener_archivo_completadas
+archivos_completadas = {}
+
+# diario de operaciones (ver controllers/diario.py)
+diario = Diario(
+    ARCHIVO_DATOS,
+    crear_datos_defecto,
+    CONFIGURACION["persistencia"]["umbral_diario_kb"] * 1024,
+    escribir_instantanea
+)
+
+
+@trazar("datos")
+def guardar_datos(datos, operacion=None, argumentos=()):
+    """registra un cambio; segun el modo se anota en el diario o se marca para escribir"""
+    if obtener_repositorio(datos).persistente:
+        # el almacen ya guarda cada operacion por su cuenta
+        return
+
+    if BACKEND_FRAGMENTOS:
+        # una sola instancia por carpeta: ni diario ni mezcla con otras instancias
+        persistencia.marcar_sucio(datos)
+        return
+
+    if MODO_PERSISTENCIA == MODO_DIARIO:
+        if operacion is not None:
+            diario.anotar(datos, operacion, argumentos)
+        else:
+            # cambio sin operacion conocida: nueva instantanea completa
+            diario.reiniciar(datos, escribir_datos)
+        return
+
+    compartido.anotar(operacion, argumentos)
+    persistencia.marcar_sucio(datos)
+
+
+def guardar_pendientes():
+    """fuerza la escritura de los cambios pendientes"""
+    return persistencia.guardar_pendiente()
+
+
+def ruta_vigilada():
+    """datos.json si hay que vigilar los cambios de otras instancias, si no None"""
+    if CONFIGURACION["almacenamiento"]["backend"] != "json" or MODO_PERSISTENCIA == MODO_DIARIO:
+        # sqlite bloquea por su cuenta, el servidor es el unico que escribe y el
+        # diario es de una sola instancia
+        return None
+    if servidor_configurado() is not None:
+        return None
+    if not CONFIGURACION["persistencia"]["vigilar_archivo"]:
+        return None
+    return ARCHIVO_DATOS
+
+
+@trazar("datos")
+def recargar_datos(datos):
+    """trae a memoria lo que otra instancia escribio en datos.json; devuelve los cambios o None"""
+    if obtener_repositorio(datos).persistente:
+        return None
+    return compartido.recargar(ARCHIVO_DATOS, datos)
+
+
+# consultas generales
+
+def consultar_varias(datos, consultas):
+    """resultados de varias consultas [(nombre, argumentos)]; con el servidor viajan juntas"""
+    repositorio = obtener_repositorio(datos)
+    if hasattr(repositorio, "pedir_varias"):
+        return repositorio.pedir_varias(consultas)
+    return [getattr(repositorio, nombre)(*argumentos) for nombre, argumentos in consultas]
+
+
+def obtener_usuarios(datos):
+    """devuelve el diccionario usuario -> info"""
+    return obtener_repositorio(datos).obtener_usuarios()
+
+
+def obtener_usuario(datos, usuario):
+    """devuelve la info de un usuario o None si no existe"""
+    return obtener_repositorio(datos).obtener_usuario(usuario)
+
+
+def obtener_proyectos(datos):
+    """devuelve la lista de proyectos"""
+    return obtener_repositorio(datos).obtener_proyectos()
+
+
+def obtener_papelera(datos):
+    """devuelve la lista de tareas en papelera"""
+    return obtener_repositorio(datos).obtener_papelera()
+
+
+def contar_papelera(datos):
+    """numero de tareas en la papelera"""
+    return obtener_repositorio(datos).contar_papelera()
+
+
+@trazar("datos")
+def obtener_pagina_papelera(datos, cursor=None, limite=TAMANO_PAGINA):
+    """devuelve (tareas, cursor) de la papelera; cursor es None cuando no hay mas"""
+    return obtener_repositorio(datos).obtener_pagina_papelera(cursor, limite)
+
+
+@trazar("datos")
+def cambios_desde(datos, desde, origen=None):
+    """usuarios, proyectos, tareas y lapidas cambiados despues del cambio desde
+
+    desde es el "hasta" de la respuesta anterior (0 la primera vez) y origen su
+    "origen"; si no se puede continuar desde ahi la respuesta trae "completo": True
+    con todos los registros (ver controllers/cambios.py y controllers/sincronizacion.py)
+    """
+    return obtener_repositorio(datos).cambios_desde(desde, origen)
 
 
 # funciones para usuarios
 
 def crear_usuario(datos, usuario, password, nombre):
     """crea un nuevo usuario normal"""
-    if usuario in datos["usuarios"]:
-        return False
-    
-    datos["usuarios"][usuario] = {
-        "password": password,
-        "rol": "user",
-        "nombre": nombre
-    }
-    guardar_datos(datos)
-    return True
+    if obtener_repositorio(datos).crear_usuario(usuario, password, nombre):
+        guardar_datos(datos, "crear_usuario", (usuario, password, nombre))
+        return True
+    return False
 
 
+@trazar("datos")
 def eliminar_usuario(datos, usuario):
     """elimina un usuario (no permite eliminar admin)"""
-    if usuario == "admin":
-        return False
-    
-    if usuario in datos["usuarios"]:
-        del datos["usuarios"][usuario]
-        
-        # quita al usuario de todos los proyectos
-        for proyecto in datos["proyectos"]:
-            participantes = proyecto.get("participantes", [])
-            if usuario in participantes:
-                participantes.remove(usuario)
-        
-        guardar_datos(datos)
+    if obtener_repositorio(datos).eliminar_usuario(usuario):
+        guardar_datos(datos, "eliminar_usuario", (usuario,))
         return True
-    
     return False
 
 
 def es_admin(datos, usuario):
     """comprueba si el usuario es admin"""
-    if usuario in datos["usuarios"]:
-        return datos["usuarios"][usuario]["rol"] == "admin"
-    return False
+    return obtener_repositorio(datos).es_admin(usuario)
 
 
 def cambiar_rol_usuario(datos, usuario, nuevo_rol):
     """cambia el rol de un usuario (admin o user)"""
-    if usuario == "admin":
-        return False  # no permite cambiar al admin principal
-    
-    if usuario in datos["usuarios"]:
-        datos["usuarios"][usuario]["rol"] = nuevo_rol
-        guardar_datos(datos)
+    if obtener_repositorio(datos).cambiar_rol_usuario(usuario, nuevo_rol):
+        guardar_datos(datos, "cambiar_rol_usuario", (usuario, nuevo_rol))
         return True
-    
     return False
 
 
@@ -114,211 +382,312 @@ def cambiar_rol_usuario(datos, usuario, nuevo_rol):
 
 def crear_proyecto(datos, nombre, descripcion=""):
     """crea un nuevo proyecto"""
-    nuevo_id = len(datos["proyectos"]) + 1
-    proyecto = {
-        "id": nuevo_id,
-        "nombre": nombre,
-        "descripcion": descripcion,
-        "participantes": []
-    }
-    datos["proyectos"].append(proyecto)
-    guardar_datos(datos)
+    proyecto = obtener_repositorio(datos).crear_proyecto(nombre, descripcion)
+    guardar_datos(datos, "crear_proyecto", (nombre, descripcion, proyecto["id"]))
     return proyecto
 
 
+@trazar("datos")
 def eliminar_proyecto(datos, proyecto_id):
     """elimina un proyecto, sus tareas y las tareas de papelera"""
-    # elimina el proyecto de la lista
-    proyectos_nuevos = []
-    for proyecto in datos["proyectos"]:
-        if proyecto.get("id") != proyecto_id:
-            proyectos_nuevos.append(proyecto)
-    datos["proyectos"] = proyectos_nuevos
-    
-    # elimina las tareas del proyecto
-    tareas_nuevas = []
-    for tarea in datos["tareas"]:
-        if tarea.get("proyecto_id") != proyecto_id:
-            tareas_nuevas.append(tarea)
-    datos["tareas"] = tareas_nuevas
-    
-    # tambien elimina las tareas de la papelera de este proyecto
-    papelera_nueva = []
-    for tarea in datos["papelera"]:
-        if tarea.get("proyecto_id") != proyecto_id:
-            papelera_nueva.append(tarea)
-    datos["papelera"] = papelera_nueva
-    
-    guardar_datos(datos)
+    obtener_repositorio(datos).eliminar_proyecto(proyecto_id)
+    guardar_datos(datos, "eliminar_proyecto", (proyecto_id,))
 
 
 def obtener_proyecto(datos, proyecto_id):
     """obtiene un proyecto por su id"""
-    for proyecto in datos["proyectos"]:
-        if proyecto.get("id") == proyecto_id:
-            return proyecto
-    return None
+    return obtener_repositorio(datos).obtener_proyecto(proyecto_id)
 
 
+@trazar("datos")
 def obtener_proyectos_usuario(datos, usuario):
     """obtiene los proyectos donde participa un usuario (admins ven todos)"""
-    # si es admin, ve todos los proyectos
-    if es_admin(datos, usuario):
-        return list(datos["proyectos"])
-    
-    proyectos = []
-    for proyecto in datos["proyectos"]:
-        participantes = proyecto.get("participantes", [])
-        if usuario in participantes:
-            proyectos.append(proyecto)
-    return proyectos
+    return obtener_repositorio(datos).obtener_proyectos_usuario(usuario)
 
 
 def asignar_usuario_proyecto(datos, usuario, proyecto_id):
     """asigna un usuario a un proyecto"""
-    for proyecto in datos["proyectos"]:
-        if proyecto.get("id") == proyecto_id:
-            if "participantes" not in proyecto:
-                proyecto["participantes"] = []
-            
-            if usuario not in proyecto["participantes"]:
-                proyecto["participantes"].append(usuario)
-                guardar_datos(datos)
-                return True
+    if obtener_repositorio(datos).asignar_usuario_proyecto(usuario, proyecto_id):
+        guardar_datos(datos, "asignar_usuario_proyecto", (usuario, proyecto_id))
+        return True
     return False
 
 
 def desasignar_usuario_proyecto(datos, usuario, proyecto_id):
     """quita un usuario de un proyecto"""
-    for proyecto in datos["proyectos"]:
-        if proyecto.get("id") == proyecto_id:
-            participantes = proyecto.get("participantes", [])
-            if usuario in participantes:
-                participantes.remove(usuario)
-                guardar_datos(datos)
-                return True
+    if obtener_repositorio(datos).desasignar_usuario_proyecto(usuario, proyecto_id):
+        guardar_datos(datos, "desasignar_usuario_proyecto", (usuario, proyecto_id))
+        return True
     return False
 
 
 # funciones para tareas
 
+@trazar("datos")
 def crear_tarea(datos, titulo, proyecto_id, prioridad="media"):
     """crea una nueva tarea en un proyecto"""
-    proyecto = obtener_proyecto(datos, proyecto_id)
-    if proyecto is None:
-        return None
-
-    nuevo_id = len(datos["tareas"]) + len(datos["papelera"]) + 1
-    tarea = {
-        "id": nuevo_id,
-        "titulo": titulo,
-        "proyecto_id": proyecto_id,
-        "proyecto_nombre": proyecto["nombre"],
-        "estado": "pendiente",
-        "prioridad": prioridad
-    }
-    datos["tareas"].append(tarea)
-    guardar_datos(datos)
+    tarea = obtener_repositorio(datos).crear_tarea(titulo, proyecto_id, prioridad)
+    if tarea is not None:
+        guardar_datos(datos, "crear_tarea", (titulo, proyecto_id, prioridad, tarea["id"]))
     return tarea
 
 
+def obtener_tarea(datos, tarea_id):
+    """obtiene una tarea activa por su id"""
+    return obtener_repositorio(datos).obtener_tarea(tarea_id)
+
+
+@trazar("datos")
 def obtener_tareas_proyecto(datos, proyecto_id):
     """obtiene las tareas de un proyecto"""
-    tareas = []
-    for tarea in datos["tareas"]:
-        if tarea.get("proyecto_id") == proyecto_id:
-            tareas.append(tarea)
-    return tareas
+    return obtener_repositorio(datos).obtener_tareas_proyecto(proyecto_id)
+
 
+@trazar("datos")
+def obtener_pagina_tareas_proyecto(datos, proyecto_id, cursor=None, limite=TAMANO_PAGINA, recientes_primero=False):
+    """devuelve (tareas, cursor) de un proyecto; cursor es None cuando no hay mas"""
+    return obtener_repositorio(datos).obtener_pagina_tareas_proyecto(proyecto_id, cursor, limite, recientes_primero)
 
+
+@trazar("datos")
 def obtener_tareas_usuario(datos, usuario):
     """obtiene las tareas de los proyectos donde participa el usuario (admins ven todas)"""
-    # si es admin, ve todas las tareas
-    if es_admin(datos, usuario):
-        tareas = list(datos["tareas"])
-    else:
-        # obtiene los ids de los proyectos del usuario
-        proyectos_ids = []
-        for proyecto in datos["proyectos"]:
-            participantes = proyecto.get("participantes", [])
-            if usuario in participantes:
-                proyectos_ids.append(proyecto.get("id"))
-
-        # filtra las tareas de esos proyectos
-        tareas = []
-        for tarea in datos["tareas"]:
-            if tarea.get("proyecto_id") in proyectos_ids:
-                tareas.append(tarea)
-
-    # ordena por prioridad (alta primero, baja ultimo)
-    orden_prioridad = {"alta": 0, "media": 1, "baja": 2}
-    
-    # ordenacion simple con bucle (bubble sort simplificado)
-    for i in range(len(tareas)):
-        for j in range(i + 1, len(tareas)):
-            prioridad_i = tareas[i].get("prioridad", "media")
-            prioridad_j = tareas[j].get("prioridad", "media")
-            orden_i = orden_prioridad.get(prioridad_i, 1)
-            orden_j = orden_prioridad.get(prioridad_j, 1)
-            if orden_i > orden_j:
-                # intercambia
-                temporal = tareas[i]
-                tareas[i] = tareas[j]
-                tareas[j] = temporal
-    
-    return tareas
+    return obtener_repositorio(datos).obtener_tareas_usuario(usuario)
+
+
+@trazar("datos")
+def obtener_pagina_tareas_usuario(datos, usuario, cursor=None, limite=TAMANO_PAGINA, solo_pendientes=False):
+    """devuelve (tareas, cursor) en el orden de obtener_tareas_usuario; cursor es None cuando no hay mas
+
+    solo_pendientes pagina solo las pendientes y en curso
+    """
+    return obtener_repositorio(datos).obtener_pagina_tareas_usuario(usuario, cursor, limite, solo_pendientes)
 
 
+@trazar("datos")
+def buscar_tareas(datos, usuario, consulta):
+    """tareas visibles para el usuario que coinciden con la consulta (prefijos), las mas recientes primero"""
+    return obtener_repositorio(datos).buscar_tareas(usuario, consulta)
+
+
+@trazar("datos")
 def cambiar_estado_tarea(datos, tarea_id, nuevo_estado):
     """cambia el estado de una tarea"""
-    for tarea in datos["tareas"]:
-        if tarea.get("id") == tarea_id:
-            tarea["estado"] = nuevo_estado
-            guardar_datos(datos)
-            return True
+    # la hora va en el diario para que los dias hasta archivarla cuenten igual al repetirlo
+    momento = time.time()
+    if obtener_repositorio(datos).cambiar_estado_tarea(tarea_id, nuevo_estado, momento):
+        guardar_datos(datos, "cambiar_estado_tarea", (tarea_id, nuevo_estado, momento))
+        return True
     return False
 
 
+@trazar("datos")
 def eliminar_tarea(datos, tarea_id):
     """mueve una tarea a la papelera"""
-    for i in range(len(datos["tareas"])):
-        tarea = datos["tareas"][i]
-        if tarea.get("id") == tarea_id:
-            tarea_eliminada = datos["tareas"].pop(i)
-            datos["papelera"].append(tarea_eliminada)
-            guardar_datos(datos)
-            return True
+    # la hora va en el diario para que la retencion cuente igual al repetirlo
+    momento = time.time()
+    if obtener_repositorio(datos).eliminar_tarea(tarea_id, momento):
+        guardar_datos(datos, "eliminar_tarea", (tarea_id, momento))
+        return True
     return False
 
 
-def recuperar_tarea(datos, indice):
-    """recupera una tarea de la papelera (solo si el proyecto existe)"""
-    if indice >= 0 and indice < len(datos["papelera"]):
-        tarea = datos["papelera"][indice]
-        
-        # comprueba que el proyecto aun existe
-        proyecto = obtener_proyecto(datos, tarea.get("proyecto_id"))
-        if proyecto is None:
-            # el proyecto fue borrado, no se puede recuperar
-            return False
-        
-        tarea = datos["papelera"].pop(indice)
-        datos["tareas"].append(tarea)
-        guardar_datos(datos)
-        return True
-    return False
+@trazar("datos")
+def recuperar_tareas(datos, ids):
+    """recupera tareas de la papelera por id (solo si su proyecto existe); True/False por cada una"""
+    ids = list(ids)
+    resultados = obtener_repositorio(datos).recuperar_tareas(ids)
+    if True in resultados:
+        guardar_datos(datos, "recuperar_tareas", (ids,))
+    return resultados
 
 
-def eliminar_tarea_permanente(datos, indice):
-    """elimina una tarea permanentemente de la papelera"""
-    if indice >= 0 and indice < len(datos["papelera"]):
-        datos["papelera"].pop(indice)
-        guardar_datos(datos)
-        return True
-    return False
+@trazar("datos")
+def eliminar_tareas_permanente(datos, ids):
+    """elimina tareas de la papelera para siempre; True/False por cada una"""
+    ids = list(ids)
+    resultados = obtener_repositorio(datos).eliminar_tareas_permanente(ids)
+    if True in resultados:
+        guardar_datos(datos, "eliminar_tareas_permanente", (ids,))
+    return resultados
+
+
+def dias_retencion():
+    """dias que se guardan las tareas en la papelera (0: no caducan)"""
+    return CONFIGURACION["papelera"]["dias_retencion"]
+
 
+@trazar("datos")
+def purgar_papelera_caducada(datos, dias=None):
+    """elimina de la papelera las tareas con mas dias que la retencion; devuelve cuantas"""
+    if dias is None:
+        dias = dias_retencion()
+    if dias <= 0:
+        return 0
+    limite = time.time() - dias * 24 * 3600
+    purgadas = obtener_repositorio(datos).purgar_papelera(limite)
+    if purgadas > 0:
+        guardar_datos(datos, "purgar_papelera", (limite,))
+    return purgadas
 
+
+@trazar("datos")
 def vaciar_papelera(datos):
     """vacia la papelera"""
-    datos["papelera"] = []
-    guardar_datos(datos)
+    obtener_repositorio(datos).vaciar_papelera()
+    guardar_datos(datos, "vaciar_papelera")
+
+
+# archivo de completadas
+
+def obtener_archivo_completadas():
+    """archivo de completadas de la carpeta configurada (se crea la primera vez)"""
+    carpeta = ruta_recurso(CONFIGURACION["archivo_completadas"]["carpeta"])
+    if carpeta not in archivos_completadas:
+        # import local: gzip y lzma no hacen falta hasta archivar o consultar el archivo
+        from controllers.archivo_completadas import ArchivoCompletadas
+        archivos_completadas[carpeta] = ArchivoCompletadas(
+            carpeta, CONFIGURACION["archivo_completadas"]["compresion"]
+        )
+    return archivos_completadas[carpeta]
+
+
+def archiva_completadas(datos):
+    """True si el almacen de estos datos sabe pasar tareas al archivo (sqlite y servidor no)"""
+    return hasattr(obtener_repositorio(datos), "archivar_tareas")
+
+
+def archivo_disponible(datos):
+    """True si hay archivo de completadas que consultar ("cargar anteriores", busqueda)
+
+    esta activado en la configuracion o quedan archivos de cuando lo estuvo
+    """
+    if not archiva_completadas(datos):
+        return False
+    return CONFIGURACION["archivo_completadas"]["dias"] > 0 or len(obtener_archivo_completadas().rutas()) > 0
+
+
+@trazar("datos")
+def archivar_completadas(datos, dias=None):
+    """pasa al archivo las tareas completadas hace mas de dias; devuelve las que salieron"""
+    if dias is None:
+        dias = CONFIGURACION["archivo_completadas"]["dias"]
+    if dias <= 0 or not archiva_completadas(datos):
+        return []
+    repositorio = obtener_repositorio(datos)
+    ahora = time.time()
+    if repositorio.sellar_completadas(ahora) > 0:
+        # completadas de antes del archivo: los dias cuentan desde ahora; va como
+        # operacion para anotarla en el diario y repetirla al mezclar con otra instancia
+        guardar_datos(datos, "sellar_completadas", (ahora,))
+
+    tareas = repositorio.completadas_antes(ahora - dias * 24 * 3600)
+    if len(tareas) == 0:
+        return []
+    # primero el archivo: si se corta antes de guardar los datos la tarea queda en
+    # los dos sitios (y se muestra desde los datos), nunca en ninguno
+    obtener_archivo_completadas().archivar(tareas)
+    ids = [tarea["id"] for tarea in tareas]
+    repositorio.archivar_tareas(ids)
+    guardar_datos(datos, "archivar_tareas", (ids,))
+    return tareas
+
+
+@trazar("datos")
+def obtener_pagina_archivadas(datos, proyecto_id, cursor=None):
+    """pagina de tareas archivadas de un proyecto (la completada mas reciente primero) y cursor siguiente"""
+    if not archivo_disponible(datos):
+        return [], None
+    tareas, cursor = obtener_archivo_completadas().pagina_proyecto(proyecto_id, cursor)
+    activas = obtener_repositorio(datos).tareas_por_id
+    return [tarea for tarea in tareas if tarea["id"] not in activas], cursor
+
+
+@trazar("datos")
+def buscar_archivadas(datos, usuario, consulta, limite=LIMITE_RESULTADOS):
+    """tareas archivadas visibles para el usuario que coinciden con la consulta"""
+    if not archivo_disponible(datos):
+        return []
+    repositorio = obtener_repositorio(datos)
+    proyectos_ids = repositorio.proyectos_visibles(usuario)
+    if proyectos_ids is None:
+        # todos los que siguen existiendo
+        proyectos_ids = set(repositorio.proyectos_por_id)
+    tareas = obtener_archivo_completadas().buscar(consulta, proyectos_ids, limite)
+    return [tarea for tarea in tareas if tarea["id"] not in repositorio.tareas_por_id]
+
+
+@trazar("datos")
+def restaurar_archivada(datos, tarea_id):
+    """devuelve una tarea archivada a los datos, como completada ahora; True si se restauro"""
+    if not archivo_disponible(datos):
+        return False
+    tarea = obtener_archivo_completadas().obtener(tarea_id)
+    if tarea is None:
+        return False
+    momento = time.time()
+    if not obtener_repositorio(datos).restaurar_archivadas([tarea], momento)[0]:
+        return False
+    guardar_datos(datos, "restaurar_archivadas", ([tarea], momento))
+    # los datos se escriben antes de anotarla en el archivo, por el mismo motivo
+    # que al archivar
+    guardar_pendientes()
+    obtener_archivo_completadas().marcar_restauradas([tarea_id])
+    return True
+
+
+# lotes
+
+def registro_operacion(nombre, argumentos, resultado):
+    """argumentos con los que se repite una operacion (con el id asignado al crear)"""
+    if nombre == "crear_tarea" and resultado is not None:
+        prioridad = argumentos[2] if len(argumentos) > 2 else "media"
+        return [nombre, [argumentos[0], argumentos[1], prioridad, resultado["id"]]]
+    if nombre == "crear_proyecto":
+        descripcion = argumentos[1] if len(argumentos) > 1 else ""
+        return [nombre, [argumentos[0], descripcion, resultado["id"]]]
+    return [nombre, list(argumentos)]
+
+
+# operaciones que guardan su hora -> numero de argumentos cuando no la traen
+OPERACIONES_FECHADAS = {"eliminar_tarea": 1, "cambiar_estado_tarea": 2}
+
+
+def fechar_operacion(operacion, momento):
+    """pone la hora a un eliminar_tarea o cambiar_estado_tarea que no la trae
+
+    asi la retencion de la papelera y los dias hasta archivar cuentan igual al
+    repetir el diario o mezclar con otra instancia
+    """
+    if isinstance(operacion, (tuple, list)) and len(operacion) == 2 and operacion[0] in OPERACIONES_FECHADAS:
+        argumentos = operacion[1]
+        if isinstance(argumentos, (tuple, list)) and len(argumentos) == OPERACIONES_FECHADAS[operacion[0]]:
+            return (operacion[0], tuple(argumentos) + (momento,))
+    return operacion
+
+
+@trazar("datos")
+def aplicar_lote(datos, operaciones, resultados=None):
+    """aplica varias operaciones y las guarda una sola vez; devuelve el resultado de cada una
+
+    operaciones es una lista de (nombre, argumentos) con las funciones de este modulo, p.ej.
+    [("asignar_usuario_proyecto", ("ana", 3)), ("cambiar_estado_tarea", (7, "completada"))];
+    si alguna no es valida (ValueError) no se aplica ninguna; resultados (si se pasa)
+    recibe tambien los de las aplicadas antes de un fallo a medias
+    """
+    repositorio = obtener_repositorio(datos)
+    momento = time.time()
+    operaciones = [fechar_operacion(operacion, momento) for operacion in operaciones]
+    if resultados is None:
+        resultados = []
+    try:
+        repositorio.aplicar_lote(operaciones, resultados)
+    finally:
+        # lo aplicado se guarda aunque una operacion falle a medias
+        if len(resultados) > 0:
+            registros = [
+                registro_operacion(operaciones[i][0], operaciones[i][1], resultados[i])
+                for i in range(len(resultados))
+            ]
+            guardar_datos(datos, "aplicar_lote", (registros,))
+    return resultados
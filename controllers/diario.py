@@ -0,0 +1,176 @@
+"""
+diario de operaciones: cada cambio se anade como una linea y se compacta en segundo plano
+
+archivos (junto a datos.json):
+    datos.json                  ultima instantanea completa
+    datos.json.diario           operaciones posteriores, una por linea
+    datos.json.diario.sellado   tramo que se esta compactando
+"""
+
+import os
+import json
+import threading
+
+from controllers.repositorio import Datos, OPERACIONES_LOTE
+from controllers.persistencia import escribir_json_atomico
+from controllers.trazas import trazar
+
+
+# operaciones del repositorio que se pueden repetir desde el diario
+# (un lote entero es un solo registro con sus operaciones; las del archivo de
+# completadas no van en lotes porque tambien escriben el archivo)
+OPERACIONES_DIARIO = OPERACIONES_LOTE + (
+    "aplicar_lote", "sellar_completadas", "archivar_tareas", "restaurar_archivadas"
+)
+
+# modo de persistencia que usa el diario en lugar de reescribir datos.json
+MODO_DIARIO = "diario"
+
+# clave de la instantanea con el numero del ultimo registro ya incluido
+CLAVE_SECUENCIA = "secuencia_diario"
+
+
+def leer_registros(ruta):
+    """lee los registros de un archivo de diario (ignora una ultima linea cortada)"""
+    registros = []
+    if not os.path.exists(ruta):
+        return registros
+    archivo = open(ruta, "r", encoding="utf-8")
+    for linea in archivo:
+        linea = linea.strip()
+        if linea == "":
+            continue
+        try:
+            registros.append(json.loads(linea))
+        except ValueError:
+            # la ultima linea puede quedar a medias si se corto la luz
+            break
+    archivo.close()
+    return registros
+
+
+def aplicar_registros(datos, registros):
+    """repite sobre los datos los registros que aun no incluyen"""
+    repositorio = datos.repositorio
+    for registro in registros:
+        if registro["n"] <= datos.get(CLAVE_SECUENCIA, 0):
+            continue
+        operacion = registro["op"]
+        if operacion not in OPERACIONES_DIARIO:
+            raise ValueError("operacion desconocida en el diario: " + str(operacion))
+        getattr(repositorio, operacion)(*registro["args"])
+        datos[CLAVE_SECUENCIA] = registro["n"]
+
+
+class Diario:
+    """anade operaciones al diario y compacta en segundo plano al pasar el umbral"""
+
+    def __init__(self, ruta_instantanea, crear_datos_defecto, umbral_bytes=4 * 1024 * 1024,
+                 escribir=escribir_json_atomico):
+        self.ruta_instantanea = ruta_instantanea
+        # escribir(ruta, datos) de la instantanea: json o binaria
+        self.escribir = escribir
+        self.crear_datos_defecto = crear_datos_defecto
+        self.ruta_diario = ruta_instantanea + ".diario"
+        self.ruta_sellado = ruta_instantanea + ".diario.sellado"
+        self.umbral_bytes = umbral_bytes
+        self.archivo = None
+        self.compactador = None
+        # evita leer la instantanea mientras el compactador la sustituye
+        self.cerrojo = threading.Lock()
+
+    def _leer_instantanea(self):
+        """datos de la ultima instantanea (o los de por defecto si no hay)"""
+        if os.path.exists(self.ruta_instantanea):
+            # import local: json o binaria, se sabe al leerla
+            from controllers.instantanea_binaria import cargar_instantanea
+            return Datos(cargar_instantanea(self.ruta_instantanea))
+        return Datos(self.crear_datos_defecto())
+
+    def cargar(self):
+        """carga la ultima instantanea y repite el sellado y el diario pendientes"""
+        self.esperar_compactacion()
+        self._cerrar_archivo()
+        with self.cerrojo:
+            datos = self._leer_instantanea()
+            aplicar_registros(datos, leer_registros(self.ruta_sellado))
+            aplicar_registros(datos, leer_registros(self.ruta_diario))
+        return datos
+
+    def hay_registros(self):
+        """indica si quedan operaciones fuera de la instantanea"""
+        return os.path.exists(self.ruta_diario) or os.path.exists(self.ruta_sellado)
+
+    @trazar("io")
+    def anotar(self, datos, operacion, argumentos):
+        """anade una operacion al diario; cuesta lo que ocupa el cambio"""
+        numero = datos.get(CLAVE_SECUENCIA, 0) + 1
+        datos[CLAVE_SECUENCIA] = numero
+
+        if self.archivo is None:
+            self._recortar_linea_cortada()
+            self.archivo = open(self.ruta_diario, "a", encoding="utf-8")
+        registro = {"n": numero, "op": operacion, "args": list(argumentos)}
+        self.archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+
+        if self.archivo.tell() >= self.umbral_bytes:
+            self.compactar_en_segundo_plano()
+
+    def _recortar_linea_cortada(self):
+        """quita una ultima linea a medias para no mezclarla con los registros nuevos"""
+        if not os.path.exists(self.ruta_diario):
+            return
+        archivo = open(self.ruta_diario, "rb+")
+        contenido = archivo.read()
+        if len(contenido) > 0 and not contenido.endswith(b"\n"):
+            archivo.truncate(contenido.rfind(b"\n") + 1)
+        archivo.close()
+
+    def _cerrar_archivo(self):
+        """cierra el diario activo"""
+        if self.archivo is not None:
+            self.archivo.close()
+            self.archivo = None
+
+    def compactar_en_segundo_plano(self):
+        """sella el diario actual y lo funde con la instantanea en otro hilo"""
+        if self.compactador is not None and self.compactador.is_alive():
+            # sigue la compactacion anterior; el diario crece hasta la siguiente
+            return
+        if os.path.exists(self.ruta_sellado):
+            # un sellado de una ejecucion anterior: se compacta antes de sellar otro
+            self.compactador = threading.Thread(target=self._compactar_sellado, name="compactador-diario")
+            self.compactador.start()
+            return
+
+        self._cerrar_archivo()
+        os.replace(self.ruta_diario, self.ruta_sellado)
+        self.compactador = threading.Thread(target=self._compactar_sellado, name="compactador-diario")
+        self.compactador.start()
+
+    @trazar("io")
+    def _compactar_sellado(self):
+        """instantanea + sellado -> nueva instantanea (no toca los datos en memoria)"""
+        datos = self._leer_instantanea()
+        aplicar_registros(datos, leer_registros(self.ruta_sellado))
+        with self.cerrojo:
+            self.escribir(self.ruta_instantanea, datos)
+            os.remove(self.ruta_sellado)
+
+    def esperar_compactacion(self):
+        """espera a que termine la compactacion en curso"""
+        if self.compactador is not None:
+            self.compactador.join()
+            self.compactador = None
+
+    def reiniciar(self, datos, escribir):
+        """escribe una instantanea completa con escribir(datos) y descarta el diario"""
+        self.esperar_compactacion()
+        self._cerrar_archivo()
+        with self.cerrojo:
+            escribir(datos)
+            for ruta in (self.ruta_sellado, self.ruta_diario):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
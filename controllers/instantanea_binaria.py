@@ -0,0 +1,559 @@
+"""
+instantanea binaria de los datos: alternativa compacta a datos.json que se lee con mmap
+
+    cabecera      "TBIN", version del formato, "version" de los datos (para compartido.py),
+                  posicion de la tabla de cadenas y del directorio
+    registros     por seccion: [u32 longitud][u16 campos presentes][campos...] uno tras otro
+    indices       por seccion: posicion de cada registro (u32, desde el inicio de la seccion)
+    cadenas       tabla de textos sin repetir (estado, prioridad, proyecto_nombre, titulos...)
+    directorio    json con cada seccion: tipo, cantidad y posiciones
+
+los campos de cada tipo de registro estan en ESQUEMAS (enteros, reales y cadenas de la
+tabla); un registro que no encaja (otra clave, otro tipo u otro orden) se guarda entero
+en json, asi la conversion ida y vuelta con datos.json no pierde nada
+
+uso: python -m controllers.instantanea_binaria entrada salida
+     (datos.json -> datos.bin o al reves, segun el formato de la entrada)
+"""
+
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+import tempfile
+
+from controllers.repositorio import Datos
+from controllers.persistencia import escribir_json_atomico
+from controllers.tarea_compacta import TareaCompacta, json_por_defecto
+
+
+MAGIA = b"TBIN"
+VERSION_FORMATO = 1
+
+# magia, version del formato, reservado, "version" de los datos (-1 si no tiene),
+# posicion de la tabla de cadenas, posicion del directorio
+CABECERA = struct.Struct("<4sHHqQQ")
+# longitud del resto del registro y mascara de campos presentes
+CABECERA_REGISTRO = struct.Struct("<IH")
+ENTERO_32 = struct.Struct("<I")
+
+# mascara de un registro guardado entero en json
+REGISTRO_JSON = 0x8000
+
+ENTERO = "q"
+REAL = "d"
+CADENA = "I"
+# lista de cadenas: cantidad y una cadena por elemento
+CADENAS = "*"
+
+# secciones que se guardan registro a registro; usuarios es un mapa usuario -> info
+# y su clave va antes de los campos
+CAMPOS_TAREA = (
+    ("id", ENTERO), ("titulo", CADENA), ("proyecto_id", ENTERO), ("proyecto_nombre", CADENA),
+    ("estado", CADENA), ("prioridad", CADENA), ("cambio", ENTERO), ("eliminada", REAL),
+    ("completada", REAL)
+)
+ESQUEMAS = {
+    "usuarios": (("password", CADENA), ("rol", CADENA), ("nombre", CADENA), ("cambio", ENTERO)),
+    "proyectos": (
+        ("id", ENTERO), ("nombre", CADENA), ("descripcion", CADENA),
+        ("participantes", CADENAS), ("cambio", ENTERO)
+    ),
+    "tareas": CAMPOS_TAREA,
+    "papelera": CAMPOS_TAREA
+}
+
+# secciones que son un mapa clave -> registro (las demas con esquema son listas)
+SECCIONES_MAPA = ("usuarios",)
+
+TIPO_LISTA = "lista"
+TIPO_MAPA = "mapa"
+TIPO_VALOR = "valor"
+
+MINIMO_ENTERO = -2 ** 63
+MAXIMO_ENTERO = 2 ** 63 - 1
+
+
+def es_binaria(ruta):
+    """indica si el archivo es una instantanea binaria"""
+    try:
+        archivo = open(ruta, "rb")
+    except FileNotFoundError:
+        return False
+    magia = archivo.read(len(MAGIA))
+    archivo.close()
+    return magia == MAGIA
+
+
+def encaja(valor, tipo):
+    """comprueba si un valor se puede guardar con el tipo de su campo"""
+    if tipo == ENTERO:
+        return type(valor) is int and MINIMO_ENTERO <= valor <= MAXIMO_ENTERO
+    if tipo == REAL:
+        return type(valor) is float
+    if tipo == CADENA:
+        return type(valor) is str
+    return type(valor) is list and all(type(elemento) is str for elemento in valor)
+
+
+class Codificador:
+    """convierte los datos en los bytes de una instantanea"""
+
+    def __init__(self):
+        self.cadenas = {}
+        self.partes = [b""]
+        self.posicion = CABECERA.size
+        # (esquema, mascara) -> (struct de los campos fijos, tipos presentes)
+        self.formatos = {}
+
+    def _anadir(self, contenido):
+        """anade bytes al final del archivo; devuelve su posicion"""
+        posicion = self.posicion
+        self.partes.append(contenido)
+        self.posicion += len(contenido)
+        return posicion
+
+    def _cadena(self, texto):
+        """numero de un texto en la tabla de cadenas"""
+        numero = self.cadenas.get(texto)
+        if numero is None:
+            numero = len(self.cadenas)
+            self.cadenas[texto] = numero
+        return numero
+
+    def _formato(self, esquema, mascara):
+        """struct para los campos fijos presentes en la mascara"""
+        clave = (esquema, mascara)
+        formato = self.formatos.get(clave)
+        if formato is None:
+            tipos = [tipo for i, (campo, tipo) in enumerate(esquema) if mascara & (1 << i)]
+            fijos = "".join(tipo for tipo in tipos if tipo != CADENAS)
+            formato = (struct.Struct("<" + fijos), tipos)
+            self.formatos[clave] = formato
+        return formato
+
+    def _campos(self, registro, esquema):
+        """bytes de los campos del registro, o None si no encaja en el esquema"""
+        if type(registro) is not dict and type(registro) is not TareaCompacta:
+            return None
+        mascara = 0
+        valores = []
+        listas = []
+        i = 0
+        for campo, valor in registro.items():
+            # las claves tienen que ir en el orden del esquema
+            while i < len(esquema) and esquema[i][0] != campo:
+                i += 1
+            if i == len(esquema):
+                return None
+            tipo = esquema[i][1]
+            if not encaja(valor, tipo):
+                return None
+            if tipo == CADENA:
+                valor = self._cadena(valor)
+            if tipo == CADENAS:
+                listas.append([self._cadena(elemento) for elemento in valor])
+            else:
+                valores.append(valor)
+            mascara |= 1 << i
+            i += 1
+        fijos, tipos = self._formato(esquema, mascara)
+        if len(listas) == 0:
+            return mascara, fijos.pack(*valores)
+        # con listas cada campo va en su sitio: se empaqueta por partes
+        partes = []
+        for tipo in tipos:
+            if tipo == CADENAS:
+                lista = listas.pop(0)
+                partes.append(struct.pack("<I%dI" % len(lista), len(lista), *lista))
+            else:
+                partes.append(struct.pack("<" + tipo, valores.pop(0)))
+        return mascara, b"".join(partes)
+
+    def _registro(self, registro, esquema, clave=None):
+        """(mascara, bytes) de un registro con su longitud delante"""
+        campos = self._campos(registro, esquema)
+        if campos is None:
+            # no encaja: el registro entero (y su clave) en json
+            contenido = registro if clave is None else [clave, registro]
+            mascara = REGISTRO_JSON
+            cuerpo = json.dumps(
+                contenido, ensure_ascii=False, separators=(",", ":"), default=json_por_defecto
+            ).encode("utf-8")
+        else:
+            mascara, cuerpo = campos
+            if clave is not None:
+                cuerpo = ENTERO_32.pack(self._cadena(clave)) + cuerpo
+        return mascara, CABECERA_REGISTRO.pack(len(cuerpo) + 2, mascara) + cuerpo
+
+    def _seccion(self, clave, valor):
+        """escribe una seccion; devuelve su entrada del directorio"""
+        esquema = ESQUEMAS.get(clave)
+        tipo = TIPO_VALOR
+        if type(valor) is list:
+            tipo = TIPO_LISTA
+        elif type(valor) is dict and clave in SECCIONES_MAPA:
+            tipo = TIPO_MAPA
+        if tipo == TIPO_VALOR:
+            contenido = json.dumps(valor, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            return {"clave": clave, "tipo": tipo, "posicion": self._anadir(contenido), "longitud": len(contenido)}
+
+        if esquema is None:
+            # lista sin esquema: cada elemento en json, pero con acceso por posicion
+            esquema = ()
+        if tipo == TIPO_MAPA:
+            codificados = [self._registro(info, esquema, usuario) for usuario, info in valor.items()]
+        else:
+            codificados = [self._registro(registro, esquema) for registro in valor]
+
+        registros = []
+        indice = array.array("I")
+        # [cantidad, mascara] de cada tramo de registros seguidos con la misma mascara:
+        # sin listas miden todos lo mismo y se leen de una vez
+        tramos = []
+        desplazamiento = 0
+        for mascara, registro in codificados:
+            registros.append(registro)
+            indice.append(desplazamiento)
+            desplazamiento += len(registro)
+            if len(tramos) > 0 and tramos[-1][1] == mascara:
+                tramos[-1][0] += 1
+            else:
+                tramos.append([1, mascara])
+        if sys.byteorder == "big":
+            indice.byteswap()
+        posicion = self._anadir(b"".join(registros))
+        return {
+            "clave": clave, "tipo": tipo, "cantidad": len(registros), "tramos": tramos,
+            "posicion": posicion, "indice": self._anadir(indice.tobytes())
+        }
+
+    def codificar(self, datos):
+        """bytes de la instantanea completa"""
+        directorio = []
+        for clave, valor in datos.items():
+            directorio.append(self._seccion(clave, valor))
+
+        textos = [texto.encode("utf-8") for texto in self.cadenas]
+        limites = array.array("I", [0])
+        for texto in textos:
+            limites.append(limites[-1] + len(texto))
+        if sys.byteorder == "big":
+            limites.byteswap()
+        posicion_cadenas = self._anadir(
+            ENTERO_32.pack(len(textos)) + limites.tobytes() + b"".join(textos)
+        )
+        posicion_directorio = self._anadir(json.dumps(directorio, ensure_ascii=False).encode("utf-8"))
+
+        version = datos.get("version")
+        if type(version) is not int:
+            version = -1
+        self.partes[0] = CABECERA.pack(MAGIA, VERSION_FORMATO, 0, version, posicion_cadenas, posicion_directorio)
+        return b"".join(self.partes)
+
+
+def codificar_instantanea(datos):
+    """bytes de la instantanea binaria de unos datos"""
+    return Codificador().codificar(datos)
+
+
+def escribir_binario_atomico(ruta, datos):
+    """escribe la instantanea binaria en un temporal y lo renombra (como escribir_json_atomico)"""
+    contenido = codificar_instantanea(datos)
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=".datos-", suffix=".tmp", dir=directorio)
+    try:
+        archivo = os.fdopen(descriptor, "wb")
+        try:
+            archivo.write(contenido)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        finally:
+            archivo.close()
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+
+
+class InstantaneaBinaria:
+    """lectura de una instantanea con mmap: cada registro se decodifica al pedirlo"""
+
+    def __init__(self, ruta):
+        archivo = open(ruta, "rb")
+        try:
+            self.mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            # firma del archivo mapeado, como compartido.firma_archivo
+            estado = os.fstat(archivo.fileno())
+            self.firma = (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+        finally:
+            archivo.close()
+        magia, version_formato, reservado, version, posicion_cadenas, posicion_directorio = \
+            CABECERA.unpack_from(self.mapa, 0)
+        if magia != MAGIA or version_formato != VERSION_FORMATO:
+            self.mapa.close()
+            raise ValueError("no es una instantanea binaria compatible: " + ruta)
+        self.version = version if version >= 0 else None
+
+        cantidad = ENTERO_32.unpack_from(self.mapa, posicion_cadenas)[0]
+        self.limites = self._enteros(posicion_cadenas + 4, cantidad + 1)
+        self.inicio_textos = posicion_cadenas + 4 + 4 * (cantidad + 1)
+        # textos ya decodificados (los repetidos se decodifican una vez)
+        self.textos = [None] * cantidad
+        self.secciones = {}
+        for entrada in json.loads(self.mapa[posicion_directorio:].decode("utf-8")):
+            self.secciones[entrada["clave"]] = entrada
+        # (esquema, mascara) -> (struct de los campos fijos, campos presentes)
+        self.formatos = {}
+
+    def _enteros(self, posicion, cantidad):
+        """array de u32 guardado en el archivo"""
+        enteros = array.array("I")
+        enteros.frombytes(self.mapa[posicion:posicion + 4 * cantidad])
+        if sys.byteorder == "big":
+            enteros.byteswap()
+        return enteros
+
+    def cadena(self, numero):
+        """texto de la tabla de cadenas"""
+        texto = self.textos[numero]
+        if texto is None:
+            inicio = self.inicio_textos + self.limites[numero]
+            texto = self.mapa[inicio:self.inicio_textos + self.limites[numero + 1]].decode("utf-8")
+            self.textos[numero] = texto
+        return texto
+
+    def _formato(self, esquema, mascara):
+        clave = (esquema, mascara)
+        formato = self.formatos.get(clave)
+        if formato is None:
+            campos = [(campo, tipo) for i, (campo, tipo) in enumerate(esquema) if mascara & (1 << i)]
+            formato = (struct.Struct("<" + "".join(tipo for campo, tipo in campos)), campos)
+            self.formatos[clave] = formato
+        return formato
+
+    def _decodificar(self, posicion, esquema, es_mapa):
+        """registro (o pareja clave, registro en un mapa) que empieza en posicion"""
+        mapa = self.mapa
+        longitud, mascara = CABECERA_REGISTRO.unpack_from(mapa, posicion)
+        inicio = posicion + CABECERA_REGISTRO.size
+        if mascara & REGISTRO_JSON:
+            contenido = json.loads(mapa[inicio:posicion + 4 + longitud].decode("utf-8"))
+            return tuple(contenido) if es_mapa else contenido
+
+        clave = None
+        if es_mapa:
+            clave = self.cadena(ENTERO_32.unpack_from(mapa, inicio)[0])
+            inicio += 4
+        registro = {}
+        if any(tipo == CADENAS for campo, tipo in esquema):
+            # campos de longitud variable: uno a uno
+            for i, (campo, tipo) in enumerate(esquema):
+                if not mascara & (1 << i):
+                    continue
+                if tipo == CADENAS:
+                    cantidad = ENTERO_32.unpack_from(mapa, inicio)[0]
+                    numeros = struct.unpack_from("<%dI" % cantidad, mapa, inicio + 4)
+                    registro[campo] = [self.cadena(numero) for numero in numeros]
+                    inicio += 4 + 4 * cantidad
+                else:
+                    valor = struct.unpack_from("<" + tipo, mapa, inicio)[0]
+                    registro[campo] = self.cadena(valor) if tipo == CADENA else valor
+                    inicio += struct.calcsize("<" + tipo)
+        else:
+            fijos, campos = self._formato(esquema, mascara)
+            for (campo, tipo), valor in zip(campos, fijos.unpack_from(mapa, inicio)):
+                registro[campo] = self.cadena(valor) if tipo == CADENA else valor
+        if es_mapa:
+            return clave, registro
+        return registro
+
+    def cantidad(self, clave):
+        """numero de registros de una seccion lista o mapa (sin decodificarlos)"""
+        return self.secciones[clave].get("cantidad", 0)
+
+    def registro(self, clave, posicion):
+        """un solo registro de una seccion (en un mapa, la pareja (clave, info))"""
+        entrada = self.secciones[clave]
+        if posicion < 0 or posicion >= entrada["cantidad"]:
+            raise IndexError(posicion)
+        desplazamiento = ENTERO_32.unpack_from(self.mapa, entrada["indice"] + 4 * posicion)[0]
+        return self._decodificar(
+            entrada["posicion"] + desplazamiento, ESQUEMAS.get(clave, ()), entrada["tipo"] == TIPO_MAPA
+        )
+
+    def seccion(self, clave):
+        """valor completo de una seccion"""
+        entrada = self.secciones[clave]
+        if entrada["tipo"] == TIPO_VALOR:
+            inicio = entrada["posicion"]
+            return json.loads(self.mapa[inicio:inicio + entrada["longitud"]].decode("utf-8"))
+
+        esquema = ESQUEMAS.get(clave, ())
+        es_mapa = entrada["tipo"] == TIPO_MAPA
+        fijo = all(tipo != CADENAS for campo, tipo in esquema)
+        posicion = entrada["posicion"]
+        desplazamientos = self._enteros(entrada["indice"], entrada["cantidad"])
+        registros = []
+        primero = 0
+        for cantidad, mascara in entrada["tramos"]:
+            if fijo and not mascara & REGISTRO_JSON:
+                registros.extend(self._tramo(posicion + desplazamientos[primero], cantidad, esquema, mascara, es_mapa))
+            else:
+                for numero in range(primero, primero + cantidad):
+                    registros.append(self._decodificar(posicion + desplazamientos[numero], esquema, es_mapa))
+            primero += cantidad
+        if es_mapa:
+            return dict(registros)
+        return registros
+
+    def _tramo(self, posicion, cantidad, esquema, mascara, es_mapa):
+        """registros seguidos con la misma mascara y campos fijos, desempaquetados de una vez"""
+        fijos, campos = self._formato(esquema, mascara)
+        # longitud, mascara, (clave del mapa) y campos
+        fila = struct.Struct(CABECERA_REGISTRO.format + ("I" if es_mapa else "") + fijos.format[1:])
+        filas = fila.iter_unpack(self.mapa[posicion:posicion + fila.size * cantidad])
+        columnas = list(zip(*filas))[2:]
+        if len(columnas) == 0:
+            # registros vacios de una lista
+            return [{} for i in range(cantidad)]
+        cadena = self.cadena
+        if es_mapa:
+            claves = [cadena(numero) for numero in columnas.pop(0)]
+        for i, (campo, tipo) in enumerate(campos):
+            if tipo == CADENA:
+                columnas[i] = [cadena(numero) for numero in columnas[i]]
+        nombres = [campo for campo, tipo in campos]
+        registros = [dict(zip(nombres, valores)) for valores in zip(*columnas)]
+        if es_mapa:
+            return list(zip(claves, registros))
+        return registros
+
+    def leer_todo(self):
+        """dict con todas las secciones en el orden del archivo"""
+        return {clave: self.seccion(clave) for clave in self.secciones}
+
+    def cerrar(self):
+        """suelta el archivo"""
+        if self.mapa is not None:
+            self.mapa.close()
+            self.mapa = None
+
+
+class DatosBinarios(Datos):
+    """Datos que decodifican cada seccion de la instantanea la primera vez que se usa"""
+
+    def __init__(self, instantanea):
+        super().__init__()
+        self.instantanea = instantanea
+        # secciones aun sin leer, en el orden del archivo
+        self.pendientes = list(instantanea.secciones)
+
+    def _leer(self, clave):
+        """decodifica una seccion si esta pendiente"""
+        if self.instantanea is None or clave not in self.pendientes:
+            return
+        self.pendientes.remove(clave)
+        # una seccion reemplazada antes de leerla (p.ej. vaciar papelera) manda
+        if not dict.__contains__(self, clave):
+            dict.__setitem__(self, clave, self.instantanea.seccion(clave))
+        if len(self.pendientes) == 0:
+            # todo leido: se suelta el archivo (en windows no se podria reemplazar)
+            self.instantanea.cerrar()
+            self.instantanea = None
+
+    def cargar_todo(self):
+        """lee todas las secciones pendientes"""
+        while self.instantanea is not None:
+            self._leer(self.pendientes[0])
+
+    def __missing__(self, clave):
+        self._leer(clave)
+        if dict.__contains__(self, clave):
+            return dict.__getitem__(self, clave)
+        raise KeyError(clave)
+
+    def __contains__(self, clave):
+        self._leer(clave)
+        return dict.__contains__(self, clave)
+
+    def get(self, clave, defecto=None):
+        if clave in self:
+            return dict.__getitem__(self, clave)
+        return defecto
+
+    # cualquier recorrido completo (por ejemplo al guardar) lee todo antes
+
+    def __iter__(self):
+        self.cargar_todo()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.cargar_todo()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.cargar_todo()
+        return dict.keys(self)
+
+    def values(self):
+        self.cargar_todo()
+        return dict.values(self)
+
+    def items(self):
+        self.cargar_todo()
+        return dict.items(self)
+
+
+def abrir_datos_binarios(ruta):
+    """abre la instantanea en modo diferido: el login solo decodifica los usuarios"""
+    datos = DatosBinarios(InstantaneaBinaria(ruta))
+    datos.get("usuarios")
+    return datos
+
+
+def leer_version_binaria(ruta):
+    """"version" de los datos leyendo solo la cabecera (None si no tiene)"""
+    archivo = open(ruta, "rb")
+    cabecera = archivo.read(CABECERA.size)
+    archivo.close()
+    if len(cabecera) < CABECERA.size:
+        return None
+    version = CABECERA.unpack(cabecera)[3]
+    return version if version >= 0 else None
+
+
+def cargar_instantanea(ruta):
+    """dict con el contenido de una instantanea, binaria o json"""
+    if es_binaria(ruta):
+        instantanea = InstantaneaBinaria(ruta)
+        try:
+            return instantanea.leer_todo()
+        finally:
+            instantanea.cerrar()
+    archivo = open(ruta, "r", encoding="utf-8")
+    try:
+        return json.load(archivo)
+    finally:
+        archivo.close()
+
+
+def convertir(entrada, salida):
+    """convierte datos.json en instantanea binaria o al reves; devuelve el formato escrito"""
+    datos = cargar_instantanea(entrada)
+    if es_binaria(entrada):
+        escribir_json_atomico(salida, datos)
+        return "json"
+    escribir_binario_atomico(salida, datos)
+    return "binario"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("uso: python -m controllers.instantanea_binaria entrada salida")
+        sys.exit(1)
+    formato = convertir(sys.argv[1], sys.argv[2])
+    print("convertido a " + formato + ": " + sys.argv[2])
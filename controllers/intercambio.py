@@ -0,0 +1,396 @@
+"""
+importacion y exportacion de proyectos, tareas y papelera en csv o ndjson
+
+se lee y se escribe fila a fila (memoria constante aunque el archivo ocupe gigas); al
+importar las filas se aplican en lotes con los ids reservados de una vez
+
+progreso(hechas, total) se llama cada cierto numero de filas (al importar, en bytes
+leidos del archivo); si devuelve False la operacion se detiene tras el lote en curso
+
+uso:
+    python -m controllers.intercambio exportar tareas tareas.csv
+    python -m controllers.intercambio importar tareas tareas.ndjson
+"""
+
+import os
+import csv
+import sys
+import json
+import tempfile
+
+from controllers.repositorio import obtener_repositorio, PRIORIDADES
+from controllers.datos_controller import (
+    aplicar_lote, obtener_proyectos, obtener_usuarios, guardar_pendientes
+)
+
+
+FORMATO_CSV = "csv"
+FORMATO_NDJSON = "ndjson"
+
+# extension del archivo -> formato
+EXTENSIONES = {".csv": FORMATO_CSV, ".ndjson": FORMATO_NDJSON, ".jsonl": FORMATO_NDJSON}
+
+SECCIONES = ("proyectos", "tareas", "papelera")
+
+COLUMNAS = {
+    "proyectos": ("id", "nombre", "descripcion", "participantes"),
+    "tareas": ("id", "titulo", "proyecto_id", "proyecto_nombre", "estado", "prioridad"),
+    "papelera": ("id", "titulo", "proyecto_id", "proyecto_nombre", "estado", "prioridad")
+}
+
+ESTADOS = ("pendiente", "en_curso", "completada")
+
+# en csv los participantes van en una sola columna
+SEPARADOR_PARTICIPANTES = ";"
+
+# filas que se aplican (y se guardan) de una vez al importar
+TAMANO_BLOQUE = 5000
+
+# cada cuantas filas se avisa del progreso
+INTERVALO_PROGRESO = 1000
+
+
+def detectar_formato(ruta, formato=None):
+    """formato indicado o el que corresponde a la extension del archivo"""
+    if formato is not None:
+        if formato not in (FORMATO_CSV, FORMATO_NDJSON):
+            raise ValueError("formato desconocido: " + str(formato))
+        return formato
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in EXTENSIONES:
+        raise ValueError("no se reconoce el formato de " + ruta + " (usa .csv, .ndjson o .jsonl)")
+    return EXTENSIONES[extension]
+
+
+def comprobar_seccion(seccion):
+    """lanza ValueError si la seccion no existe"""
+    if seccion not in SECCIONES:
+        raise ValueError("seccion desconocida: " + str(seccion))
+
+
+# exportacion
+
+def filas_seccion(datos, seccion):
+    """generador con las filas de una seccion (dicts con las columnas de COLUMNAS)"""
+    comprobar_seccion(seccion)
+    if seccion == "proyectos":
+        for proyecto in obtener_proyectos(datos):
+            yield {
+                "id": proyecto.get("id"),
+                "nombre": proyecto.get("nombre", ""),
+                "descripcion": proyecto.get("descripcion", ""),
+                "participantes": list(proyecto.get("participantes", []))
+            }
+        return
+
+    columnas = COLUMNAS[seccion]
+    for tarea in obtener_repositorio(datos).recorrer_tareas(seccion == "papelera"):
+        yield {columna: tarea.get(columna) for columna in columnas}
+
+
+def contar_filas(datos, seccion):
+    """numero de filas que tiene una seccion (para el progreso)"""
+    repositorio = obtener_repositorio(datos)
+    if seccion == "proyectos":
+        return len(obtener_proyectos(datos))
+    if seccion == "papelera":
+        return repositorio.contar_papelera()
+    return repositorio.contar_tareas()
+
+
+def exportar(datos, seccion, ruta, formato=None, progreso=None):
+    """escribe una seccion en csv o ndjson; devuelve las filas escritas
+
+    se escribe en un temporal que sustituye al archivo al terminar (nunca queda a medias)
+    """
+    comprobar_seccion(seccion)
+    formato = detectar_formato(ruta, formato)
+    total = contar_filas(datos, seccion)
+    columnas = COLUMNAS[seccion]
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=".exportacion-", suffix=".tmp", dir=directorio)
+    escritas = 0
+    try:
+        archivo = os.fdopen(descriptor, "w", encoding="utf-8", newline="")
+        try:
+            if formato == FORMATO_CSV:
+                escritor = csv.DictWriter(archivo, fieldnames=columnas)
+                escritor.writeheader()
+            for fila in filas_seccion(datos, seccion):
+                if formato == FORMATO_CSV:
+                    if seccion == "proyectos":
+                        fila["participantes"] = SEPARADOR_PARTICIPANTES.join(fila["participantes"])
+                    escritor.writerow(fila)
+                else:
+                    archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+                escritas += 1
+                if progreso is not None and escritas % INTERVALO_PROGRESO == 0:
+                    if progreso(escritas, total) is False:
+                        raise InterruptedError("exportacion cancelada")
+        finally:
+            archivo.close()
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+
+    if progreso is not None:
+        progreso(escritas, total)
+    return escritas
+
+
+# importacion
+
+class LectorProgreso:
+    """lineas de texto de un archivo binario contando los bytes leidos"""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.leidos = 0
+
+    def __iter__(self):
+        for linea in self.archivo:
+            # la primera linea puede traer la marca bom que deja excel
+            codificacion = "utf-8-sig" if self.leidos == 0 else "utf-8"
+            self.leidos += len(linea)
+            yield linea.decode(codificacion)
+
+
+def leer_filas(lector, formato):
+    """generador de dicts a partir de las lineas de un lector (csv o ndjson)"""
+    if formato == FORMATO_CSV:
+        for fila in csv.DictReader(lector):
+            yield fila
+        return
+    for numero, linea in enumerate(lector, 1):
+        linea = linea.strip()
+        if linea == "":
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError:
+            raise ValueError("linea %d: no es json valido" % numero)
+        if not isinstance(fila, dict):
+            raise ValueError("linea %d: se esperaba un objeto" % numero)
+        yield fila
+
+
+def convertir_entero(valor):
+    """entero de una celda (None si esta vacia o no es un numero)"""
+    if valor is None or valor == "":
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def lista_participantes(valor):
+    """participantes de una fila: lista (ndjson) o texto separado por ; (csv)"""
+    if isinstance(valor, list):
+        return [str(usuario) for usuario in valor]
+    if not valor:
+        return []
+    return [usuario.strip() for usuario in str(valor).split(SEPARADOR_PARTICIPANTES) if usuario.strip()]
+
+
+class Importacion:
+    """estado de una importacion: proyectos ya resueltos y resumen de filas"""
+
+    def __init__(self, datos, crear_proyectos=True):
+        self.datos = datos
+        self.crear_proyectos = crear_proyectos
+        # nombre en minusculas -> id de los proyectos que ya hay
+        self.proyectos_por_nombre = {}
+        self.ids_proyectos = set()
+        for proyecto in obtener_proyectos(datos):
+            self.ids_proyectos.add(proyecto["id"])
+            self.proyectos_por_nombre.setdefault(proyecto["nombre"].strip().lower(), proyecto["id"])
+        # id en el archivo de proyectos -> id asignado aqui
+        self.proyectos_importados = {}
+        self.usuarios = set(obtener_usuarios(datos))
+        self.importadas = 0
+        self.descartadas = 0
+
+    def _crear_proyectos(self, nuevos):
+        """crea de una vez los proyectos (nombre, descripcion) que faltan"""
+        resultados = aplicar_lote(self.datos, [("crear_proyecto", nuevo) for nuevo in nuevos])
+        for (nombre, descripcion), proyecto in zip(nuevos, resultados):
+            self.proyectos_por_nombre[nombre.lower()] = proyecto["id"]
+            self.ids_proyectos.add(proyecto["id"])
+
+    def resolver_proyecto(self, fila):
+        """id del proyecto de una fila de tarea, o None si no se puede resolver
+
+        orden: id de un proyecto importado en esta sesion, nombre del proyecto
+        y por ultimo id de un proyecto que ya existia
+        """
+        proyecto_id = convertir_entero(fila.get("proyecto_id"))
+        if proyecto_id in self.proyectos_importados:
+            return self.proyectos_importados[proyecto_id]
+        nombre = str(fila.get("proyecto_nombre") or "").strip()
+        if nombre != "" and nombre.lower() in self.proyectos_por_nombre:
+            return self.proyectos_por_nombre[nombre.lower()]
+        if proyecto_id in self.ids_proyectos:
+            return proyecto_id
+        return None
+
+    def proyectos_que_faltan(self, filas):
+        """nombres de proyecto de las filas que no se pueden resolver, sin repetir"""
+        faltan = {}
+        for fila in filas:
+            nombre = str(fila.get("proyecto_nombre") or "").strip()
+            if nombre != "" and self.resolver_proyecto(fila) is None:
+                faltan.setdefault(nombre.lower(), (nombre, ""))
+        return list(faltan.values())
+
+    def importar_proyectos(self, filas):
+        """proyectos: se juntan por nombre con los que ya hay y se anaden participantes"""
+        nuevos = {}
+        pendientes = []
+        for fila in filas:
+            nombre = str(fila.get("nombre") or "").strip()
+            if nombre == "":
+                self.descartadas += 1
+                continue
+            if nombre.lower() not in self.proyectos_por_nombre:
+                nuevos.setdefault(nombre.lower(), (nombre, str(fila.get("descripcion") or "")))
+            pendientes.append((fila, nombre))
+        self._crear_proyectos(list(nuevos.values()))
+
+        asignaciones = []
+        for fila, nombre in pendientes:
+            proyecto_id = self.proyectos_por_nombre[nombre.lower()]
+            original = convertir_entero(fila.get("id"))
+            if original is not None:
+                self.proyectos_importados[original] = proyecto_id
+            for usuario in lista_participantes(fila.get("participantes")):
+                # solo usuarios que existen aqui
+                if usuario in self.usuarios:
+                    asignaciones.append(("asignar_usuario_proyecto", (usuario, proyecto_id)))
+            self.importadas += 1
+        aplicar_lote(self.datos, asignaciones)
+
+    def importar_tareas(self, filas, papelera=False):
+        """tareas (o papelera): ids reservados en bloque y un lote por bloque"""
+        if self.crear_proyectos:
+            self._crear_proyectos(self.proyectos_que_faltan(filas))
+        validas = []
+        for fila in filas:
+            proyecto_id = self.resolver_proyecto(fila)
+            titulo = str(fila.get("titulo") or "").strip()
+            if proyecto_id is None or titulo == "":
+                self.descartadas += 1
+                continue
+            validas.append((fila, titulo, proyecto_id))
+        if len(validas) == 0:
+            return
+
+        primero = obtener_repositorio(self.datos).reservar_ids_tarea(len(validas))
+        creaciones = []
+        estados = []
+        borrados = []
+        for desplazamiento, (fila, titulo, proyecto_id) in enumerate(validas):
+            tarea_id = primero + desplazamiento
+            prioridad = fila.get("prioridad")
+            if prioridad not in PRIORIDADES:
+                prioridad = "media"
+            creaciones.append(("crear_tarea", (titulo, proyecto_id, prioridad, tarea_id)))
+            estado = fila.get("estado")
+            if estado in ESTADOS and estado != "pendiente":
+                estados.append(("cambiar_estado_tarea", (tarea_id, estado)))
+            if papelera:
+                borrados.append(("eliminar_tarea", (tarea_id,)))
+
+        # los borrados van seguidos al final: el repositorio los aplica de una pasada
+        resultados = aplicar_lote(self.datos, creaciones + estados + borrados)
+        for resultado in resultados[:len(creaciones)]:
+            if resultado is None:
+                self.descartadas += 1
+            else:
+                self.importadas += 1
+
+
+def bloques(filas, tamano):
+    """agrupa un iterador de filas en listas de como mucho tamano"""
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= tamano:
+            yield bloque
+            bloque = []
+    if len(bloque) > 0:
+        yield bloque
+
+
+def importar(datos, seccion, ruta, formato=None, progreso=None, crear_proyectos=True, importacion=None):
+    """importa una seccion desde csv o ndjson; devuelve {"importadas": n, "descartadas": m}
+
+    las tareas se asignan a su proyecto por proyecto_id (de un proyecto importado antes
+    con la misma importacion o ya existente) o por proyecto_nombre, creandolo si hace falta
+    """
+    comprobar_seccion(seccion)
+    formato = detectar_formato(ruta, formato)
+    total = os.path.getsize(ruta)
+    if importacion is None:
+        importacion = Importacion(datos, crear_proyectos)
+    importadas = importacion.importadas
+    descartadas = importacion.descartadas
+
+    archivo = open(ruta, "rb")
+    try:
+        lector = LectorProgreso(archivo)
+        for bloque in bloques(leer_filas(lector, formato), TAMANO_BLOQUE):
+            if seccion == "proyectos":
+                importacion.importar_proyectos(bloque)
+            else:
+                importacion.importar_tareas(bloque, seccion == "papelera")
+            if progreso is not None and progreso(lector.leidos, total) is False:
+                break
+    finally:
+        archivo.close()
+        guardar_pendientes()
+    return {
+        "importadas": importacion.importadas - importadas,
+        "descartadas": importacion.descartadas - descartadas
+    }
+
+
+def importar_varios(datos, rutas, progreso=None, crear_proyectos=True):
+    """importa varios archivos (seccion -> ruta); devuelve seccion -> resumen
+
+    los proyectos se importan primero, asi las tareas pueden usar su proyecto_id original
+    """
+    importacion = Importacion(datos, crear_proyectos)
+    resumen = {}
+    for seccion in SECCIONES:
+        if seccion in rutas:
+            resumen[seccion] = importar(datos, seccion, rutas[seccion], None, progreso, crear_proyectos, importacion)
+    return resumen
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] not in ("importar", "exportar") or sys.argv[2] not in SECCIONES:
+        print("uso: python -m controllers.intercambio importar|exportar proyectos|tareas|papelera archivo")
+        sys.exit(1)
+    # import local: el modo linea de comandos usa los datos configurados
+    from controllers.datos_controller import cargar_datos
+
+    def mostrar(hechas, total):
+        if total > 0:
+            sys.stderr.write("\r%5.1f %%" % (100.0 * hechas / total))
+        return True
+
+    datos = cargar_datos()
+    if sys.argv[1] == "exportar":
+        filas = exportar(datos, sys.argv[2], sys.argv[3], progreso=mostrar)
+        print("\nexportadas %d filas a %s" % (filas, sys.argv[3]))
+    else:
+        resumen = importar(datos, sys.argv[2], sys.argv[3], progreso=mostrar)
+        print("\nimportadas %(importadas)d filas, descartadas %(descartadas)d" % resumen)
+
+
+if __name__ == "__main__":
+    main()
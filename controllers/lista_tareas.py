@@ -0,0 +1,213 @@
+"""
+modelo y delegado para listas de tareas virtualizadas (solo se pintan las filas visibles)
+"""
+
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRectF, QSize
+from PyQt5.QtGui import QColor, QFont, QPainter, QPainterPath, QPen, QPixmap
+
+
+# rol con el dict completo de la tarea
+ROL_TAREA = Qt.UserRole + 1
+
+COLORES_PRIORIDAD = {"alta": "#FF5252", "media": "#FFD740", "baja": "#69F0AE"}
+ETIQUETAS_PRIORIDAD = {
+    "alta": ("ALTA", "#FFEBEE", "#D32F2F"),
+    "media": ("MEDIA", "#FFF8E1", "#FBC02D"),
+    "baja": ("BAJA", "#E8F5E9", "#388E3C")
+}
+
+
+class ModeloTareas(QAbstractListModel):
+    """lista de tareas expuesta a una vista qt sin crear un widget por tarea"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tareas = []
+        # origen paginado: funcion(cursor) -> (tareas, siguiente cursor)
+        self.obtener_pagina = None
+        self.cursor = None
+        self.hay_mas = False
+
+    def establecer_tareas(self, tareas):
+        """sustituye todas las tareas del modelo"""
+        self.beginResetModel()
+        self.tareas = tareas
+        self.obtener_pagina = None
+        self.hay_mas = False
+        self.endResetModel()
+
+    def establecer_origen(self, obtener_pagina):
+        """vacia el modelo y carga la primera pagina; la vista pide las demas al bajar"""
+        self.beginResetModel()
+        self.tareas = []
+        self.obtener_pagina = obtener_pagina
+        self.cursor = None
+        self.hay_mas = True
+        self.endResetModel()
+        self.fetchMore()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.hay_mas
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.hay_mas:
+            return
+        pagina, self.cursor = self.obtener_pagina(self.cursor)
+        self.hay_mas = self.cursor is not None
+        if pagina:
+            inicio = len(self.tareas)
+            self.beginInsertRows(QModelIndex(), inicio, inicio + len(pagina) - 1)
+            self.tareas.extend(pagina)
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.tareas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.tareas):
+            return None
+        tarea = self.tareas[index.row()]
+        if role == Qt.DisplayRole:
+            return tarea.get("titulo", "Sin titulo")
+        if role == ROL_TAREA:
+            return tarea
+        return None
+
+    def tarea(self, index):
+        """devuelve el dict de la tarea de un indice"""
+        return self.data(index, ROL_TAREA)
+
+
+class DelegadoTarea(QStyledItemDelegate):
+    """pinta una tarjeta de tarea: franja de prioridad, titulo, proyecto y etiqueta
+
+    el fondo con la franja y las etiquetas se pintan una vez y se reutilizan como pixmaps
+    """
+
+    ALTO = 80
+    SEPARACION = 15
+    FRANJA = 8
+    RADIO = 10
+    ANCHO_ETIQUETA = 70
+    ALTO_ETIQUETA = 28
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.fuente_titulo = QFont()
+        self.fuente_titulo.setBold(True)
+        self.fuente_proyecto = QFont()
+        self.fuente_etiqueta = QFont()
+        self.fuente_etiqueta.setBold(True)
+        # pixmaps ya pintados: (prioridad, escala) -> etiqueta,
+        # (prioridad, resaltada, escala) -> fondo de la tarjeta del ancho actual
+        self.etiquetas = {}
+        self.fondos = {}
+        self.ancho_fondos = None
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ALTO + self.SEPARACION)
+
+    def crear_pixmap(self, ancho, alto, escala):
+        """pixmap transparente en coordenadas logicas para la escala de la pantalla"""
+        pixmap = QPixmap(int(ancho * escala), int(alto * escala))
+        pixmap.setDevicePixelRatio(escala)
+        pixmap.fill(Qt.transparent)
+        return pixmap
+
+    def pixmap_fondo(self, ancho, prioridad, resaltada, escala):
+        """tarjeta redondeada con la franja de prioridad (se pinta una vez por ancho)"""
+        if ancho != self.ancho_fondos:
+            # al cambiar el ancho de la lista los anteriores ya no sirven
+            self.fondos = {}
+            self.ancho_fondos = ancho
+        clave = (prioridad, resaltada, escala)
+        if clave in self.fondos:
+            return self.fondos[clave]
+
+        pixmap = self.crear_pixmap(ancho, self.ALTO, escala)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        tarjeta = QRectF(0.5, 0.5, ancho - 1, self.ALTO - 1)
+        camino = QPainterPath()
+        camino.addRoundedRect(tarjeta, self.RADIO, self.RADIO)
+        if resaltada:
+            fondo = QColor("#FFF5F7")
+        else:
+            fondo = QColor("white")
+        painter.fillPath(camino, fondo)
+        painter.setPen(QPen(QColor("#FCE4EC"), 1))
+        painter.drawPath(camino)
+
+        # franja de prioridad a la izquierda, recortada por la tarjeta
+        color = COLORES_PRIORIDAD.get(prioridad, COLORES_PRIORIDAD["media"])
+        painter.setClipPath(camino)
+        painter.fillRect(QRectF(tarjeta.left(), tarjeta.top(), self.FRANJA, tarjeta.height()), QColor(color))
+        painter.end()
+
+        self.fondos[clave] = pixmap
+        return pixmap
+
+    def pixmap_etiqueta(self, prioridad, escala):
+        """etiqueta de prioridad (ALTA, MEDIA, BAJA) ya pintada"""
+        clave = (prioridad, escala)
+        if clave in self.etiquetas:
+            return self.etiquetas[clave]
+
+        etiqueta = ETIQUETAS_PRIORIDAD.get(prioridad, ETIQUETAS_PRIORIDAD["media"])
+        pixmap = self.crear_pixmap(self.ANCHO_ETIQUETA, self.ALTO_ETIQUETA, escala)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        caja = QRectF(0, 0, self.ANCHO_ETIQUETA, self.ALTO_ETIQUETA)
+        camino = QPainterPath()
+        camino.addRoundedRect(caja, 5, 5)
+        painter.fillPath(camino, QColor(etiqueta[1]))
+        painter.setFont(self.fuente_etiqueta)
+        painter.setPen(QColor(etiqueta[2]))
+        painter.drawText(caja, Qt.AlignCenter, etiqueta[0])
+        painter.end()
+
+        self.etiquetas[clave] = pixmap
+        return pixmap
+
+    def paint(self, painter, option, index):
+        tarea = index.data(ROL_TAREA)
+        if tarea is None:
+            return
+
+        prioridad = tarea.get("prioridad", "media")
+        escala = painter.device().devicePixelRatioF()
+        resaltada = bool(option.state & QStyle.State_MouseOver)
+
+        painter.save()
+
+        # tarjeta y franja (deja la separacion debajo)
+        tarjeta = QRectF(option.rect.left(), option.rect.top(), option.rect.width(), self.ALTO)
+        painter.drawPixmap(option.rect.topLeft(), self.pixmap_fondo(option.rect.width(), prioridad, resaltada, escala))
+
+        # etiqueta de prioridad a la derecha
+        caja = QRectF(tarjeta.right() - self.ANCHO_ETIQUETA - 15, tarjeta.center().y() - self.ALTO_ETIQUETA / 2,
+                      self.ANCHO_ETIQUETA, self.ALTO_ETIQUETA)
+        painter.drawPixmap(caja.topLeft(), self.pixmap_etiqueta(prioridad, escala))
+
+        # titulo y proyecto
+        texto = QRectF(tarjeta.left() + self.FRANJA + 12, tarjeta.top() + 12,
+                       caja.left() - tarjeta.left() - self.FRANJA - 24, tarjeta.height() / 2 - 12)
+        painter.setFont(self.fuente_titulo)
+        painter.setPen(QColor("#333"))
+        titulo = painter.fontMetrics().elidedText(tarea.get("titulo", "Sin titulo"), Qt.ElideRight, int(texto.width()))
+        painter.drawText(texto, Qt.AlignLeft | Qt.AlignVCenter, titulo)
+
+        texto.moveTop(texto.bottom())
+        painter.setFont(self.fuente_proyecto)
+        painter.setPen(QColor("#888"))
+        proyecto = painter.fontMetrics().elidedText(
+            "Proyecto: " + tarea.get("proyecto_nombre", ""), Qt.ElideRight, int(texto.width())
+        )
+        painter.drawText(texto, Qt.AlignLeft | Qt.AlignVCenter, proyecto)
+
+        painter.restore()
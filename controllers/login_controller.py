@@ -3,8 +3,8 @@ controlador para la pantalla de login
 """
 
 from PyQt5.QtWidgets import QDialog
-from PyQt5 import uic
-from controllers.datos_controller import obtener_ruta_vista
+from controllers.datos_controller import obtener_usuario
+from controllers.vistas_compiladas import cargar_vista
 
 
 class ControladorLogin(QDialog):
@@ -12,7 +12,7 @@ class ControladorLogin(QDialog):
 
     def __init__(self, datos):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("login.ui"), self)
+        cargar_vista("login.ui", self)
         self.datos = datos
         self.usuario_logueado = None
 
@@ -29,8 +29,9 @@ class ControladorLogin(QDialog):
             self.lbl_error.setText("Completa todos los campos")
             return
 
-        if usuario in self.datos["usuarios"]:
-            if self.datos["usuarios"][usuario]["password"] == password:
+        info = obtener_usuario(self.datos, usuario)
+        if info is not None:
+            if info["password"] == password:
                 self.usuario_logueado = usuario
                 self.accept()
             else:
@@ -0,0 +1,123 @@
+"""
+persistencia con escritura diferida: marca los datos como sucios y agrupa escrituras
+"""
+
+import os
+import json
+import time
+import atexit
+
+from controllers.tarea_compacta import json_por_defecto, preparar_json
+
+
+MODO_INMEDIATO = "inmediato"
+MODO_LOTES = "lotes"
+MODO_SALIDA = "salida"
+
+
+def escribir_json_atomico(ruta, datos):
+    """escribe el json en un temporal y lo renombra, nunca deja el archivo a medias"""
+    # import local: tempfile arrastra shutil (y este bz2, lzma) y solo hace falta al guardar
+    import tempfile
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, ruta_temporal = tempfile.mkstemp(prefix=".datos-", suffix=".tmp", dir=directorio)
+    try:
+        archivo = os.fdopen(descriptor, "w", encoding="utf-8")
+        try:
+            json.dump(preparar_json(datos), archivo, ensure_ascii=False, indent=2, default=json_por_defecto)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        finally:
+            archivo.close()
+        os.replace(ruta_temporal, ruta)
+    except BaseException:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+        raise
+
+
+class Persistencia:
+    """agrupa los guardados de los datos segun el modo de durabilidad"""
+
+    def __init__(self, escribir, modo=MODO_LOTES, ventana_ms=500):
+        if modo not in (MODO_INMEDIATO, MODO_LOTES, MODO_SALIDA):
+            raise ValueError("modo de persistencia desconocido: " + str(modo))
+        self.escribir = escribir
+        self.modo = modo
+        self.ventana_ms = ventana_ms
+        # funcion(ms, callback) para programar el guardado (QTimer.singleShot en la app)
+        self.programador = None
+        self.pendiente = None
+        self.sucio_desde = None
+        self.programado = False
+        self.escrituras = 0
+        # operaciones largas que atienden eventos entre bloques (importar, exportar)
+        self.pausas = 0
+        atexit.register(self.guardar_pendiente)
+
+    def configurar(self, modo=None, ventana_ms=None):
+        """cambia el modo o la ventana; guarda lo pendiente antes de cambiar"""
+        self.guardar_pendiente()
+        if modo is not None:
+            if modo not in (MODO_INMEDIATO, MODO_LOTES, MODO_SALIDA):
+                raise ValueError("modo de persistencia desconocido: " + str(modo))
+            self.modo = modo
+        if ventana_ms is not None:
+            self.ventana_ms = ventana_ms
+
+    def marcar_sucio(self, datos):
+        """registra que los datos han cambiado y decide cuando escribirlos"""
+        if self.pendiente is not None and self.pendiente is not datos:
+            # otro conjunto de datos pendiente (por ejemplo tras reiniciar)
+            self.guardar_pendiente()
+
+        if self.pendiente is None:
+            self.pendiente = datos
+            self.sucio_desde = time.monotonic()
+
+        if self.modo == MODO_INMEDIATO:
+            self.guardar_pendiente()
+        elif self.modo == MODO_LOTES:
+            if self.programador is not None:
+                if not self.programado:
+                    self.programado = True
+                    self.programador(self.ventana_ms, self._al_vencer_ventana)
+            elif (time.monotonic() - self.sucio_desde) * 1000 >= self.ventana_ms:
+                # sin bucle de eventos: se escribe en el primer cambio fuera de la ventana
+                self.guardar_pendiente()
+
+    def _al_vencer_ventana(self):
+        """callback del programador al terminar la ventana de agrupacion"""
+        if self.pausas > 0:
+            # no se escribe a mitad de una operacion larga: se vuelve a esperar
+            self.programador(self.ventana_ms, self._al_vencer_ventana)
+            return
+        self.programado = False
+        self.guardar_pendiente()
+
+    def pausar(self):
+        """retiene los guardados programados hasta reanudar (la app retiene tambien purga y recarga)"""
+        self.pausas += 1
+
+    def reanudar(self):
+        """deshace un pausar; lo pendiente se guarda cuando venza la ventana"""
+        self.pausas -= 1
+
+    def en_pausa(self):
+        """indica si hay una operacion larga en curso"""
+        return self.pausas > 0
+
+    def hay_cambios(self):
+        """indica si quedan cambios sin escribir"""
+        return self.pendiente is not None
+
+    def guardar_pendiente(self):
+        """escribe ya los datos sucios, si los hay"""
+        if self.pendiente is None:
+            return False
+        # si la escritura falla los datos siguen marcados como sucios
+        self.escribir(self.pendiente)
+        self.pendiente = None
+        self.sucio_desde = None
+        self.escrituras += 1
+        return True
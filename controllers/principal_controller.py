@@ -3,18 +3,22 @@ controlador para la ventana principal
 """
 
 from PyQt5.QtWidgets import (
-    QMainWindow, QDialog, QWidget, QFrame, QVBoxLayout,
-    QHBoxLayout, QLabel, QPushButton, QListWidget, QMessageBox
+    QMainWindow, QDialog, QWidget, QVBoxLayout,
+    QLabel, QPushButton, QListWidget, QListWidgetItem, QMessageBox
 )
-from PyQt5.QtCore import Qt
-from PyQt5 import uic
+from PyQt5.QtCore import Qt, QTimer
 from controllers.datos_controller import (
-    obtener_ruta_vista, es_admin, obtener_proyectos_usuario,
-    obtener_tareas_usuario, obtener_proyecto, recuperar_tarea,
-    eliminar_tarea_permanente, vaciar_papelera
+    obtener_proyectos_usuario,
+    obtener_pagina_tareas_usuario, obtener_proyecto, recuperar_tareas,
+    eliminar_tareas_permanente, vaciar_papelera, obtener_usuario,
+    obtener_pagina_papelera, contar_papelera, buscar_tareas, dias_retencion,
+    consultar_varias, buscar_archivadas
 )
-from controllers.proyecto_controller import ControladorProyecto
-from controllers.admin_controller import ControladorAdmin
+from controllers.repositorio import LIMITE_RESULTADOS
+from controllers.vistas_compiladas import cargar_vista
+from controllers.lista_tareas import ModeloTareas, DelegadoTarea
+from controllers.tema import cambiar_propiedad
+from controllers.trazas import trazar
 
 
 class ControladorAjustes(QDialog):
@@ -22,13 +26,13 @@ class ControladorAjustes(QDialog):
 
     def __init__(self, usuario, datos):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("ajustes.ui"), self)
+        cargar_vista("ajustes.ui", self)
         self.usuario = usuario
         self.datos = datos
         self.cerrar_sesion = False
 
         # muestra info del usuario
-        info = self.datos["usuarios"][usuario]
+        info = obtener_usuario(self.datos, usuario)
         if info["rol"] == "admin":
             rol = "Administrador"
         else:
@@ -51,7 +55,7 @@ class ControladorPapelera(QWidget):
 
     def __init__(self, datos, funcion_volver):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("papeleradereciclaje.ui"), self)
+        cargar_vista("papeleradereciclaje.ui", self)
         self.datos = datos
         self.funcion_volver = funcion_volver
 
@@ -61,47 +65,105 @@ class ControladorPapelera(QWidget):
         self.btnDeleteForever.clicked.connect(self.eliminar)
         self.btnEmptyTrash.clicked.connect(self.vaciar)
 
+        # la papelera se carga por paginas al bajar por la lista
+        self.listDeletedTasks.verticalScrollBar().valueChanged.connect(self.al_desplazar)
+        self.temporizador_relleno = QTimer(self)
+        self.temporizador_relleno.setSingleShot(True)
+        self.temporizador_relleno.timeout.connect(self.rellenar)
+
         self.cargar_papelera()
 
     def volver(self):
         """vuelve a la pantalla principal"""
         self.funcion_volver()
 
+    @trazar("vista")
     def cargar_papelera(self):
-        """carga las tareas eliminadas"""
+        """carga la primera pagina de tareas eliminadas"""
         self.listDeletedTasks.clear()
-        for tarea in self.datos["papelera"]:
+        self.cursor_papelera = None
+        self.hay_mas_papelera = True
+        self.cargar_pagina_papelera()
+
+        cantidad = contar_papelera(self.datos)
+        texto = str(cantidad) + " tareas en papelera"
+        if dias_retencion() > 0:
+            texto += " (se eliminan a los " + str(dias_retencion()) + " dias)"
+        self.lblStatus.setText(texto)
+
+    def cargar_pagina_papelera(self):
+        """anade la siguiente pagina; cada fila recuerda el id de su tarea"""
+        if not self.hay_mas_papelera:
+            return
+        papelera, self.cursor_papelera = obtener_pagina_papelera(self.datos, self.cursor_papelera)
+        self.hay_mas_papelera = self.cursor_papelera is not None
+        for tarea in papelera:
             titulo = tarea.get("titulo", "Sin titulo")
             proyecto = tarea.get("proyecto_nombre", "")
             texto = titulo + " - " + proyecto
-            self.listDeletedTasks.addItem(texto)
-        
-        cantidad = len(self.datos["papelera"])
-        self.lblStatus.setText(str(cantidad) + " tareas en papelera")
+            item = QListWidgetItem(texto)
+            item.setData(Qt.UserRole, tarea["id"])
+            self.listDeletedTasks.addItem(item)
+
+        if self.hay_mas_papelera:
+            # el rango del scroll se actualiza cuando qt recoloca la lista
+            self.temporizador_relleno.start(0)
+
+    def rellenar(self):
+        """carga otra pagina si la lista aun no tiene scroll"""
+        if self.listDeletedTasks.verticalScrollBar().maximum() == 0:
+            self.cargar_pagina_papelera()
+
+    def al_desplazar(self, valor):
+        """carga la siguiente pagina al llegar al final de la lista"""
+        if valor >= self.listDeletedTasks.verticalScrollBar().maximum():
+            self.cargar_pagina_papelera()
+
+    def al_cambiar_datos(self, cambios):
+        """recarga la lista si otra instancia cambio la papelera"""
+        if cambios["papelera"]:
+            self.cargar_papelera()
+
+    def tareas_seleccionadas(self):
+        """ids de las tareas seleccionadas en la lista"""
+        ids = []
+        for item in self.listDeletedTasks.selectedItems():
+            ids.append(item.data(Qt.UserRole))
+        return ids
 
     def recuperar(self):
-        """recupera tarea seleccionada"""
-        fila = self.listDeletedTasks.currentRow()
-        if fila >= 0:
-            if recuperar_tarea(self.datos, fila):
-                self.cargar_papelera()
-            else:
-                QMessageBox.warning(
-                    self, "No se puede recuperar",
-                    "El proyecto de esta tarea fue eliminado.\nLa tarea no puede ser recuperada."
-                )
-                self.cargar_papelera()
+        """recupera las tareas seleccionadas (un solo guardado)"""
+        ids = self.tareas_seleccionadas()
+        if len(ids) == 0:
+            return
+        resultados = recuperar_tareas(self.datos, ids)
+        self.cargar_papelera()
+        fallidas = resultados.count(False)
+        if fallidas > 0:
+            QMessageBox.warning(
+                self, "No se puede recuperar",
+                str(fallidas) + " de " + str(len(ids)) + " tareas no se pudieron recuperar.\n"
+                "Su proyecto fue eliminado o ya no estan en la papelera."
+            )
 
     def eliminar(self):
-        """elimina permanentemente"""
-        fila = self.listDeletedTasks.currentRow()
-        if fila >= 0:
-            eliminar_tarea_permanente(self.datos, fila)
-            self.cargar_papelera()
+        """elimina permanentemente las tareas seleccionadas (un solo guardado)"""
+        ids = self.tareas_seleccionadas()
+        if len(ids) == 0:
+            return
+        if len(ids) > 1:
+            respuesta = QMessageBox.question(
+                self, "Confirmar", "Eliminar " + str(len(ids)) + " tareas para siempre?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if respuesta != QMessageBox.Yes:
+                return
+        eliminar_tareas_permanente(self.datos, ids)
+        self.cargar_papelera()
 
     def vaciar(self):
         """vacia la papelera"""
-        if len(self.datos["papelera"]) > 0:
+        if contar_papelera(self.datos) > 0:
             respuesta = QMessageBox.question(
                 self, "Confirmar", "Vaciar papelera?",
                 QMessageBox.Yes | QMessageBox.No
@@ -116,21 +178,39 @@ class ControladorPrincipal(QMainWindow):
 
     def __init__(self, usuario, datos, funcion_logout):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("pantallaprincipal.ui"), self)
+        cargar_vista("pantallaprincipal.ui", self)
         self.usuario = usuario
         self.datos = datos
         self.funcion_logout = funcion_logout
         self.vista_actual = None
-        self.es_admin = es_admin(datos, usuario)
+        # con el servidor de datos las dos consultas van en una sola ida y vuelta
+        self.es_admin, info_usuario = consultar_varias(
+            datos, [("es_admin", (usuario,)), ("obtener_usuario", (usuario,))]
+        )
 
         # oculta boton admin si no es admin
         if not self.es_admin:
             self.btn_calendar.hide()
 
         # saludo
-        nombre = self.datos["usuarios"][usuario].get("nombre", usuario)
+        nombre = info_usuario.get("nombre", usuario)
         self.label_welcome.setText("Hola, <b>" + nombre + "</b>")
 
+        # lista de inicio: modelo + delegado, solo se pintan las filas visibles
+        self.modelo_tareas = ModeloTareas(self)
+        self.listaTareas.setModel(self.modelo_tareas)
+        self.listaTareas.setItemDelegate(DelegadoTarea(self.listaTareas))
+        self.listaTareas.viewport().setAttribute(Qt.WA_Hover, True)
+        self.listaTareas.clicked.connect(self.abrir_tarea_lista)
+
+        # busqueda mientras se escribe (sobre la misma lista); espera a que se deje
+        # de teclear para no buscar con cada letra
+        self.temporizador_busqueda = QTimer(self)
+        self.temporizador_busqueda.setSingleShot(True)
+        self.temporizador_busqueda.setInterval(200)
+        self.temporizador_busqueda.timeout.connect(self.cargar_tareas_inicio)
+        self.txtBuscar.textChanged.connect(self.al_escribir_busqueda)
+
         # conecta botones sidebar
         self.btn_home.clicked.connect(self.mostrar_inicio)
         self.btn_board.clicked.connect(self.mostrar_proyectos)
@@ -142,101 +222,57 @@ class ControladorPrincipal(QMainWindow):
         # carga tareas
         self.cargar_tareas_inicio()
 
+    @trazar("vista")
     def cargar_tareas_inicio(self):
-        """carga las tareas del usuario en inicio"""
-        layout = self.scrollAreaWidgetContents.layout()
-
-        # limpia widgets existentes
-        while layout.count() > 1:
-            item = layout.takeAt(0)
-            if item.widget() is not None:
-                item.widget().deleteLater()
-
-        # obtiene tareas del usuario
-        todas_tareas = obtener_tareas_usuario(self.datos, self.usuario)
-
-        # filtra solo pendientes y en curso
-        tareas = []
-        for tarea in todas_tareas:
-            if tarea.get("estado") != "completada":
-                tareas.append(tarea)
-
-        if len(tareas) == 0:
-            etiqueta = QLabel("No tienes tareas pendientes")
-            etiqueta.setStyleSheet("color: #666; font-size: 14px;")
-            etiqueta.setAlignment(Qt.AlignCenter)
-            layout.insertWidget(0, etiqueta)
+        """carga las tareas del usuario en inicio (la lista pide mas paginas al bajar)"""
+        # ya se carga con el texto actual: la busqueda pendiente sobra
+        self.temporizador_busqueda.stop()
+        consulta = self.txtBuscar.text().strip()
+        if consulta:
+            # con busqueda: las que coinciden, tambien las completadas y, si queda
+            # sitio, las del archivo
+            tareas = buscar_tareas(self.datos, self.usuario, consulta)
+            if len(tareas) < LIMITE_RESULTADOS:
+                tareas = tareas + buscar_archivadas(
+                    self.datos, self.usuario, consulta, LIMITE_RESULTADOS - len(tareas)
+                )
+            self.modelo_tareas.establecer_tareas(tareas)
+            self.lblSinTareas.setText("No hay tareas que coincidan con la busqueda")
         else:
-            for tarea in tareas:
-                widget = self.crear_widget_tarea(tarea)
-                layout.insertWidget(layout.count() - 1, widget)
-
-    def crear_widget_tarea(self, tarea):
-        """crea widget de tarea para inicio"""
-        colores = {"alta": "#FF5252", "media": "#FFD740", "baja": "#69F0AE"}
-        etiquetas = {
-            "alta": ("ALTA", "#FFEBEE", "#D32F2F"),
-            "media": ("MEDIA", "#FFF8E1", "#FBC02D"),
-            "baja": ("BAJA", "#E8F5E9", "#388E3C")
-        }
-
-        prioridad = tarea.get("prioridad", "media")
-        color = colores.get(prioridad, "#FFD740")
-        etiqueta_info = etiquetas.get(prioridad, etiquetas["media"])
-
-        frame = QFrame()
-        frame.setMinimumHeight(80)
-        frame.setCursor(Qt.PointingHandCursor)
-        frame.setStyleSheet("""
-            QFrame {
-                background-color: white;
-                border-radius: 10px;
-                border-left: 8px solid """ + color + """;
-                border-right: 1px solid #FCE4EC;
-                border-top: 1px solid #FCE4EC;
-                border-bottom: 1px solid #FCE4EC;
-            }
-            QFrame:hover { background-color: #FFF5F7; }
-        """)
-
-        # guarda el id del proyecto para usarlo al hacer click
-        proyecto_id = tarea.get("proyecto_id")
-        frame.mousePressEvent = self.crear_funcion_abrir_proyecto(proyecto_id)
-
-        layout = QHBoxLayout(frame)
-
-        layout_vertical = QVBoxLayout()
-        etiqueta_titulo = QLabel(tarea.get("titulo", "Sin titulo"))
-        etiqueta_titulo.setStyleSheet("border: none; background: transparent; color: #333; font-weight: bold;")
+            self.modelo_tareas.establecer_origen(self.pagina_inicio)
+            self.lblSinTareas.setText("No tienes tareas pendientes")
+        self.lblSinTareas.setVisible(self.modelo_tareas.rowCount() == 0)
 
-        etiqueta_proyecto = QLabel("Proyecto: " + tarea.get("proyecto_nombre", ""))
-        etiqueta_proyecto.setStyleSheet("border: none; background: transparent; color: #888;")
-
-        layout_vertical.addWidget(etiqueta_titulo)
-        layout_vertical.addWidget(etiqueta_proyecto)
-
-        etiqueta_prioridad = QLabel(etiqueta_info[0])
-        etiqueta_prioridad.setMaximumSize(80, 30)
-        etiqueta_prioridad.setStyleSheet("""
-            background-color: """ + etiqueta_info[1] + """;
-            color: """ + etiqueta_info[2] + """;
-            border: none;
-            border-radius: 5px;
-            padding: 5px;
-            font-weight: bold;
-        """)
-        etiqueta_prioridad.setAlignment(Qt.AlignCenter)
-
-        layout.addLayout(layout_vertical)
-        layout.addWidget(etiqueta_prioridad)
+    def al_cambiar_datos(self, cambios):
+        """refresca solo la vista a la que afectan los cambios de otra instancia"""
+        if self.vista_actual is not None:
+            self.vista_actual.al_cambiar_datos(cambios)
+            return
+        if len(cambios["proyectos"]) > 0:
+            # tambien puede cambiar que proyectos ve el usuario
+            self.cargar_tareas_inicio()
+            return
+        visibles = {proyecto.get("id") for proyecto in obtener_proyectos_usuario(self.datos, self.usuario)}
+        if len(cambios["tareas"] & visibles) > 0:
+            self.cargar_tareas_inicio()
+
+    def al_escribir_busqueda(self, texto):
+        """rehace la lista de inicio cuando se deja de escribir en la busqueda"""
+        if texto.strip() == "":
+            # al borrarla se vuelve enseguida a la lista de pendientes
+            self.cargar_tareas_inicio()
+        else:
+            self.temporizador_busqueda.start()
 
-        return frame
+    def pagina_inicio(self, cursor):
+        """siguiente pagina de tareas pendientes y en curso del usuario"""
+        return obtener_pagina_tareas_usuario(self.datos, self.usuario, cursor, solo_pendientes=True)
 
-    def crear_funcion_abrir_proyecto(self, proyecto_id):
-        """crea una funcion para abrir un proyecto"""
-        def funcion(evento):
-            self.abrir_proyecto(proyecto_id)
-        return funcion
+    def abrir_tarea_lista(self, indice):
+        """abre el proyecto de la tarea pulsada en la lista de inicio"""
+        tarea = self.modelo_tareas.tarea(indice)
+        if tarea is not None:
+            self.abrir_proyecto(tarea.get("proyecto_id"))
 
     def abrir_proyecto(self, proyecto_id):
         """abre la vista de un proyecto"""
@@ -251,7 +287,8 @@ class ControladorPrincipal(QMainWindow):
             self.vista_actual.hide()
             self.vista_actual.deleteLater()
             self.vista_actual = None
-        self.scrollAreaTasks.show()
+        self.listaTareas.show()
+        self.txtBuscar.show()
         self.label_welcome.show()
         self.label_subtitle.show()
         self.bottomBar.show()
@@ -335,9 +372,12 @@ class ControladorPrincipal(QMainWindow):
 
         dialogo.exec_()
 
+    @trazar("vista")
     def mostrar_vista_proyecto(self, proyecto):
         """muestra el tablero kanban de un proyecto"""
-        self.scrollAreaTasks.hide()
+        self.listaTareas.hide()
+        self.txtBuscar.hide()
+        self.lblSinTareas.hide()
         self.label_welcome.hide()
         self.label_subtitle.hide()
         self.bottomBar.hide()
@@ -345,6 +385,8 @@ class ControladorPrincipal(QMainWindow):
         if self.vista_actual is not None:
             self.vista_actual.deleteLater()
 
+        # import local: el tablero no se carga hasta abrir el primer proyecto
+        from controllers.proyecto_controller import ControladorProyecto
         self.vista_actual = ControladorProyecto(proyecto, self.datos, self.mostrar_inicio)
         self.centralwidget.layout().addWidget(self.vista_actual)
 
@@ -353,6 +395,8 @@ class ControladorPrincipal(QMainWindow):
         if not self.es_admin:
             return
         self.resaltar_boton(self.btn_calendar)
+        # import local: solo los administradores llegan a usar el panel
+        from controllers.admin_controller import ControladorAdmin
         dialogo = ControladorAdmin(self.datos)
         dialogo.exec_()
         self.cargar_tareas_inicio()
@@ -360,7 +404,9 @@ class ControladorPrincipal(QMainWindow):
     def mostrar_papelera(self):
         """muestra la papelera"""
         self.resaltar_boton(self.btn_settings)
-        self.scrollAreaTasks.hide()
+        self.listaTareas.hide()
+        self.txtBuscar.hide()
+        self.lblSinTareas.hide()
         self.label_welcome.hide()
         self.label_subtitle.hide()
         self.bottomBar.hide()
@@ -387,27 +433,5 @@ class ControladorPrincipal(QMainWindow):
         """resalta el boton activo"""
         botones = [self.btn_home, self.btn_board, self.btn_calendar, self.btn_settings]
         for boton in botones:
-            if boton == activo:
-                boton.setStyleSheet("""
-                    background-color: #FCE4EC;
-                    color: #D81B60;
-                    border-radius: 10px;
-                    text-align: left;
-                    padding-left: 15px;
-                    border: none;
-                    font-weight: bold;
-                """)
-            else:
-                boton.setStyleSheet("""
-                    QPushButton {
-                        background-color: transparent;
-                        color: #666;
-                        border-radius: 10px;
-                        text-align: left;
-                        padding-left: 15px;
-                    }
-                    QPushButton:hover {
-                        background-color: #F5F5F5;
-                        color: #D81B60;
-                    }
-                """)
+            # el estilo de cada estado ya esta en el tema
+            cambiar_propiedad(boton, "activo", boton == activo)
@@ -0,0 +1,66 @@
+"""
+protocolo entre el servidor de datos y la aplicacion: mensajes json precedidos de su longitud
+
+    [4 bytes: longitud, big endian][json en utf-8]
+
+    peticion   {"id": 1, "op": "crear_tarea", "args": ["titulo", 3, "alta"]}
+    respuesta  {"id": 1, "resultado": {...}}
+    error      {"id": 1, "error": "ValueError", "mensaje": "...", "resultado": ...}
+"""
+
+import json
+import struct
+
+from controllers.tarea_compacta import json_por_defecto
+
+
+CABECERA = struct.Struct(">I")
+
+# consultas que el servidor ejecuta tal cual en su repositorio; los cambios son las
+# operaciones de OPERACIONES_LOTE (y aplicar_lote)
+CONSULTAS = (
+    "obtener_usuarios", "obtener_usuario", "es_admin",
+    "obtener_proyectos", "obtener_proyecto", "obtener_proyectos_usuario",
+    "obtener_tarea", "obtener_tareas_proyecto", "obtener_pagina_tareas_proyecto",
+    "obtener_tareas_usuario", "obtener_pagina_tareas_usuario", "buscar_tareas",
+    "obtener_papelera", "contar_papelera", "obtener_pagina_papelera",
+    "contar_tareas", "reservar_ids_tarea", "obtener_pagina_tareas", "cambios_desde"
+)
+
+# un mensaje mas grande se considera un error de protocolo (64 MB)
+TAMANO_MAXIMO = 64 * 1024 * 1024
+
+# recorrer_tareas llega al cliente por paginas de este tamano (obtener_pagina_tareas):
+# ningun mensaje crece con el numero de tareas
+TAREAS_POR_BLOQUE = 1000
+
+# excepciones que el cliente vuelve a lanzar con su tipo; las demas llegan como RuntimeError
+ERRORES = {
+    "ValueError": ValueError,
+    "TypeError": TypeError,
+    "KeyError": KeyError
+}
+
+
+def codificar(mensaje):
+    """bytes de un mensaje listo para enviar"""
+    cuerpo = json.dumps(mensaje, ensure_ascii=False, separators=(",", ":"), default=json_por_defecto).encode("utf-8")
+    return CABECERA.pack(len(cuerpo)) + cuerpo
+
+
+def longitud(cabecera):
+    """tamano del cuerpo segun la cabecera"""
+    tamano = CABECERA.unpack(cabecera)[0]
+    if tamano > TAMANO_MAXIMO:
+        raise ValueError("mensaje demasiado grande: " + str(tamano) + " bytes")
+    return tamano
+
+
+def decodificar(cuerpo):
+    """mensaje a partir del cuerpo recibido"""
+    return json.loads(cuerpo.decode("utf-8"))
+
+
+def excepcion(respuesta):
+    """excepcion que corresponde a una respuesta de error"""
+    return ERRORES.get(respuesta["error"], RuntimeError)(respuesta.get("mensaje", ""))
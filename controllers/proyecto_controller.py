@@ -2,13 +2,16 @@
 controlador para la vista de proyecto (tablero kanban)
 """
 
-from PyQt5.QtWidgets import QWidget, QDialog, QFrame, QVBoxLayout, QHBoxLayout, QLabel, QPushButton
-from PyQt5.QtCore import Qt
-from PyQt5 import uic
+import bisect
+from PyQt5.QtWidgets import QWidget, QDialog, QFrame, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QMessageBox
+from PyQt5.QtCore import QTimer
 from controllers.datos_controller import (
-    obtener_ruta_vista, obtener_tareas_proyecto, crear_tarea,
-    cambiar_estado_tarea, eliminar_tarea
+    obtener_pagina_tareas_proyecto, crear_tarea,
+    cambiar_estado_tarea, eliminar_tarea, obtener_tarea, obtener_proyecto,
+    archivo_disponible, obtener_pagina_archivadas, restaurar_archivada
 )
+from controllers.vistas_compiladas import cargar_vista
+from controllers.trazas import trazar
 
 
 class ControladorNuevaTarea(QDialog):
@@ -16,7 +19,7 @@ class ControladorNuevaTarea(QDialog):
 
     def __init__(self):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("nuevatarea.ui"), self)
+        cargar_vista("nuevatarea.ui", self)
         # pone media como default
         self.comboPrioridad.setCurrentIndex(1)
 
@@ -32,7 +35,7 @@ class ControladorProyecto(QWidget):
 
     def __init__(self, proyecto, datos, funcion_volver):
         super().__init__()
-        uic.loadUi(obtener_ruta_vista("proyecto.ui"), self)
+        cargar_vista("proyecto.ui", self)
         self.proyecto = proyecto
         self.datos = datos
         self.funcion_volver = funcion_volver
@@ -43,6 +46,15 @@ class ControladorProyecto(QWidget):
         # conecta botones
         self.btnExit.clicked.connect(self.volver)
         self.btnAddTodo.clicked.connect(self.agregar_tarea)
+        # las completadas hace tiempo estan en el archivo: se piden con este boton
+        self.btnCargarAnteriores.clicked.connect(self.cargar_archivadas)
+
+        # las siguientes paginas de tareas se cargan al llegar al final del scroll
+        self.scrollArea.verticalScrollBar().valueChanged.connect(self.al_desplazar)
+        # pide otra pagina si la anterior no llego a llenar el tablero
+        self.temporizador_relleno = QTimer(self)
+        self.temporizador_relleno.setSingleShot(True)
+        self.temporizador_relleno.timeout.connect(self.rellenar)
 
         # carga tareas
         self.cargar_tareas()
@@ -51,31 +63,176 @@ class ControladorProyecto(QWidget):
         """vuelve a la pantalla principal"""
         self.funcion_volver()
 
+    @trazar("vista")
     def cargar_tareas(self):
-        """carga las tareas en las columnas"""
+        """carga la primera pagina de tareas en las columnas (solo al abrir el tablero)"""
+        # sin repintar mientras se insertan las tarjetas
+        self.setUpdatesEnabled(False)
+
         # limpia columnas - elimina solo los QFrame (tareas)
         self.limpiar_columna(self.vLayoutTodo)
         self.limpiar_columna(self.vLayoutDoing)
         self.limpiar_columna(self.vLayoutDone)
-
-        # obtiene tareas del proyecto
-        tareas = obtener_tareas_proyecto(self.datos, self.proyecto.get("id"))
+        self.limpiar_columna(self.vLayoutArchivadas)
+
+        # tarea_id -> tarjeta, y lo necesario para recolocarla sin recargar todo
+        self.tarjetas = {}
+        self.estados = {}
+        self.claves = {}
+        # las creadas aqui cuentan hacia arriba y las de cada pagina (cada vez
+        # mas antiguas) hacia abajo, asi la mas nueva siempre queda arriba
+        self.siguiente_clave = 0
+        self.clave_antigua = -1
+        # por columna, claves negadas en orden ascendente (la mas nueva arriba)
+        self.claves_columna = {self.vLayoutTodo: [], self.vLayoutDoing: [], self.vLayoutDone: []}
+
+        self.cursor_tareas = None
+        self.hay_mas_tareas = True
+        self.cargar_pagina_tareas()
+
+        # tarjetas del archivo, debajo de las terminadas
+        self.archivadas = {}
+        self.cursor_archivadas = None
+        self.btnCargarAnteriores.setVisible(archivo_disponible(self.datos))
+
+        self.setUpdatesEnabled(True)
+
+    def cargar_pagina_tareas(self):
+        """anade la siguiente pagina de tareas (de la mas nueva a la mas antigua)"""
+        if not self.hay_mas_tareas:
+            return
+        tareas, self.cursor_tareas = obtener_pagina_tareas_proyecto(
+            self.datos, self.proyecto.get("id"), self.cursor_tareas, recientes_primero=True
+        )
+        self.hay_mas_tareas = self.cursor_tareas is not None
 
         for tarea in tareas:
-            widget = self.crear_widget_tarea(tarea)
-            estado = tarea.get("estado", "pendiente")
+            if tarea.get("id") in self.tarjetas:
+                # ya entro al recargar cambios de otra instancia
+                continue
+            self.claves[tarea.get("id")] = self.clave_antigua
+            self.clave_antigua -= 1
+            self.insertar_tarjeta(tarea)
+
+        if self.hay_mas_tareas:
+            # el tamano del scroll se conoce cuando qt recoloca las columnas
+            self.temporizador_relleno.start(0)
+
+    @trazar("vista")
+    def al_cambiar_datos(self, cambios):
+        """aplica al tablero lo que cambio otra instancia, tocando solo esas tarjetas"""
+        proyecto_id = self.proyecto.get("id")
+        if proyecto_id in cambios["proyectos"]:
+            proyecto = obtener_proyecto(self.datos, proyecto_id)
+            if proyecto is None:
+                # el proyecto se borro en otra instancia
+                self.volver()
+                return
+            self.proyecto = proyecto
+            self.lblProjectTitle.setText("Proyecto: " + proyecto["nombre"])
+        if proyecto_id not in cambios["tareas"]:
+            return
+
+        self.setUpdatesEnabled(False)
+        # tarjetas ya mostradas: fuera las borradas y se rehacen las que cambiaron de estado
+        for tarea_id in list(self.tarjetas):
+            tarea = obtener_tarea(self.datos, tarea_id)
+            if tarea is None or tarea.get("proyecto_id") != proyecto_id:
+                self.quitar_tarjeta(tarea_id)
+            elif tarea.get("estado", "pendiente") != self.estados[tarea_id]:
+                self.quitar_tarjeta(tarea_id)
+                self.insertar_tarjeta(tarea)
+
+        # las que entraron (creadas o recuperadas) son las mas recientes: van
+        # antes de la primera tarjeta que ya estaba
+        nuevas = []
+        cursor = None
+        primera = True
+        while primera or cursor is not None:
+            primera = False
+            tareas, cursor = obtener_pagina_tareas_proyecto(
+                self.datos, proyecto_id, cursor, recientes_primero=True
+            )
+            for tarea in tareas:
+                if tarea.get("id") in self.tarjetas:
+                    cursor = None
+                    break
+                nuevas.append(tarea)
+        # de la mas antigua a la mas nueva, para que la ultima quede arriba
+        for tarea in reversed(nuevas):
+            # una recuperada vuelve arriba aunque tuviera sitio de antes
+            self.claves.pop(tarea.get("id"), None)
+            self.insertar_tarjeta(tarea)
+        self.setUpdatesEnabled(True)
+
+    @trazar("vista")
+    def cargar_archivadas(self):
+        """anade debajo de terminadas la siguiente pagina de tareas archivadas"""
+        tareas, self.cursor_archivadas = obtener_pagina_archivadas(
+            self.datos, self.proyecto.get("id"), self.cursor_archivadas
+        )
+        for tarea in tareas:
+            if tarea["id"] in self.tarjetas or tarea["id"] in self.archivadas:
+                continue
+            widget = self.crear_widget_archivada(tarea)
+            self.vLayoutArchivadas.addWidget(widget)
+            self.archivadas[tarea["id"]] = widget
+        if self.cursor_archivadas is None:
+            # no quedan mas en el archivo
+            self.btnCargarAnteriores.hide()
+
+    def rellenar(self):
+        """carga otra pagina si el tablero aun no tiene scroll"""
+        if self.scrollArea.verticalScrollBar().maximum() == 0:
+            self.cargar_pagina_tareas()
+
+    def al_desplazar(self, valor):
+        """carga la siguiente pagina al acercarse al final del tablero"""
+        barra = self.scrollArea.verticalScrollBar()
+        if valor >= barra.maximum() - barra.pageStep() // 2:
+            self.cargar_pagina_tareas()
+
+    def columna_estado(self, estado):
+        """layout de la columna que corresponde a un estado"""
+        if estado == "pendiente":
+            return self.vLayoutTodo
+        elif estado == "en_curso":
+            return self.vLayoutDoing
+        return self.vLayoutDone
+
+    def insertar_tarjeta(self, tarea):
+        """crea la tarjeta de una tarea y la coloca en su columna"""
+        tarea_id = tarea.get("id")
+        if tarea_id not in self.claves:
+            # orden de llegada: las tareas nuevas tienen clave mayor y van arriba
+            self.claves[tarea_id] = self.siguiente_clave
+            self.siguiente_clave += 1
 
-            if estado == "pendiente":
-                self.vLayoutTodo.insertWidget(1, widget)
-            elif estado == "en_curso":
-                self.vLayoutDoing.insertWidget(1, widget)
-            else:
-                self.vLayoutDone.insertWidget(1, widget)
+        estado = tarea.get("estado", "pendiente")
+        columna = self.columna_estado(estado)
+        claves = self.claves_columna[columna]
+        posicion = bisect.bisect_left(claves, -self.claves[tarea_id])
+        claves.insert(posicion, -self.claves[tarea_id])
+
+        widget = self.crear_widget_tarea(tarea)
+        # el indice 0 es el titulo de la columna
+        columna.insertWidget(1 + posicion, widget)
+        self.tarjetas[tarea_id] = widget
+        self.estados[tarea_id] = estado
+
+    def quitar_tarjeta(self, tarea_id):
+        """quita la tarjeta de una tarea de su columna"""
+        widget = self.tarjetas.pop(tarea_id, None)
+        if widget is None:
+            return
+        columna = self.columna_estado(self.estados.pop(tarea_id))
+        claves = self.claves_columna[columna]
+        del claves[bisect.bisect_left(claves, -self.claves[tarea_id])]
+        columna.removeWidget(widget)
+        widget.deleteLater()
 
     def limpiar_columna(self, layout):
         """elimina solo los widgets QFrame (tareas) de la columna, no los titulos (QLabel)"""
-        from PyQt5.QtWidgets import QLabel
-        
         # recorre de atras hacia adelante para evitar problemas de indices
         i = layout.count() - 1
         while i >= 0:
@@ -89,29 +246,17 @@ class ControladorProyecto(QWidget):
                     widget.deleteLater()
             i = i - 1
 
+    @trazar("vista")
     def crear_widget_tarea(self, tarea):
         """crea widget visual para una tarea"""
         # guarda el id
         tarea_id = tarea.get("id")
 
-        # colores segun prioridad
-        colores = {"alta": "#FF5252", "media": "#FFD740", "baja": "#69F0AE"}
-        prioridad = tarea.get("prioridad", "media")
-        color = colores.get(prioridad, "#FFD740")
-
+        # el aspecto lo pone el tema (vistas/tema.qss) segun nombre y prioridad
         frame = QFrame()
+        frame.setObjectName("tarjetaTarea")
+        frame.setProperty("prioridad", tarea.get("prioridad", "media"))
         frame.setMinimumHeight(70)
-        frame.setStyleSheet("""
-            QFrame {
-                background-color: white;
-                border-radius: 8px;
-                border-left: 5px solid """ + color + """;
-                border-right: 1px solid #FCE4EC;
-                border-top: 1px solid #FCE4EC;
-                border-bottom: 1px solid #FCE4EC;
-            }
-            QFrame:hover { background-color: #FFF5F7; }
-        """)
 
         layout = QVBoxLayout(frame)
         layout.setContentsMargins(10, 8, 10, 8)
@@ -119,7 +264,7 @@ class ControladorProyecto(QWidget):
 
         # titulo
         etiqueta_titulo = QLabel(tarea.get("titulo", "Sin titulo"))
-        etiqueta_titulo.setStyleSheet("font-weight: bold; color: #333;")
+        etiqueta_titulo.setObjectName("tituloTarea")
         etiqueta_titulo.setWordWrap(True)
 
         # botones
@@ -136,29 +281,11 @@ class ControladorProyecto(QWidget):
             boton_accion = None
 
         if boton_accion is not None:
-            boton_accion.setStyleSheet("""
-                QPushButton {
-                    background-color: #D81B60;
-                    color: white;
-                    border-radius: 10px;
-                    padding: 5px 10px;
-                    font-size: 10px;
-                }
-                QPushButton:hover { background-color: #C2185B; }
-            """)
+            boton_accion.setObjectName("botonAccionTarea")
             layout_botones.addWidget(boton_accion)
 
         boton_eliminar = QPushButton("Eliminar")
-        boton_eliminar.setStyleSheet("""
-            QPushButton {
-                background-color: transparent;
-                color: #999;
-                border-radius: 10px;
-                padding: 5px 10px;
-                font-size: 10px;
-            }
-            QPushButton:hover { color: #D32F2F; }
-        """)
+        boton_eliminar.setObjectName("botonEliminarTarea")
         boton_eliminar.clicked.connect(self.crear_funcion_borrar(tarea_id))
 
         layout_botones.addWidget(boton_eliminar)
@@ -169,6 +296,34 @@ class ControladorProyecto(QWidget):
 
         return frame
 
+    def crear_widget_archivada(self, tarea):
+        """tarjeta de una tarea del archivo: solo se puede restaurar"""
+        frame = QFrame()
+        frame.setObjectName("tarjetaTarea")
+        frame.setProperty("prioridad", tarea.get("prioridad", "media"))
+        frame.setProperty("archivada", True)
+        frame.setMinimumHeight(70)
+
+        layout = QVBoxLayout(frame)
+        layout.setContentsMargins(10, 8, 10, 8)
+        layout.setSpacing(5)
+
+        etiqueta_titulo = QLabel(tarea.get("titulo", "Sin titulo"))
+        etiqueta_titulo.setObjectName("tituloTarea")
+        etiqueta_titulo.setWordWrap(True)
+
+        layout_botones = QHBoxLayout()
+        boton_restaurar = QPushButton("Restaurar")
+        boton_restaurar.setObjectName("botonAccionTarea")
+        boton_restaurar.clicked.connect(self.crear_funcion_restaurar(tarea["id"]))
+        layout_botones.addWidget(boton_restaurar)
+        layout_botones.addStretch()
+
+        layout.addWidget(etiqueta_titulo)
+        layout.addLayout(layout_botones)
+
+        return frame
+
     def crear_funcion_mover(self, tarea_id, nuevo_estado):
         """crea una funcion para mover una tarea a un estado"""
         def funcion():
@@ -181,15 +336,44 @@ class ControladorProyecto(QWidget):
             self.borrar_tarea(tarea_id)
         return funcion
 
+    @trazar("vista")
     def mover_tarea(self, tarea_id, nuevo_estado):
-        """cambia el estado de una tarea"""
-        cambiar_estado_tarea(self.datos, tarea_id, nuevo_estado)
-        self.cargar_tareas()
+        """cambia el estado de una tarea y mueve solo su tarjeta"""
+        if cambiar_estado_tarea(self.datos, tarea_id, nuevo_estado):
+            # la tarjeta se rehace porque cambia su boton de accion
+            self.quitar_tarjeta(tarea_id)
+            self.insertar_tarjeta(obtener_tarea(self.datos, tarea_id))
+        else:
+            # la tarea ya no existe: el tablero estaba desfasado
+            self.cargar_tareas()
 
+    def crear_funcion_restaurar(self, tarea_id):
+        """crea una funcion para restaurar una tarea archivada"""
+        def funcion():
+            self.restaurar_tarea(tarea_id)
+        return funcion
+
+    @trazar("vista")
+    def restaurar_tarea(self, tarea_id):
+        """devuelve una tarea del archivo al tablero, arriba de terminadas"""
+        if not restaurar_archivada(self.datos, tarea_id):
+            # la tarjeta se queda: la tarea sigue en el archivo
+            QMessageBox.warning(
+                self, "Error",
+                "No se pudo restaurar la tarea (su proyecto ya no existe o su id esta en uso)"
+            )
+            return
+        widget = self.archivadas.pop(tarea_id, None)
+        if widget is not None:
+            self.vLayoutArchivadas.removeWidget(widget)
+            widget.deleteLater()
+        self.insertar_tarjeta(obtener_tarea(self.datos, tarea_id))
+
+    @trazar("vista")
     def borrar_tarea(self, tarea_id):
-        """elimina una tarea (la manda a papelera)"""
+        """elimina una tarea (la manda a papelera) y quita solo su tarjeta"""
         eliminar_tarea(self.datos, tarea_id)
-        self.cargar_tareas()
+        self.quitar_tarjeta(tarea_id)
 
     def agregar_tarea(self):
         """abre dialogo para crear tarea"""
@@ -197,5 +381,6 @@ class ControladorProyecto(QWidget):
         if dialogo.exec_() == QDialog.Accepted:
             titulo, prioridad = dialogo.obtener_datos()
             if titulo != "":
-                crear_tarea(self.datos, titulo, self.proyecto.get("id"), prioridad)
-                self.cargar_tareas()
+                tarea = crear_tarea(self.datos, titulo, self.proyecto.get("id"), prioridad)
+                if tarea is not None:
+                    self.insertar_tarjeta(tarea)
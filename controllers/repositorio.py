@@ -0,0 +1,963 @@
+"""
+repositorio en memoria con indices sobre los datos (usuarios, proyectos, tareas)
+"""
+
+import json
+import time
+import bisect
+import base64
+import inspect
+
+from controllers.trazas import trazar
+from controllers.cambios import RegistroCambios, TIPO_USUARIO, TIPO_PROYECTO, TIPO_TAREA
+from controllers.tarea_compacta import nueva_tarea, compactar, compactar_lista
+
+
+# orden de los cubos del feed (alta primero, baja ultimo)
+PRIORIDADES = ("alta", "media", "baja")
+
+# tareas por pagina en las vistas que cargan al hacer scroll
+TAMANO_PAGINA = 50
+
+# resultados que devuelve como mucho una busqueda (los mas recientes)
+LIMITE_RESULTADOS = 50
+
+# clave de los datos con el mayor id de tarea que se paso al archivo de completadas
+CLAVE_ID_ARCHIVADO = "id_archivado_maximo"
+
+
+def codificar_cursor(valores):
+    """cursor opaco (texto) a partir de una lista de enteros"""
+    return base64.urlsafe_b64encode(json.dumps(valores).encode("ascii")).decode("ascii")
+
+
+def decodificar_cursor(cursor):
+    """lista de enteros de un cursor creado con codificar_cursor"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("cursor de paginacion no valido")
+
+
+# operaciones que cambian los datos (las que se pueden agrupar en un lote)
+OPERACIONES_LOTE = (
+    "crear_usuario", "eliminar_usuario", "cambiar_rol_usuario",
+    "crear_proyecto", "eliminar_proyecto",
+    "asignar_usuario_proyecto", "desasignar_usuario_proyecto",
+    "crear_tarea", "cambiar_estado_tarea", "eliminar_tarea",
+    "recuperar_tareas", "eliminar_tareas_permanente", "purgar_papelera", "vaciar_papelera",
+    # por posicion en la papelera: solo para repetir diarios antiguos
+    "recuperar_tarea", "eliminar_tarea_permanente"
+)
+
+
+def validar_lote(repositorio, operaciones):
+    """comprueba nombres y argumentos de todas las operaciones antes de aplicar ninguna
+
+    cada operacion es (nombre, argumentos); lanza ValueError con la primera no valida
+    """
+    firmas = {}
+    for numero, operacion in enumerate(operaciones):
+        try:
+            nombre, argumentos = operacion
+        except (TypeError, ValueError):
+            raise ValueError("operacion %d del lote: se esperaba (nombre, argumentos)" % numero)
+        if nombre not in OPERACIONES_LOTE:
+            raise ValueError("operacion %d del lote: operacion desconocida: %s" % (numero, nombre))
+        if nombre not in firmas:
+            firmas[nombre] = inspect.signature(getattr(repositorio, nombre))
+        try:
+            firmas[nombre].bind(*argumentos)
+        except TypeError as error:
+            raise ValueError("operacion %d del lote (%s): %s" % (numero, nombre, error))
+
+
+def cubo_prioridad(tarea):
+    """cubo de una tarea; una prioridad desconocida cuenta como media"""
+    prioridad = tarea.get("prioridad", "media")
+    if prioridad in PRIORIDADES:
+        return prioridad
+    return "media"
+
+
+def posicion_por_orden(tareas, orden, orden_tareas):
+    """primera posicion de una lista ordenada por orden_tareas cuyo orden no es menor que orden"""
+    # busqueda binaria a mano: bisect no acepta key hasta python 3.10
+    inicio = 0
+    fin = len(tareas)
+    while inicio < fin:
+        medio = (inicio + fin) // 2
+        if orden_tareas.get(tareas[medio]["id"], -1) < orden:
+            inicio = medio + 1
+        else:
+            fin = medio
+    return inicio
+
+
+class TareasOrdenadas(dict):
+    """dict tarea_id -> tarea (conjunto ordenado) que se puede retomar desde un orden en O(log n)
+
+    al lado van los ids y su orden en dos listas ordenadas por el; quitar una tarea
+    deja un hueco (None) en vez de mover la lista, hasta que los huecos son la mitad
+    """
+
+    def __init__(self, orden_tareas):
+        super().__init__()
+        self.orden_tareas = orden_tareas
+        self.ids = []
+        self.ordenes = []
+        self.huecos = 0
+
+    def __setitem__(self, tarea_id, tarea):
+        if tarea_id not in self:
+            orden = self.orden_tareas[tarea_id]
+            if len(self.ordenes) == 0 or orden > self.ordenes[-1]:
+                # lo normal: las tareas entran detras de todas
+                self.ids.append(tarea_id)
+                self.ordenes.append(orden)
+            else:
+                posicion = bisect.bisect_left(self.ordenes, orden)
+                if posicion < len(self.ids) and self.ids[posicion] is None and self.ordenes[posicion] == orden:
+                    # vuelve al hueco que dejo
+                    self.ids[posicion] = tarea_id
+                    self.huecos -= 1
+                else:
+                    self.ids.insert(posicion, tarea_id)
+                    self.ordenes.insert(posicion, orden)
+        super().__setitem__(tarea_id, tarea)
+
+    def __delitem__(self, tarea_id):
+        super().__delitem__(tarea_id)
+        self._dejar_hueco(tarea_id)
+
+    def pop(self, tarea_id, *por_defecto):
+        if tarea_id not in self:
+            if por_defecto:
+                return por_defecto[0]
+            raise KeyError(tarea_id)
+        tarea = super().pop(tarea_id)
+        self._dejar_hueco(tarea_id)
+        return tarea
+
+    def _dejar_hueco(self, tarea_id):
+        """marca como hueco la posicion de una tarea quitada y compacta si sobran"""
+        posicion = bisect.bisect_left(self.ordenes, self.orden_tareas.get(tarea_id, -1))
+        if posicion >= len(self.ids) or self.ids[posicion] != tarea_id:
+            posicion = self.ids.index(tarea_id)
+        self.ids[posicion] = None
+        self.huecos += 1
+        if self.huecos > 64 and self.huecos * 2 > len(self.ids):
+            ids = []
+            ordenes = []
+            for tarea_id, orden in zip(self.ids, self.ordenes):
+                if tarea_id is not None:
+                    ids.append(tarea_id)
+                    ordenes.append(orden)
+            self.ids = ids
+            self.ordenes = ordenes
+            self.huecos = 0
+
+    def desde(self, marca, inverso=False):
+        """iterador de las tareas posteriores a la marca (anteriores si inverso)
+
+        marca None empieza por el principio (por el final si inverso)
+        """
+        if inverso:
+            fin = len(self.ids) if marca is None else bisect.bisect_left(self.ordenes, marca)
+            posiciones = range(fin - 1, -1, -1)
+        else:
+            inicio = 0 if marca is None else bisect.bisect_right(self.ordenes, marca)
+            posiciones = range(inicio, len(self.ids))
+        ids = self.ids
+        for posicion in posiciones:
+            if ids[posicion] is not None:
+                yield self[ids[posicion]]
+
+
+def es_pendiente(tarea):
+    """pendientes y en curso: lo que se ve en la lista de inicio"""
+    return tarea.get("estado") != "completada"
+
+
+class FeedUsuario:
+    """tareas visibles para un usuario agrupadas por prioridad en orden de insercion
+
+    aparte van las pendientes (cubos_pendientes), para paginar la lista de inicio sin
+    recorrer las completadas
+    """
+
+    def __init__(self, proyectos_ids, orden_tareas):
+        # None significa que ve todos los proyectos (admin)
+        self.proyectos_ids = proyectos_ids
+        self.cubos = {}
+        self.cubos_pendientes = {}
+        for prioridad in PRIORIDADES:
+            self.cubos[prioridad] = TareasOrdenadas(orden_tareas)
+            self.cubos_pendientes[prioridad] = TareasOrdenadas(orden_tareas)
+
+    def ve(self, tarea):
+        """comprueba si la tarea es de un proyecto visible para el usuario"""
+        return self.proyectos_ids is None or tarea.get("proyecto_id") in self.proyectos_ids
+
+    def agregar(self, tarea):
+        """anade una tarea al final de su cubo (O(1))"""
+        if self.ve(tarea):
+            self.cubos[cubo_prioridad(tarea)][tarea["id"]] = tarea
+            if es_pendiente(tarea):
+                self.cubos_pendientes[cubo_prioridad(tarea)][tarea["id"]] = tarea
+
+    def quitar(self, tarea):
+        """quita una tarea de su cubo (O(1))"""
+        self.cubos[cubo_prioridad(tarea)].pop(tarea["id"], None)
+        self.cubos_pendientes[cubo_prioridad(tarea)].pop(tarea["id"], None)
+
+    def cambiar_estado(self, tarea):
+        """pone o quita la tarea de las pendientes segun su estado nuevo"""
+        if tarea["id"] not in self.cubos[cubo_prioridad(tarea)]:
+            return
+        if es_pendiente(tarea):
+            # vuelve a su sitio por su orden, no al final
+            self.cubos_pendientes[cubo_prioridad(tarea)][tarea["id"]] = tarea
+        else:
+            self.cubos_pendientes[cubo_prioridad(tarea)].pop(tarea["id"], None)
+
+    def tareas(self):
+        """lista ordenada por prioridad y, dentro de cada una, por insercion"""
+        tareas = []
+        for prioridad in PRIORIDADES:
+            tareas.extend(self.cubos[prioridad].values())
+        return tareas
+
+
+# atributos que crea reconstruir() al primer uso
+ATRIBUTOS_INDICES = (
+    "proyectos_por_id", "tareas_por_id", "tareas_por_proyecto",
+    "siguiente_id_proyecto", "siguiente_id_tarea", "feeds",
+    "orden_tareas", "siguiente_orden", "busqueda", "papelera_por_id"
+)
+
+
+class Repositorio:
+    """mantiene indices id->tarea, id->proyecto y proyecto_id->tareas sincronizados"""
+
+    # los cambios se guardan con guardar_datos (el repositorio solo toca memoria)
+    persistente = False
+
+    def __init__(self, datos, orden_previo=None):
+        self.datos = datos
+        # orden_tareas del repositorio al que sustituye (al recargar datos cambiados fuera)
+        self.orden_previo = orden_previo
+        # numera cada cambio para cambios_desde (sincronizar otras copias)
+        self.cambios = RegistroCambios(self)
+
+    def __getattr__(self, nombre):
+        # los indices se montan la primera vez que se usan; consultar usuarios
+        # (login) no necesita leer proyectos ni tareas
+        if nombre in ATRIBUTOS_INDICES:
+            self.reconstruir()
+            return object.__getattribute__(self, nombre)
+        raise AttributeError(nombre)
+
+    @trazar("datos")
+    def reconstruir(self):
+        """recorre los datos una sola vez y monta todos los indices"""
+        self.proyectos_por_id = {}
+        self.tareas_por_id = {}
+        # proyecto_id -> {tarea_id: tarea} (TareasOrdenadas: dict como conjunto ordenado)
+        self.tareas_por_proyecto = {}
+        self.siguiente_id_proyecto = 1
+        # los ids de las tareas archivadas tampoco se repiten (se pueden restaurar)
+        self.siguiente_id_tarea = self.datos.get(CLAVE_ID_ARCHIVADO, 0) + 1
+        # usuario -> FeedUsuario, se crean al pedir las tareas del usuario
+        self.feeds = {}
+        # tarea_id -> numero creciente segun entra en tareas o papelera; las listas
+        # y los indices quedan siempre ordenados por el (lo usan los cursores)
+        # las tareas borradas del todo dejan su entrada hasta reconstruir
+        self.orden_tareas = {}
+        self.siguiente_orden = 0
+        conservados = {}
+        if self.orden_previo:
+            # tras recargar se conserva el orden que ya tenian las tareas, asi los
+            # cursores de las vistas abiertas siguen valiendo; las nuevas van detras
+            self.siguiente_orden = max(self.orden_previo.values()) + 1
+            conservados = self._conservar_orden(self.datos["papelera"], self.orden_previo)
+            conservados.update(self._conservar_orden(self.datos["tareas"], self.orden_previo))
+        self.orden_previo = None
+        # indice de palabras, se monta en la primera busqueda
+        self.busqueda = None
+        # tarea_id -> tarea de la papelera, en el mismo orden que la lista
+        self.papelera_por_id = {}
+
+        for proyecto in self.datos["proyectos"]:
+            proyecto_id = proyecto.get("id")
+            self.proyectos_por_id[proyecto_id] = proyecto
+            self.tareas_por_proyecto[proyecto_id] = TareasOrdenadas(self.orden_tareas)
+            if proyecto_id is not None and proyecto_id >= self.siguiente_id_proyecto:
+                self.siguiente_id_proyecto = proyecto_id + 1
+
+        # las tareas leidas como dict pasan a TareaCompacta (ver controllers/tarea_compacta.py)
+        compactar_lista(self.datos["papelera"])
+        compactar_lista(self.datos["tareas"])
+
+        # los ids de papelera tambien cuentan para no repetirlos al crear
+        ids_usados = set()
+        ahora = time.time()
+        for tarea in self.datos["papelera"]:
+            self._reservar_id_tarea(tarea, ids_usados)
+            self._asignar_orden(tarea, conservados.get(tarea["id"]))
+            self.papelera_por_id[tarea["id"]] = tarea
+            if "eliminada" not in tarea:
+                # papeleras de antes de la retencion: cuentan desde que se cargan
+                tarea["eliminada"] = ahora
+
+        for tarea in self.datos["tareas"]:
+            self._reservar_id_tarea(tarea, ids_usados)
+            self._indexar_tarea(tarea, conservados.get(tarea["id"]))
+
+    def _conservar_orden(self, tareas, orden_previo):
+        """orden anterior de las tareas de una lista mientras siga creciendo"""
+        conservados = {}
+        ultimo = -1
+        for tarea in tareas:
+            orden = orden_previo.get(tarea.get("id"))
+            if orden is None or orden <= ultimo:
+                # desde aqui la lista es distinta: el resto recibe orden nuevo
+                break
+            conservados[tarea["id"]] = orden
+            ultimo = orden
+        return conservados
+
+    def _reservar_id_tarea(self, tarea, ids_usados):
+        """registra el id de una tarea, renumerando si ya estaba repetido"""
+        tarea_id = tarea.get("id")
+        if tarea_id is None or tarea_id in ids_usados:
+            # datos antiguos podian repetir ids tras vaciar la papelera
+            tarea_id = None
+        else:
+            ids_usados.add(tarea_id)
+            if tarea_id >= self.siguiente_id_tarea:
+                self.siguiente_id_tarea = tarea_id + 1
+        if tarea_id is None:
+            tarea["id"] = self.nuevo_id_tarea()
+            ids_usados.add(tarea["id"])
+
+    def _asignar_orden(self, tarea, orden=None):
+        """pone la tarea detras de todas las demas (acaba de entrar al final de su lista)"""
+        if orden is None:
+            orden = self.siguiente_orden
+            self.siguiente_orden += 1
+        self.orden_tareas[tarea["id"]] = orden
+
+    def _indexar_tarea(self, tarea, orden=None):
+        """anade una tarea activa a los indices"""
+        self._asignar_orden(tarea, orden)
+        self.tareas_por_id[tarea["id"]] = tarea
+        proyecto_id = tarea.get("proyecto_id")
+        if proyecto_id not in self.tareas_por_proyecto:
+            self.tareas_por_proyecto[proyecto_id] = TareasOrdenadas(self.orden_tareas)
+        self.tareas_por_proyecto[proyecto_id][tarea["id"]] = tarea
+        for feed in self.feeds.values():
+            feed.agregar(tarea)
+        if self.busqueda is not None:
+            self.busqueda.agregar_tarea(tarea)
+
+    def _desindexar_tarea(self, tarea):
+        """quita una tarea activa de los indices"""
+        self.tareas_por_id.pop(tarea["id"], None)
+        tareas_proyecto = self.tareas_por_proyecto.get(tarea.get("proyecto_id"))
+        if tareas_proyecto is not None:
+            tareas_proyecto.pop(tarea["id"], None)
+        for feed in self.feeds.values():
+            feed.quitar(tarea)
+        if self.busqueda is not None:
+            self.busqueda.quitar_tarea(tarea)
+
+    def _invalidar_feed(self, usuario=None):
+        """descarta el feed de un usuario (o todos) tras cambiar su visibilidad"""
+        if usuario is None:
+            self.feeds = {}
+        else:
+            self.feeds.pop(usuario, None)
+
+    def proyectos_visibles(self, usuario):
+        """ids de los proyectos que ve el usuario (None si los ve todos)"""
+        feed = self.feeds.get(usuario)
+        if feed is not None:
+            return feed.proyectos_ids
+        if self.es_admin(usuario):
+            return None
+        proyectos_ids = set()
+        for proyecto in self.obtener_proyectos_usuario(usuario):
+            proyectos_ids.add(proyecto.get("id"))
+        return proyectos_ids
+
+    def obtener_feed(self, usuario):
+        """devuelve el feed del usuario, montandolo con una pasada si no existe"""
+        feed = self.feeds.get(usuario)
+        if feed is None:
+            feed = FeedUsuario(self.proyectos_visibles(usuario), self.orden_tareas)
+            for tarea in self.datos["tareas"]:
+                feed.agregar(tarea)
+            self.feeds[usuario] = feed
+        return feed
+
+    def nuevo_id_proyecto(self, proyecto_id=None):
+        """reserva el siguiente id libre de proyecto (o el indicado, al repetir el diario)"""
+        if proyecto_id is None:
+            proyecto_id = self.siguiente_id_proyecto
+        self.siguiente_id_proyecto = max(self.siguiente_id_proyecto, proyecto_id + 1)
+        return proyecto_id
+
+    def reservar_ids_tarea(self, cantidad):
+        """reserva cantidad ids de tarea seguidos (importaciones); devuelve el primero"""
+        primero = self.siguiente_id_tarea
+        self.siguiente_id_tarea += cantidad
+        return primero
+
+    def nuevo_id_tarea(self, tarea_id=None):
+        """reserva el siguiente id libre de tarea (o el indicado, al repetir el diario)"""
+        if tarea_id is None:
+            tarea_id = self.siguiente_id_tarea
+        self.siguiente_id_tarea = max(self.siguiente_id_tarea, tarea_id + 1)
+        return tarea_id
+
+    # paginacion
+
+    def _desde(self, tareas, marca, inverso):
+        """iterador de las tareas de una seccion posteriores a la marca (anteriores si inverso)"""
+        if isinstance(tareas, TareasOrdenadas):
+            return tareas.desde(marca, inverso)
+        # lista ordenada por orden_tareas: se busca la marca por biseccion
+        if inverso:
+            fin = len(tareas) if marca is None else posicion_por_orden(tareas, marca, self.orden_tareas)
+            return (tareas[posicion] for posicion in range(fin - 1, -1, -1))
+        inicio = 0 if marca is None else posicion_por_orden(tareas, marca + 1, self.orden_tareas)
+        return (tareas[posicion] for posicion in range(inicio, len(tareas)))
+
+    def _paginar(self, secciones, cursor, limite, inverso=False):
+        """una pagina sobre varias secciones seguidas (TareasOrdenadas o listas ordenadas por orden_tareas)
+
+        el cursor guarda la seccion y el orden de la ultima tarea entregada; se retoma
+        buscando ese orden (O(log n)) y las tareas nuevas, que van al final de su
+        seccion, no alteran lo ya paginado
+        """
+        if cursor is None:
+            seccion, marca = 0, None
+        else:
+            seccion, marca = decodificar_cursor(cursor)
+
+        pagina = []
+        while seccion < len(secciones):
+            for tarea in self._desde(secciones[seccion], marca, inverso):
+                if len(pagina) >= limite:
+                    # queda al menos esta tarea
+                    return pagina, codificar_cursor([seccion, marca])
+                pagina.append(tarea)
+                marca = self.orden_tareas[tarea["id"]]
+            seccion, marca = seccion + 1, None
+        return pagina, None
+
+    def obtener_pagina_tareas_usuario(self, usuario, cursor=None, limite=TAMANO_PAGINA, solo_pendientes=False):
+        """pagina de las tareas del usuario (mismo orden que obtener_tareas_usuario) y cursor siguiente
+
+        solo_pendientes deja fuera las completadas sin recorrerlas (lista de inicio)
+        """
+        feed = self.obtener_feed(usuario)
+        cubos = feed.cubos_pendientes if solo_pendientes else feed.cubos
+        return self._paginar([cubos[prioridad] for prioridad in PRIORIDADES], cursor, limite)
+
+    def obtener_pagina_tareas_proyecto(self, proyecto_id, cursor=None, limite=TAMANO_PAGINA, recientes_primero=False):
+        """pagina de las tareas de un proyecto y cursor siguiente (None si no hay mas)"""
+        return self._paginar([self.tareas_por_proyecto.get(proyecto_id, [])], cursor, limite, recientes_primero)
+
+    def obtener_pagina_papelera(self, cursor=None, limite=TAMANO_PAGINA):
+        """pagina de la papelera en orden de borrado y cursor siguiente"""
+        return self._paginar([self.datos["papelera"]], cursor, limite)
+
+    def contar_papelera(self):
+        """numero de tareas en la papelera"""
+        return len(self.datos["papelera"])
+
+    def contar_tareas(self):
+        """numero de tareas activas"""
+        return len(self.datos["tareas"])
+
+    def recorrer_tareas(self, papelera=False):
+        """iterador sobre las tareas activas (o las de papelera) en su orden"""
+        if papelera:
+            return iter(self.papelera_por_id.values())
+        return iter(self.datos["tareas"])
+
+    def obtener_pagina_tareas(self, cursor=None, limite=TAMANO_PAGINA, papelera=False):
+        """pagina de las tareas activas (o las de papelera) en el orden de recorrer_tareas y cursor siguiente"""
+        if papelera:
+            return self.obtener_pagina_papelera(cursor, limite)
+        return self._paginar([self.datos["tareas"]], cursor, limite)
+
+    # busqueda
+
+    def obtener_indice_busqueda(self):
+        """devuelve el indice de palabras, montandolo con una pasada si no existe"""
+        if self.busqueda is None:
+            # import local: el indice (y unicodedata) no hace falta hasta la primera busqueda
+            from controllers.busqueda import IndiceBusqueda
+            busqueda = IndiceBusqueda(self.orden_tareas)
+            busqueda.cargar(self.datos["proyectos"], self.datos["tareas"])
+            self.busqueda = busqueda
+        return self.busqueda
+
+    def buscar_tareas(self, usuario, consulta, limite=LIMITE_RESULTADOS):
+        """tareas visibles para el usuario cuyo titulo o proyecto contiene las palabras de la consulta"""
+        return self.obtener_indice_busqueda().buscar(
+            consulta, self.tareas_por_proyecto, self.proyectos_visibles(usuario), limite
+        )
+
+    # consultas de listas completas
+
+    def obtener_usuarios(self):
+        """devuelve el diccionario usuario -> info"""
+        return self.datos["usuarios"]
+
+    def obtener_usuario(self, usuario):
+        """devuelve la info de un usuario o None si no existe"""
+        return self.datos["usuarios"].get(usuario)
+
+    def obtener_proyectos(self):
+        """devuelve la lista de proyectos"""
+        return self.datos["proyectos"]
+
+    def obtener_papelera(self):
+        """devuelve la lista de tareas en papelera"""
+        return list(self.papelera_por_id.values())
+
+    def cambios_desde(self, desde, origen=None):
+        """lo cambiado despues del cambio desde (ver controllers/cambios.py)"""
+        return self.cambios.cambios_desde(desde, origen)
+
+    # usuarios
+
+    def crear_usuario(self, usuario, password, nombre):
+        """crea un nuevo usuario normal"""
+        if usuario in self.datos["usuarios"]:
+            return False
+
+        self.datos["usuarios"][usuario] = {
+            "password": password,
+            "rol": "user",
+            "nombre": nombre
+        }
+        self.cambios.sellar(TIPO_USUARIO, usuario, self.datos["usuarios"][usuario])
+        return True
+
+    def eliminar_usuario(self, usuario):
+        """elimina un usuario y lo quita de todos los proyectos"""
+        if usuario == "admin" or usuario not in self.datos["usuarios"]:
+            return False
+
+        del self.datos["usuarios"][usuario]
+        self.cambios.lapida(TIPO_USUARIO, usuario)
+        self._invalidar_feed(usuario)
+        for proyecto in self.datos["proyectos"]:
+            participantes = proyecto.get("participantes", [])
+            if usuario in participantes:
+                participantes.remove(usuario)
+                self.cambios.sellar(TIPO_PROYECTO, proyecto["id"], proyecto)
+        return True
+
+    def es_admin(self, usuario):
+        """comprueba si el usuario es admin"""
+        info = self.datos["usuarios"].get(usuario)
+        if info is None:
+            return False
+        return info["rol"] == "admin"
+
+    def cambiar_rol_usuario(self, usuario, nuevo_rol):
+        """cambia el rol de un usuario (no el del admin principal)"""
+        if usuario == "admin" or usuario not in self.datos["usuarios"]:
+            return False
+
+        self.datos["usuarios"][usuario]["rol"] = nuevo_rol
+        self.cambios.sellar(TIPO_USUARIO, usuario, self.datos["usuarios"][usuario])
+        self._invalidar_feed(usuario)
+        return True
+
+    # proyectos
+
+    def crear_proyecto(self, nombre, descripcion="", proyecto_id=None):
+        """crea un nuevo proyecto"""
+        proyecto = {
+            "id": self.nuevo_id_proyecto(proyecto_id),
+            "nombre": nombre,
+            "descripcion": descripcion,
+            "participantes": []
+        }
+        self.datos["proyectos"].append(proyecto)
+        self.proyectos_por_id[proyecto["id"]] = proyecto
+        self.cambios.sellar(TIPO_PROYECTO, proyecto["id"], proyecto)
+        self.tareas_por_proyecto[proyecto["id"]] = TareasOrdenadas(self.orden_tareas)
+        if self.busqueda is not None:
+            self.busqueda.agregar_proyecto(proyecto)
+        return proyecto
+
+    def eliminar_proyecto(self, proyecto_id):
+        """elimina un proyecto, sus tareas y sus tareas de papelera"""
+        proyecto = self.proyectos_por_id.pop(proyecto_id, None)
+        if proyecto is not None:
+            self.datos["proyectos"].remove(proyecto)
+            self.cambios.lapida(TIPO_PROYECTO, proyecto_id)
+            if self.busqueda is not None:
+                self.busqueda.quitar_proyecto(proyecto)
+
+        tareas_proyecto = self.tareas_por_proyecto.pop(proyecto_id, {})
+        self._invalidar_feed()
+        if len(tareas_proyecto) > 0:
+            for tarea_id in tareas_proyecto:
+                del self.tareas_por_id[tarea_id]
+                if self.busqueda is not None:
+                    self.busqueda.quitar_tarea(tareas_proyecto[tarea_id])
+            self.datos["tareas"] = [
+                tarea for tarea in self.datos["tareas"]
+                if tarea.get("proyecto_id") != proyecto_id
+            ]
+            self.cambios.lapidas(TIPO_TAREA, list(tareas_proyecto))
+
+        borradas = [
+            tarea["id"] for tarea in self.papelera_por_id.values()
+            if tarea.get("proyecto_id") == proyecto_id
+        ]
+        self._quitar_de_papelera(borradas)
+        self.cambios.lapidas(TIPO_TAREA, borradas)
+        return proyecto is not None
+
+    def obtener_proyecto(self, proyecto_id):
+        """obtiene un proyecto por su id"""
+        return self.proyectos_por_id.get(proyecto_id)
+
+    def obtener_proyectos_usuario(self, usuario):
+        """obtiene los proyectos donde participa un usuario (admins ven todos)"""
+        if self.es_admin(usuario):
+            return list(self.datos["proyectos"])
+
+        proyectos = []
+        for proyecto in self.datos["proyectos"]:
+            if usuario in proyecto.get("participantes", []):
+                proyectos.append(proyecto)
+        return proyectos
+
+    def asignar_usuario_proyecto(self, usuario, proyecto_id):
+        """asigna un usuario a un proyecto"""
+        proyecto = self.proyectos_por_id.get(proyecto_id)
+        if proyecto is None:
+            return False
+
+        if "participantes" not in proyecto:
+            proyecto["participantes"] = []
+        if usuario in proyecto["participantes"]:
+            return False
+
+        proyecto["participantes"].append(usuario)
+        self.cambios.sellar(TIPO_PROYECTO, proyecto_id, proyecto)
+        self._invalidar_feed(usuario)
+        return True
+
+    def desasignar_usuario_proyecto(self, usuario, proyecto_id):
+        """quita un usuario de un proyecto"""
+        proyecto = self.proyectos_por_id.get(proyecto_id)
+        if proyecto is None:
+            return False
+
+        participantes = proyecto.get("participantes", [])
+        if usuario not in participantes:
+            return False
+
+        participantes.remove(usuario)
+        self.cambios.sellar(TIPO_PROYECTO, proyecto_id, proyecto)
+        self._invalidar_feed(usuario)
+        return True
+
+    # tareas
+
+    def crear_tarea(self, titulo, proyecto_id, prioridad="media", tarea_id=None):
+        """crea una nueva tarea en un proyecto"""
+        proyecto = self.proyectos_por_id.get(proyecto_id)
+        if proyecto is None:
+            return None
+
+        tarea = nueva_tarea(self.nuevo_id_tarea(tarea_id), titulo, proyecto_id, proyecto["nombre"], "pendiente", prioridad)
+        self.datos["tareas"].append(tarea)
+        self._indexar_tarea(tarea)
+        self.cambios.sellar(TIPO_TAREA, tarea["id"], tarea)
+        return tarea
+
+    def obtener_tarea(self, tarea_id):
+        """obtiene una tarea activa por su id"""
+        return self.tareas_por_id.get(tarea_id)
+
+    def obtener_tareas_proyecto(self, proyecto_id):
+        """obtiene las tareas de un proyecto en orden de creacion"""
+        return list(self.tareas_por_proyecto.get(proyecto_id, {}).values())
+
+    def obtener_tareas_usuario(self, usuario):
+        """obtiene las tareas visibles para el usuario ordenadas por prioridad"""
+        # el feed ya esta ordenado: no hace falta ordenar en cada refresco
+        return self.obtener_feed(usuario).tareas()
+
+    def cambiar_estado_tarea(self, tarea_id, nuevo_estado, momento=None):
+        """cambia el estado de una tarea (momento: hora si pasa a completada, al repetir el diario)"""
+        tarea = self.tareas_por_id.get(tarea_id)
+        if tarea is None:
+            return False
+
+        tarea["estado"] = nuevo_estado
+        if nuevo_estado == "completada":
+            # desde aqui cuentan los dias para pasar al archivo de completadas
+            tarea["completada"] = time.time() if momento is None else momento
+        elif "completada" in tarea:
+            del tarea["completada"]
+        for feed in self.feeds.values():
+            feed.cambiar_estado(tarea)
+        self.cambios.sellar(TIPO_TAREA, tarea_id, tarea)
+        return True
+
+    def eliminar_tarea(self, tarea_id, momento=None):
+        """mueve una tarea a la papelera (momento: hora del borrado, al repetir el diario)"""
+        tarea = self.tareas_por_id.get(tarea_id)
+        if tarea is None:
+            return False
+
+        self._desindexar_tarea(tarea)
+        self._quitar_de_lista(self.datos["tareas"], tarea)
+        self._anadir_a_papelera(tarea, momento)
+        return True
+
+    def _quitar_de_lista(self, tareas, tarea):
+        """quita una tarea de su lista buscandola por orden (la lista esta ordenada por el)"""
+        # busqueda binaria: comparar con == cada tarea hasta encontrarla es mucho mas lento
+        posicion = posicion_por_orden(tareas, self.orden_tareas[tarea["id"]], self.orden_tareas)
+        if posicion < len(tareas) and tareas[posicion] is tarea:
+            del tareas[posicion]
+        else:
+            tareas.remove(tarea)
+
+    def _anadir_a_papelera(self, tarea, momento):
+        """pone una tarea ya desindexada al final de la papelera con su hora de borrado"""
+        if momento is None:
+            momento = time.time()
+        tarea["eliminada"] = momento
+        self.datos["papelera"].append(tarea)
+        self.papelera_por_id[tarea["id"]] = tarea
+        self._asignar_orden(tarea)
+        self.cambios.sellar(TIPO_TAREA, tarea["id"], tarea)
+
+    def _quitar_de_papelera(self, ids):
+        """quita de la papelera las tareas indicadas con una sola pasada por la lista"""
+        quitadas = set()
+        for tarea_id in ids:
+            if self.papelera_por_id.pop(tarea_id, None) is not None:
+                quitadas.add(tarea_id)
+        if len(quitadas) > 0:
+            self.datos["papelera"] = [
+                tarea for tarea in self.datos["papelera"]
+                if tarea["id"] not in quitadas
+            ]
+
+    def recuperar_tareas(self, ids):
+        """recupera tareas de la papelera por id; devuelve True/False por cada una
+
+        solo se recuperan las de proyectos que siguen existiendo
+        """
+        recuperadas = {}
+        resultados = []
+        for tarea_id in ids:
+            tarea = self.papelera_por_id.get(tarea_id)
+            if tarea is None or tarea_id in recuperadas or tarea.get("proyecto_id") not in self.proyectos_por_id:
+                resultados.append(False)
+                continue
+            recuperadas[tarea_id] = tarea
+            resultados.append(True)
+
+        self._quitar_de_papelera(recuperadas)
+        for tarea in recuperadas.values():
+            del tarea["eliminada"]
+            self.datos["tareas"].append(tarea)
+            self._indexar_tarea(tarea)
+            self.cambios.sellar(TIPO_TAREA, tarea["id"], tarea)
+        return resultados
+
+    def eliminar_tareas_permanente(self, ids):
+        """elimina tareas de la papelera para siempre; devuelve True/False por cada una"""
+        resultados = []
+        eliminadas = set()
+        for tarea_id in ids:
+            existe = tarea_id in self.papelera_por_id and tarea_id not in eliminadas
+            if existe:
+                eliminadas.add(tarea_id)
+            resultados.append(existe)
+        self._quitar_de_papelera(eliminadas)
+        self.cambios.lapidas(TIPO_TAREA, list(eliminadas))
+        return resultados
+
+    def purgar_papelera(self, limite):
+        """elimina las tareas borradas antes de limite (segundos epoch); devuelve cuantas
+
+        la papelera esta en orden de borrado: solo se miran las caducadas del principio
+        """
+        papelera = self.datos["papelera"]
+        papelera_por_id = self.papelera_por_id
+        caducadas = 0
+        while caducadas < len(papelera) and papelera[caducadas].get("eliminada", limite) < limite:
+            papelera_por_id.pop(papelera[caducadas]["id"], None)
+            caducadas += 1
+        if caducadas > 0:
+            self.cambios.lapidas(TIPO_TAREA, [tarea["id"] for tarea in papelera[:caducadas]])
+            del papelera[:caducadas]
+        return caducadas
+
+    def recuperar_tarea(self, indice):
+        """recupera la tarea en la posicion indice de la papelera (diarios antiguos)"""
+        if indice < 0 or indice >= len(self.datos["papelera"]):
+            return False
+        return self.recuperar_tareas([self.datos["papelera"][indice]["id"]])[0]
+
+    def eliminar_tarea_permanente(self, indice):
+        """elimina la tarea en la posicion indice de la papelera (diarios antiguos)"""
+        if indice < 0 or indice >= len(self.datos["papelera"]):
+            return False
+        return self.eliminar_tareas_permanente([self.datos["papelera"][indice]["id"]])[0]
+
+    # archivo de completadas (ver controllers/archivo_completadas.py)
+
+    def sellar_completadas(self, momento):
+        """pone hora a las completadas que no la tienen (de antes del archivo); devuelve cuantas"""
+        selladas = 0
+        for tarea in self.datos["tareas"]:
+            if tarea.get("estado") == "completada" and "completada" not in tarea:
+                tarea["completada"] = momento
+                selladas += 1
+        return selladas
+
+    def completadas_antes(self, limite):
+        """tareas activas completadas antes de limite (segundos epoch)"""
+        return [
+            tarea for tarea in self.datos["tareas"]
+            if tarea.get("estado") == "completada" and tarea.get("completada", limite) < limite
+        ]
+
+    def archivar_tareas(self, ids):
+        """saca de las tareas activas las que ya se escribieron en el archivo; devuelve cuantas"""
+        archivadas = set()
+        for tarea_id in ids:
+            tarea = self.tareas_por_id.get(tarea_id)
+            if tarea is not None:
+                self._desindexar_tarea(tarea)
+                archivadas.add(tarea_id)
+        if len(archivadas) == 0:
+            return 0
+        self.datos["tareas"] = [
+            tarea for tarea in self.datos["tareas"]
+            if tarea["id"] not in archivadas
+        ]
+        self.datos[CLAVE_ID_ARCHIVADO] = max(self.datos.get(CLAVE_ID_ARCHIVADO, 0), max(archivadas))
+        self.cambios.lapidas(TIPO_TAREA, list(archivadas))
+        return len(archivadas)
+
+    def restaurar_archivadas(self, tareas, momento=None):
+        """vuelve a poner tareas del archivo entre las activas; devuelve True/False por cada una
+
+        cuentan como completadas en momento, asi no vuelven al archivo en el siguiente
+        barrido; no se restauran si su proyecto ya no existe o su id esta en uso
+        """
+        if momento is None:
+            momento = time.time()
+        resultados = []
+        for registro in tareas:
+            tarea_id = registro.get("id")
+            if (registro.get("proyecto_id") not in self.proyectos_por_id
+                    or tarea_id in self.tareas_por_id or tarea_id in self.papelera_por_id):
+                resultados.append(False)
+                continue
+            tarea = compactar(registro)
+            if tarea is registro:
+                tarea = tarea.copy()
+            tarea["completada"] = momento
+            self.nuevo_id_tarea(tarea_id)
+            self.datos["tareas"].append(tarea)
+            self._indexar_tarea(tarea)
+            self.cambios.sellar(TIPO_TAREA, tarea_id, tarea)
+            resultados.append(True)
+        return resultados
+
+    # lotes
+
+    def aplicar_lote(self, operaciones, resultados=None):
+        """aplica varias operaciones seguidas; devuelve el resultado de cada una
+
+        si alguna no es valida no se aplica ninguna; resultados (si se pasa) se va
+        llenando, asi quien llama sabe cuantas se aplicaron aunque falle una a medias
+        """
+        validar_lote(self, operaciones)
+        if resultados is None:
+            resultados = []
+        posicion = 0
+        while posicion < len(operaciones):
+            nombre, argumentos = operaciones[posicion]
+            if nombre == "eliminar_tarea":
+                # los borrados seguidos recorren la lista de tareas una sola vez
+                fin = posicion
+                while fin < len(operaciones) and operaciones[fin][0] == "eliminar_tarea":
+                    fin += 1
+                borrados = [operaciones[i][1] for i in range(posicion, fin)]
+                resultados.extend(self._eliminar_tareas(borrados))
+                posicion = fin
+            else:
+                resultados.append(getattr(self, nombre)(*argumentos))
+                posicion += 1
+        return resultados
+
+    def _eliminar_tareas(self, borrados):
+        """eliminar_tarea para varias tareas con una sola pasada por la lista
+
+        borrados son los argumentos de cada eliminar_tarea: (tarea_id,) o (tarea_id, momento)
+        """
+        eliminadas = {}
+        resultados = []
+        for argumentos in borrados:
+            tarea = self.tareas_por_id.get(argumentos[0])
+            if tarea is None:
+                resultados.append(False)
+                continue
+            self._desindexar_tarea(tarea)
+            eliminadas[tarea["id"]] = (tarea, argumentos[1] if len(argumentos) > 1 else None)
+            resultados.append(True)
+
+        if len(eliminadas) > 0:
+            self.datos["tareas"] = [
+                tarea for tarea in self.datos["tareas"]
+                if tarea["id"] not in eliminadas
+            ]
+            for tarea, momento in eliminadas.values():
+                self._anadir_a_papelera(tarea, momento)
+        return resultados
+
+    def vaciar_papelera(self):
+        """vacia la papelera"""
+        self.cambios.lapidas(TIPO_TAREA, [tarea["id"] for tarea in self.datos["papelera"]])
+        self.datos["papelera"] = []
+        self.papelera_por_id = {}
+        return True
+
+
+class Datos(dict):
+    """diccionario de datos que lleva asociado su repositorio con indices"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.repositorio = Repositorio(self)
+
+
+def obtener_repositorio(datos):
+    """devuelve el repositorio de unos datos (uno temporal si es un dict normal)"""
+    repositorio = getattr(datos, "repositorio", None)
+    if repositorio is None:
+        repositorio = Repositorio(datos)
+    return repositorio
@@ -0,0 +1,112 @@
+"""
+servidor local de datos: un solo proceso es dueno de los datos y atiende las
+operaciones de datos_controller para varias aplicaciones (backend "servidor")
+
+cada conexion queda abierta entre peticiones y puede mandar varias sin esperar la
+respuesta (pipelining); las respuestas salen en el mismo orden (ver controllers/protocolo.py)
+
+uso: python -m controllers.servidor [--host 127.0.0.1] [--puerto 8765]
+"""
+
+import sys
+import asyncio
+import argparse
+
+from controllers.repositorio import OPERACIONES_LOTE
+from controllers.protocolo import CABECERA, CONSULTAS, codificar, decodificar, longitud
+from controllers import datos_controller
+
+
+class ServidorDatos:
+    """atiende las peticiones de los clientes sobre unos datos ya cargados"""
+
+    def __init__(self, datos):
+        self.datos = datos
+        self.peticiones = 0
+
+    def ejecutar(self, operacion, argumentos, resultados):
+        """ejecuta una operacion; los cambios se guardan como en local, con aplicar_lote"""
+        repositorio = datos_controller.obtener_repositorio(self.datos)
+        if operacion in CONSULTAS:
+            return getattr(repositorio, operacion)(*argumentos)
+        if operacion == "aplicar_lote":
+            return datos_controller.aplicar_lote(self.datos, argumentos[0], resultados)
+        if operacion in OPERACIONES_LOTE:
+            return datos_controller.aplicar_lote(self.datos, [(operacion, argumentos)], resultados)[0]
+        raise ValueError("operacion desconocida: " + str(operacion))
+
+    def responder(self, peticion):
+        """respuesta a una peticion ya decodificada"""
+        self.peticiones += 1
+        respuesta = {"id": peticion.get("id")}
+        # un lote que falla a medias devuelve tambien lo que si se aplico
+        resultados = []
+        try:
+            respuesta["resultado"] = self.ejecutar(peticion.get("op"), peticion.get("args", []), resultados)
+        except Exception as error:
+            respuesta["error"] = type(error).__name__
+            respuesta["mensaje"] = str(error)
+            if peticion.get("op") == "aplicar_lote":
+                respuesta["resultado"] = resultados
+        return respuesta
+
+    async def atender(self, lector, escritor):
+        """atiende una conexion hasta que el cliente la cierra"""
+        try:
+            while True:
+                try:
+                    cabecera = await lector.readexactly(CABECERA.size)
+                except asyncio.IncompleteReadError:
+                    # el cliente cerro la conexion
+                    break
+                cuerpo = await lector.readexactly(longitud(cabecera))
+                escritor.write(codificar(self.responder(decodificar(cuerpo))))
+                # con peticiones en cadena solo se espera si el buffer de salida se llena
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # conexion cortada o mensaje invalido: se cierra solo esta conexion
+            pass
+        except asyncio.CancelledError:
+            # el servidor se esta cerrando (ctrl+c)
+            pass
+        finally:
+            escritor.close()
+
+
+async def iniciar_servidor(host, puerto, datos=None):
+    """carga los datos (si no se pasan) y empieza a escuchar; devuelve el asyncio.Server"""
+    bucle = asyncio.get_running_loop()
+    # los guardados agrupados se programan en el mismo bucle que atiende las peticiones
+    datos_controller.persistencia.programador = lambda ms, funcion: bucle.call_later(ms / 1000, funcion)
+    if datos is None:
+        datos = datos_controller.cargar_datos_locales()
+    servidor = ServidorDatos(datos)
+    return await asyncio.start_server(servidor.atender, host, puerto)
+
+
+async def servir(host, puerto):
+    """atiende peticiones hasta que se interrumpe el proceso"""
+    servidor = await iniciar_servidor(host, puerto)
+    direccion = servidor.sockets[0].getsockname()
+    print("servidor de datos en %s:%d" % (direccion[0], direccion[1]), flush=True)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def main():
+    configuracion = datos_controller.CONFIGURACION["servidor"]
+    parser = argparse.ArgumentParser(description="servidor local de datos")
+    parser.add_argument("--host", default=configuracion["host"])
+    parser.add_argument("--puerto", type=int, default=configuracion["puerto"])
+    argumentos = parser.parse_args()
+    try:
+        asyncio.run(servir(argumentos.host, argumentos.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        datos_controller.guardar_pendientes()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
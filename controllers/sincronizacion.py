@@ -0,0 +1,142 @@
+"""
+copia de los datos que se pone al dia pidiendo solo lo que cambio (ver controllers/cambios.py)
+
+la copia es un datos.json normal que guarda la secuencia, el origen y las lapidas del
+original, asi otra copia puede sincronizarse a su vez contra ella
+
+uso: python -m controllers.sincronizacion copia.json [--host 127.0.0.1] [--puerto 8765]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from controllers.repositorio import Datos
+from controllers.cambios import TIPO_USUARIO, TIPO_PROYECTO, TIPO_TAREA, anadir_lapidas
+from controllers.compartido import reemplazar_datos
+from controllers.persistencia import escribir_json_atomico
+from controllers.cliente_servidor import DatosRemotos
+from controllers.datos_controller import CONFIGURACION
+
+
+def copiar(registro):
+    """copia de un registro del delta (el original puede seguir cambiandolo si es local)"""
+    copia = dict(registro)
+    if "participantes" in copia:
+        copia["participantes"] = list(copia["participantes"])
+    return copia
+
+
+def fusionar(registros, cambiados, quitados):
+    """lista con los registros cambiados en su sitio, sin los quitados y con los nuevos al final"""
+    resultado = []
+    for registro in registros:
+        clave = registro.get("id")
+        if clave in quitados:
+            continue
+        resultado.append(cambiados.pop(clave, registro))
+    resultado.extend(cambiados.values())
+    return resultado
+
+
+def aplicar_cambios(datos, delta):
+    """aplica a una copia en memoria la respuesta de cambios_desde; devuelve datos
+
+    las tareas que pasan a la papelera (o vuelven de ella) cambian de lista, igual
+    que en el original; una que sale y vuelve entre dos sincronizaciones conserva su
+    sitio en la copia; con "completo" se sustituye todo
+    """
+    nuevos = dict(datos)
+    delta = dict(delta)
+    delta["usuarios"] = {usuario: copiar(info) for usuario, info in delta["usuarios"].items()}
+    for seccion in ("proyectos", "tareas", "papelera"):
+        delta[seccion] = [copiar(registro) for registro in delta[seccion]]
+    if delta["completo"]:
+        nuevos["usuarios"] = delta["usuarios"]
+        nuevos["proyectos"] = delta["proyectos"]
+        nuevos["tareas"] = delta["tareas"]
+        nuevos["papelera"] = delta["papelera"]
+        nuevos["lapidas"] = []
+        # lo anterior a la copia completa ya no se puede pedir a esta copia
+        nuevos["lapidas_desde"] = delta["hasta"]
+    else:
+        borrados = {TIPO_USUARIO: set(), TIPO_PROYECTO: set(), TIPO_TAREA: set()}
+        for tipo, clave, cambio in delta["lapidas"]:
+            borrados[tipo].add(clave)
+
+        usuarios = {}
+        for usuario, info in datos["usuarios"].items():
+            if usuario not in borrados[TIPO_USUARIO]:
+                usuarios[usuario] = info
+        usuarios.update(delta["usuarios"])
+        nuevos["usuarios"] = usuarios
+
+        nuevos["proyectos"] = fusionar(
+            datos["proyectos"],
+            {proyecto["id"]: proyecto for proyecto in delta["proyectos"]},
+            borrados[TIPO_PROYECTO]
+        )
+        activas = {tarea["id"]: tarea for tarea in delta["tareas"]}
+        papelera = {tarea["id"]: tarea for tarea in delta["papelera"]}
+        if len(borrados[TIPO_PROYECTO]) > 0:
+            # el almacen por fragmentos borra un proyecto sin lapida para cada tarea
+            borrados[TIPO_TAREA] |= {
+                tarea.get("id") for tarea in datos["tareas"] + datos["papelera"]
+                if tarea.get("proyecto_id") in borrados[TIPO_PROYECTO]
+            }
+        # una tarea que cambia de lista se quita de la otra
+        nuevos["tareas"] = fusionar(datos["tareas"], activas, borrados[TIPO_TAREA] | papelera.keys())
+        nuevos["papelera"] = fusionar(datos["papelera"], papelera, borrados[TIPO_TAREA] | activas.keys())
+        nuevos["lapidas"] = list(datos.get("lapidas", []))
+        anadir_lapidas(nuevos, [list(lapida) for lapida in delta["lapidas"]])
+
+    nuevos["secuencia_cambios"] = delta["hasta"]
+    nuevos["origen_cambios"] = delta["origen"]
+    reemplazar_datos(datos, nuevos)
+    return datos
+
+
+def sincronizar(datos, repositorio):
+    """pone al dia la copia datos con un repositorio (local o RepositorioRemoto); devuelve el delta"""
+    delta = repositorio.cambios_desde(datos.get("secuencia_cambios", 0), datos.get("origen_cambios"))
+    aplicar_cambios(datos, delta)
+    return delta
+
+
+def cargar_copia(ruta):
+    """datos de la copia guardada (vacia si aun no existe)"""
+    if not os.path.exists(ruta):
+        return Datos({"usuarios": {}, "proyectos": [], "tareas": [], "papelera": []})
+    archivo = open(ruta, "r", encoding="utf-8")
+    try:
+        return Datos(json.load(archivo))
+    finally:
+        archivo.close()
+
+
+def main():
+    configuracion = CONFIGURACION["servidor"]
+    parser = argparse.ArgumentParser(description="pone al dia una copia de los datos del servidor")
+    parser.add_argument("copia")
+    parser.add_argument("--host", default=configuracion["host"])
+    parser.add_argument("--puerto", type=int, default=configuracion["puerto"])
+    argumentos = parser.parse_args()
+
+    datos = cargar_copia(argumentos.copia)
+    remotos = DatosRemotos(argumentos.host, argumentos.puerto, 1)
+    try:
+        delta = sincronizar(datos, remotos.repositorio)
+    finally:
+        remotos.cerrar()
+    escribir_json_atomico(argumentos.copia, dict(datos))
+    print("copia al dia hasta el cambio %d%s: %d usuarios, %d proyectos, %d tareas, %d borrados" % (
+        delta["hasta"], " (completa)" if delta["completo"] else "",
+        len(delta["usuarios"]), len(delta["proyectos"]),
+        len(delta["tareas"]) + len(delta["papelera"]), len(delta["lapidas"])
+    ))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+tareas en memoria con __slots__ en lugar de un dict por tarea
+
+TareaCompacta se usa como el dict de siempre (tarea["titulo"], tarea.get("estado"),
+"eliminada" in tarea, dict(tarea)...) pero guarda cada campo conocido en un slot y
+comparte los textos repetidos: todas las tareas "pendiente" apuntan al mismo texto y
+todas las de un proyecto al mismo proyecto_nombre; una clave que no tiene slot va a
+un dict aparte que solo se crea si hace falta
+
+en json (datos.json, servidor) se escribe como un objeto normal con json_por_defecto
+"""
+
+# claves con slot, en el orden en que se recorren (el de crear_tarea)
+CAMPOS = (
+    "id", "titulo", "proyecto_id", "proyecto_nombre", "estado", "prioridad", "cambio", "eliminada", "completada"
+)
+CONJUNTO_CAMPOS = frozenset(CAMPOS)
+# claves de una tarea recien creada y de una ya sellada con su numero de cambio
+CLAVES_CREADA = CAMPOS[:6]
+CLAVES_SELLADA = CAMPOS[:7]
+
+# campos cuyo texto se comparte entre todas las tareas
+CAMPOS_INTERNADOS = ("proyecto_nombre", "estado", "prioridad")
+
+# valor de los slots sin asignar en getattr (None es un valor valido)
+AUSENTE = object()
+
+# texto -> el mismo texto: la primera copia que aparece es la que guardan todas
+TEXTOS = {}
+
+
+def internar(valor):
+    """devuelve la copia compartida de un texto (otros valores se devuelven tal cual)"""
+    if type(valor) is not str:
+        return valor
+    return TEXTOS.setdefault(valor, valor)
+
+
+class TareaCompacta:
+    """tarea con la interfaz de un dict; los campos que no tiene son slots sin asignar"""
+
+    __slots__ = CAMPOS + ("extra",)
+
+    def __init__(self, registro=()):
+        self.extra = None
+        for clave, valor in dict(registro).items():
+            self[clave] = valor
+
+    # lectura
+
+    def __getitem__(self, clave):
+        if clave in CONJUNTO_CAMPOS:
+            try:
+                return getattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave)
+        if self.extra is None:
+            raise KeyError(clave)
+        return self.extra[clave]
+
+    def get(self, clave, defecto=None):
+        if clave in CONJUNTO_CAMPOS:
+            return getattr(self, clave, defecto)
+        if self.extra is None:
+            return defecto
+        return self.extra.get(clave, defecto)
+
+    def __contains__(self, clave):
+        if clave in CONJUNTO_CAMPOS:
+            return hasattr(self, clave)
+        return self.extra is not None and clave in self.extra
+
+    def items(self):
+        pares = []
+        for campo in CAMPOS:
+            valor = getattr(self, campo, AUSENTE)
+            if valor is not AUSENTE:
+                pares.append((campo, valor))
+        if self.extra is not None:
+            pares.extend(self.extra.items())
+        return pares
+
+    def keys(self):
+        return [clave for clave, valor in self.items()]
+
+    def values(self):
+        return [valor for clave, valor in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+    def como_dict(self):
+        """dict normal con el mismo contenido"""
+        registro = {}
+        for campo in CAMPOS:
+            valor = getattr(self, campo, AUSENTE)
+            if valor is not AUSENTE:
+                registro[campo] = valor
+        if self.extra is not None:
+            registro.update(self.extra)
+        return registro
+
+    def __eq__(self, otro):
+        if isinstance(otro, TareaCompacta):
+            return self.items() == otro.items()
+        if isinstance(otro, dict):
+            return self.como_dict() == otro
+        return NotImplemented
+
+    def __ne__(self, otro):
+        igual = self.__eq__(otro)
+        return igual if igual is NotImplemented else not igual
+
+    # como un dict, no se puede usar de clave
+    __hash__ = None
+
+    def __repr__(self):
+        return "TareaCompacta(" + repr(self.como_dict()) + ")"
+
+    # escritura
+
+    def __setitem__(self, clave, valor):
+        if clave in CONJUNTO_CAMPOS:
+            if clave in CAMPOS_INTERNADOS:
+                valor = internar(valor)
+            setattr(self, clave, valor)
+            return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[clave] = valor
+
+    def __delitem__(self, clave):
+        if clave in CONJUNTO_CAMPOS:
+            try:
+                delattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave)
+            return
+        if self.extra is None:
+            raise KeyError(clave)
+        del self.extra[clave]
+        if len(self.extra) == 0:
+            self.extra = None
+
+    def pop(self, clave, *defecto):
+        if clave not in self:
+            if len(defecto) > 0:
+                return defecto[0]
+            raise KeyError(clave)
+        valor = self[clave]
+        del self[clave]
+        return valor
+
+    def setdefault(self, clave, defecto=None):
+        if clave not in self:
+            self[clave] = defecto
+        return self[clave]
+
+    def update(self, otro=(), **claves):
+        for clave, valor in dict(otro, **claves).items():
+            self[clave] = valor
+
+    def copy(self):
+        return TareaCompacta(self)
+
+
+def nueva_tarea(tarea_id, titulo, proyecto_id, proyecto_nombre, estado, prioridad):
+    """TareaCompacta recien creada (sin pasar por un dict)"""
+    tarea = TareaCompacta.__new__(TareaCompacta)
+    tarea.extra = None
+    tarea.id = tarea_id
+    tarea.titulo = titulo
+    tarea.proyecto_id = proyecto_id
+    tarea.proyecto_nombre = internar(proyecto_nombre)
+    tarea.estado = internar(estado)
+    tarea.prioridad = internar(prioridad)
+    return tarea
+
+
+def compactar(tarea):
+    """la tarea como TareaCompacta (las que ya lo son se devuelven tal cual)"""
+    if type(tarea) is TareaCompacta:
+        return tarea
+    cantidad = len(tarea)
+    if type(tarea) is dict and 6 <= cantidad <= 8 and tuple(tarea) == CAMPOS[:cantidad]:
+        # lo normal en datos.json: los campos en su orden, sin otras claves
+        valores = list(tarea.values())
+        compacta = nueva_tarea(*valores[:6])
+        if cantidad > 6:
+            compacta.cambio = valores[6]
+        if cantidad > 7:
+            compacta.eliminada = valores[7]
+        return compacta
+    return TareaCompacta(tarea)
+
+
+def compactar_lista(tareas):
+    """sustituye en la lista cada tarea por su TareaCompacta"""
+    # compactar() en linea para las tareas de siempre (con o sin "cambio"): con un
+    # millon de tareas las llamadas de mas se notan al cargar
+    nueva = TareaCompacta.__new__
+    compartido = TEXTOS.setdefault
+    for posicion, tarea in enumerate(tareas):
+        if type(tarea) is TareaCompacta:
+            continue
+        claves = tuple(tarea) if type(tarea) is dict else None
+        if claves != CLAVES_CREADA and claves != CLAVES_SELLADA:
+            tareas[posicion] = compactar(tarea)
+            continue
+        compacta = nueva(TareaCompacta)
+        compacta.extra = None
+        if len(claves) == 6:
+            compacta.id, compacta.titulo, compacta.proyecto_id, nombre, estado, prioridad = tarea.values()
+        else:
+            (compacta.id, compacta.titulo, compacta.proyecto_id, nombre, estado, prioridad,
+             compacta.cambio) = tarea.values()
+        try:
+            compacta.proyecto_nombre = compartido(nombre, nombre)
+            compacta.estado = compartido(estado, estado)
+            compacta.prioridad = compartido(prioridad, prioridad)
+        except TypeError:
+            # un valor raro (una lista) no se comparte
+            compacta = compactar(tarea)
+        tareas[posicion] = compacta
+
+
+def preparar_json(datos):
+    """copia superficial de datos con las listas de tareas en dict normales
+
+    json.dump escribe mucho mas rapido una lista de dict que una de tareas que
+    pasan una a una por json_por_defecto
+    """
+    preparados = {}
+    for clave, valor in datos.items():
+        if type(valor) is list and len(valor) > 0 and type(valor[0]) is TareaCompacta:
+            valor = [tarea.como_dict() if type(tarea) is TareaCompacta else tarea for tarea in valor]
+        preparados[clave] = valor
+    return preparados
+
+
+def json_por_defecto(valor):
+    """default= de json.dump/json.dumps para escribir las tareas compactas"""
+    if isinstance(valor, TareaCompacta):
+        return valor.como_dict()
+    raise TypeError("no se puede convertir a json: " + type(valor).__name__)
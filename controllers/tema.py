@@ -0,0 +1,25 @@
+"""
+tema visual comun (vistas/tema.qss) y cambio de propiedades dinamicas sin reinterpretar qss
+"""
+
+from controllers.datos_controller import obtener_ruta_vista
+
+
+ARCHIVO_TEMA = obtener_ruta_vista("tema.qss")
+
+
+def aplicar_tema(app):
+    """carga la hoja de estilos de la aplicacion (se interpreta una sola vez)"""
+    archivo = open(ARCHIVO_TEMA, "r", encoding="utf-8")
+    app.setStyleSheet(archivo.read())
+    archivo.close()
+
+
+def cambiar_propiedad(widget, nombre, valor):
+    """cambia una propiedad usada por el tema y vuelve a aplicar el estilo ya interpretado"""
+    if widget.property(nombre) == valor:
+        return
+    widget.setProperty(nombre, valor)
+    estilo = widget.style()
+    estilo.unpolish(widget)
+    estilo.polish(widget)
@@ -0,0 +1,74 @@
+"""
+informe de tiempos de arranque (inicio -> qt listo -> datos cargados -> login -> ventana principal)
+
+se activa con la variable de entorno ORGANIZADOR_TIEMPOS=1 o con el argumento --tiempos;
+el informe se escribe en la salida de errores al mostrarse la ventana principal
+
+este modulo debe ser el primer import de Main.py: su carga marca el inicio
+"""
+
+import os
+import sys
+import time
+
+
+INICIO = time.perf_counter()
+
+VARIABLE_ENTORNO = "ORGANIZADOR_TIEMPOS"
+ARGUMENTO = "--tiempos"
+
+
+def medicion_activada(argumentos=None):
+    """indica si se pidio el informe de tiempos"""
+    if argumentos is None:
+        argumentos = sys.argv
+    return os.environ.get(VARIABLE_ENTORNO, "") not in ("", "0") or ARGUMENTO in argumentos
+
+
+class TiemposArranque:
+    """guarda marcas de tiempo con nombre desde el inicio del proceso"""
+
+    def __init__(self, activado):
+        self.activado = activado
+        self.marcas = []
+        self.informado = False
+
+    def marcar(self, nombre):
+        """anota el momento actual con un nombre"""
+        if self.activado:
+            self.marcas.append((nombre, time.perf_counter()))
+
+    def marcar_al_mostrar(self, nombre, despues=None):
+        """anota el momento en que el bucle de eventos ya mostro lo pendiente"""
+        if not self.activado:
+            return
+        # import local: el modulo se importa antes que qt para marcar el inicio
+        from PyQt5.QtCore import QTimer
+
+        def marcar():
+            self.marcar(nombre)
+            if despues is not None:
+                despues()
+
+        QTimer.singleShot(0, marcar)
+
+    def informe(self):
+        """texto con el tiempo acumulado y el de cada etapa"""
+        lineas = ["tiempos de arranque (ms):"]
+        anterior = INICIO
+        for nombre, momento in self.marcas:
+            lineas.append("  %-28s %8.1f  (+%.1f)" % (nombre, (momento - INICIO) * 1000, (momento - anterior) * 1000))
+            anterior = momento
+        return "\n".join(lineas)
+
+    def mostrar_informe(self):
+        """escribe el informe una sola vez (sin consola no hay donde escribirlo)"""
+        if not self.activado or self.informado:
+            return
+        self.informado = True
+        if sys.stderr is not None:
+            sys.stderr.write(self.informe() + "\n")
+            sys.stderr.flush()
+
+
+tiempos = TiemposArranque(medicion_activada())
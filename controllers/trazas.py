@@ -0,0 +1,130 @@
+"""
+trazas de rendimiento: tramos anidados exportados en formato chrome trace (chrome://tracing, perfetto)
+
+se activa con ORGANIZADOR_TRAZAS=ruta.json (o =1 para un nombre con fecha) o con el
+argumento --trazas; sin activar, @trazar devuelve la funcion tal cual y tramo() no anota nada
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+
+
+VARIABLE_ENTORNO = "ORGANIZADOR_TRAZAS"
+ARGUMENTO = "--trazas"
+
+
+def ruta_traza_configurada(argumentos=None):
+    """archivo donde guardar la traza, o None si no se pidio"""
+    if argumentos is None:
+        argumentos = sys.argv
+    valor = os.environ.get(VARIABLE_ENTORNO, "")
+    if valor in ("", "0") and ARGUMENTO not in argumentos:
+        return None
+    if valor in ("", "0", "1"):
+        return os.path.abspath(time.strftime("traza-%Y%m%d-%H%M%S.json"))
+    return os.path.abspath(valor)
+
+
+RUTA_TRAZA = ruta_traza_configurada()
+ACTIVADO = RUTA_TRAZA is not None
+
+# eventos completos ("ph": "X") con tiempos en microsegundos
+eventos = []
+
+
+def reloj():
+    """microsegundos de un reloj monotono"""
+    return time.perf_counter_ns() // 1000
+
+
+def anotar(nombre, categoria, inicio, fin, argumentos=None):
+    """anade un tramo ya terminado"""
+    evento = {
+        "name": nombre,
+        "cat": categoria,
+        "ph": "X",
+        "ts": inicio,
+        "dur": fin - inicio,
+        "pid": os.getpid(),
+        "tid": threading.get_ident()
+    }
+    if argumentos:
+        evento["args"] = argumentos
+    # append de lista es atomico: sirve tambien para el hilo del compactador
+    eventos.append(evento)
+
+
+class Tramo:
+    """tramo medido con with; los anidados quedan dentro por sus tiempos"""
+
+    def __init__(self, nombre, categoria, argumentos):
+        self.nombre = nombre
+        self.categoria = categoria
+        self.argumentos = argumentos
+        self.inicio = None
+
+    def __enter__(self):
+        self.inicio = reloj()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        anotar(self.nombre, self.categoria, self.inicio, reloj(), self.argumentos)
+        return False
+
+
+class TramoNulo:
+    """tramo que no hace nada (trazas desactivadas)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        return False
+
+
+TRAMO_NULO = TramoNulo()
+
+
+def tramo(nombre, categoria="app", **argumentos):
+    """tramo para un bloque: with tramo("cargar_tareas", "vista", proyecto=1): ..."""
+    if not ACTIVADO:
+        return TRAMO_NULO
+    return Tramo(nombre, categoria, argumentos)
+
+
+def trazar(categoria):
+    """decorador que mide cada llamada a la funcion (sin coste si no esta activado)"""
+    def decorador(funcion):
+        if not ACTIVADO:
+            return funcion
+        nombre = funcion.__qualname__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = reloj()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                anotar(nombre, categoria, inicio, reloj())
+        return envoltura
+    return decorador
+
+
+def guardar_traza(ruta=None):
+    """escribe los tramos anotados hasta ahora en formato chrome trace"""
+    if ruta is None:
+        ruta = RUTA_TRAZA
+    archivo = open(ruta, "w", encoding="utf-8")
+    json.dump({"traceEvents": list(eventos), "displayTimeUnit": "ms"}, archivo)
+    archivo.close()
+    return ruta
+
+
+if ACTIVADO:
+    # la traza de la sesion se escribe al cerrar la aplicacion
+    atexit.register(guardar_traza)
@@ -0,0 +1,151 @@
+"""
+vistas .ui compiladas a clases python (como pyuic5) para no leer el xml al abrir cada vista
+
+en desarrollo los modulos se generan en vistas/compiladas y se rehacen cuando cambia
+el .ui; empaquetada se usan los que compilo app.spec y no se escribe nada. si no hay
+modulo se usa uic.loadUi como antes
+
+uso (para compilarlas antes de empaquetar): python -m controllers.vistas_compiladas
+"""
+
+import os
+import io
+import sys
+import hashlib
+import importlib.util
+from controllers.datos_controller import DIRECTORIO_VISTAS, obtener_ruta_vista
+from controllers.trazas import trazar, tramo
+
+
+DIRECTORIO_COMPILADAS = os.path.join(DIRECTORIO_VISTAS, "compiladas")
+
+# pyinstaller: la carpeta de vistas es de solo lectura (o temporal) y ya trae los modulos
+EMPAQUETADA = getattr(sys, "frozen", False)
+
+# primera linea de cada modulo generado, con la huella del .ui de origen
+PREFIJO_HUELLA = "# huella: "
+
+# nombre del .ui -> clase Ui_ ya importada (None si hay que usar loadUi)
+CLASES_VISTAS = {}
+
+
+def ruta_compilada(nombre):
+    """ruta del modulo python generado para un .ui"""
+    return os.path.join(DIRECTORIO_COMPILADAS, "ui_" + os.path.splitext(nombre)[0] + ".py")
+
+
+def calcular_huella(ruta):
+    """sha1 del contenido de un archivo"""
+    archivo = open(ruta, "rb")
+    huella = hashlib.sha1(archivo.read()).hexdigest()
+    archivo.close()
+    return huella
+
+
+def leer_huella(ruta):
+    """huella guardada en un modulo generado (o None)"""
+    archivo = open(ruta, "r", encoding="utf-8")
+    linea = archivo.readline().strip()
+    archivo.close()
+    if linea.startswith(PREFIJO_HUELLA):
+        return linea[len(PREFIJO_HUELLA):]
+    return None
+
+
+def esta_al_dia(nombre):
+    """indica si el modulo generado corresponde al .ui actual"""
+    ruta_ui = obtener_ruta_vista(nombre)
+    ruta_py = ruta_compilada(nombre)
+    if not os.path.exists(ruta_py):
+        return False
+    # lo normal: el modulo es mas nuevo que el .ui y no hace falta leer nada
+    if os.path.getmtime(ruta_py) >= os.path.getmtime(ruta_ui):
+        return True
+    # el .ui se toco (checkout, copia...) pero puede no haber cambiado
+    if leer_huella(ruta_py) == calcular_huella(ruta_ui):
+        os.utime(ruta_py)
+        return True
+    return False
+
+
+@trazar("vista")
+def compilar_vista(nombre):
+    """genera el modulo python de un .ui"""
+    # import local: uic (y su compilador) solo hace falta si hay que generar algo
+    from PyQt5 import uic
+    ruta_ui = obtener_ruta_vista(nombre)
+    ruta_py = ruta_compilada(nombre)
+    codigo = io.StringIO()
+    uic.compileUi(ruta_ui, codigo)
+
+    os.makedirs(DIRECTORIO_COMPILADAS, exist_ok=True)
+    temporal = ruta_py + ".tmp"
+    archivo = open(temporal, "w", encoding="utf-8")
+    archivo.write(PREFIJO_HUELLA + calcular_huella(ruta_ui) + "\n")
+    archivo.write(codigo.getvalue())
+    archivo.close()
+    os.replace(temporal, ruta_py)
+
+
+def compilar_vistas():
+    """genera los modulos de todos los .ui que no esten al dia"""
+    compiladas = []
+    for nombre in sorted(os.listdir(DIRECTORIO_VISTAS)):
+        if nombre.endswith(".ui") and not esta_al_dia(nombre):
+            compilar_vista(nombre)
+            compiladas.append(nombre)
+    return compiladas
+
+
+def importar_clase(nombre):
+    """importa la clase Ui_ del modulo generado de un .ui"""
+    ruta_py = ruta_compilada(nombre)
+    especificacion = importlib.util.spec_from_file_location(
+        "vistas_compiladas." + os.path.splitext(nombre)[0], ruta_py
+    )
+    modulo = importlib.util.module_from_spec(especificacion)
+    especificacion.loader.exec_module(modulo)
+    for clave in vars(modulo):
+        if clave.startswith("Ui_"):
+            return getattr(modulo, clave)
+    return None
+
+
+def obtener_clase(nombre):
+    """clase Ui_ de una vista, compilandola si hace falta (None si no se puede)"""
+    if nombre in CLASES_VISTAS:
+        return CLASES_VISTAS[nombre]
+
+    clase = None
+    try:
+        if not EMPAQUETADA and not esta_al_dia(nombre):
+            compilar_vista(nombre)
+        clase = importar_clase(nombre)
+    except Exception:
+        # carpeta sin permisos, .ui que uic no sabe compilar, modulo que no se
+        # empaqueto...: se usa loadUi
+        clase = None
+    CLASES_VISTAS[nombre] = clase
+    return clase
+
+
+def cargar_vista(nombre, widget):
+    """construye la vista de un .ui sobre el widget (equivale a uic.loadUi)"""
+    with tramo("cargar_vista", "vista", vista=nombre):
+        clase = obtener_clase(nombre)
+        if clase is None:
+            from PyQt5 import uic
+            with tramo("uic.loadUi", "vista", vista=nombre):
+                uic.loadUi(obtener_ruta_vista(nombre), widget)
+            return
+
+        interfaz = clase()
+        interfaz.setupUi(widget)
+        # loadUi deja cada objeto con nombre como atributo del widget
+        for clave, valor in vars(interfaz).items():
+            setattr(widget, clave, valor)
+
+
+if __name__ == "__main__":
+    for nombre in compilar_vistas():
+        print("compilada: " + nombre)
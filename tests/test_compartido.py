@@ -0,0 +1,167 @@
+"""
+dos instancias que escriben por turnos el mismo datos.json (ver controllers/compartido.py)
+
+cada instancia hace lo que hace datos_controller: cambia su repositorio, anota la
+operacion y al guardar mezcla lo que la otra escribiera entre medias
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from controllers.repositorio import Datos, CLAVE_ID_ARCHIVADO
+from controllers.persistencia import escribir_json_atomico
+from controllers.compartido import ArchivoCompartido, leer_archivo, CLAVE_VERSION
+from controllers.datos_controller import crear_datos_defecto, fechar_operacion, registro_operacion
+
+
+class Instancia:
+    """una instancia de la app: sus datos en memoria y lo que sabe de datos.json"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.compartido = ArchivoCompartido(espera_s=2)
+        self.compartido.al_cargar(ruta)
+        self.datos = Datos(leer_archivo(ruta)[0])
+
+    @property
+    def repositorio(self):
+        # al mezclar se cambia el repositorio de los datos
+        return self.datos.repositorio
+
+    def crear_tarea(self, titulo, proyecto_id):
+        tarea = self.repositorio.crear_tarea(titulo, proyecto_id, "media")
+        self.compartido.anotar("crear_tarea", (titulo, proyecto_id, "media", tarea["id"]))
+        return tarea
+
+    def cambiar_estado_tarea(self, tarea_id, estado, momento):
+        self.repositorio.cambiar_estado_tarea(tarea_id, estado, momento)
+        self.compartido.anotar("cambiar_estado_tarea", (tarea_id, estado, momento))
+
+    def aplicar_lote(self, operaciones, momento):
+        operaciones = [fechar_operacion(operacion, momento) for operacion in operaciones]
+        resultados = self.repositorio.aplicar_lote(operaciones)
+        registros = [
+            registro_operacion(operaciones[i][0], operaciones[i][1], resultados[i])
+            for i in range(len(resultados))
+        ]
+        self.compartido.anotar("aplicar_lote", (registros,))
+        return resultados
+
+    def sellar_completadas(self, momento):
+        if self.repositorio.sellar_completadas(momento) > 0:
+            self.compartido.anotar("sellar_completadas", (momento,))
+
+    def archivar_completadas(self, limite):
+        """quita las completadas antes de limite; devuelve los titulos (lo que iria al archivo)"""
+        tareas = self.repositorio.completadas_antes(limite)
+        ids = [tarea["id"] for tarea in tareas]
+        self.repositorio.archivar_tareas(ids)
+        self.compartido.anotar("archivar_tareas", (ids,))
+        return {tarea["titulo"] for tarea in tareas}
+
+    def guardar(self):
+        self.compartido.guardar(self.ruta, self.datos, escribir_json_atomico)
+
+    def recargar(self):
+        return self.compartido.recargar(self.ruta, self.datos)
+
+    def titulos(self):
+        return {tarea["titulo"] for tarea in self.datos["tareas"] + self.datos["papelera"]}
+
+    def ids(self):
+        return [tarea["id"] for tarea in self.datos["tareas"] + self.datos["papelera"]]
+
+
+class PruebaArchivoCompartido(unittest.TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp()
+        self.ruta = os.path.join(self.carpeta, "datos.json")
+        datos = Datos(crear_datos_defecto())
+        self.proyecto_id = datos.repositorio.crear_proyecto("compartido", "")["id"]
+        # una completada de antes del archivo de completadas: sin hora
+        vieja = datos.repositorio.crear_tarea("vieja", self.proyecto_id)
+        datos.repositorio.cambiar_estado_tarea(vieja["id"], "completada")
+        del vieja["completada"]
+        contenido = {CLAVE_VERSION: 1}
+        contenido.update(datos)
+        escribir_json_atomico(self.ruta, contenido)
+        self.a = Instancia(self.ruta)
+        self.b = Instancia(self.ruta)
+
+    def tearDown(self):
+        shutil.rmtree(self.carpeta)
+
+    def comprobar_iguales(self, titulos):
+        """las dos instancias, ya al dia, tienen las mismas tareas y ninguna se pierde"""
+        for instancia in (self.a, self.b):
+            instancia.recargar()
+            self.assertEqual(instancia.titulos(), titulos)
+            ids = instancia.ids()
+            self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(self.a.datos["tareas"], self.b.datos["tareas"])
+        self.assertEqual(self.a.datos.get(CLAVE_VERSION), self.b.datos.get(CLAVE_VERSION))
+
+    def test_turnos(self):
+        titulos = {"vieja"}
+        for turno in range(5):
+            for nombre, instancia in (("a", self.a), ("b", self.b)):
+                # cada una crea con el id que cree libre, sin haber visto lo de la otra
+                titulo = nombre + str(turno)
+                instancia.crear_tarea(titulo, self.proyecto_id)
+                instancia.guardar()
+                titulos.add(titulo)
+        self.comprobar_iguales(titulos)
+
+    def test_lotes(self):
+        creadas = self.a.aplicar_lote([("crear_tarea", ("a1", self.proyecto_id)), ("crear_tarea", ("a2", self.proyecto_id))], 100.0)
+        self.b.aplicar_lote([("crear_tarea", ("b1", self.proyecto_id)), ("crear_tarea", ("b2", self.proyecto_id))], 200.0)
+        self.a.guardar()
+        self.b.guardar()
+        # el lote de b hace referencia a una tarea de a con el id que le dio a
+        self.a.aplicar_lote([("cambiar_estado_tarea", (creadas[1]["id"], "completada"))], 300.0)
+        self.b.aplicar_lote([("crear_tarea", ("b3", self.proyecto_id)), ("eliminar_tarea", (creadas[0]["id"],))], 400.0)
+        self.b.guardar()
+        self.a.guardar()
+        self.comprobar_iguales({"vieja", "a1", "a2", "b1", "b2", "b3"})
+
+        for instancia in (self.a, self.b):
+            por_titulo = {tarea["titulo"]: tarea for tarea in instancia.datos["tareas"] + instancia.datos["papelera"]}
+            self.assertEqual(por_titulo["a2"]["completada"], 300.0)
+            self.assertEqual(por_titulo["a1"]["eliminada"], 400.0)
+
+    def test_sellado_y_archivo(self):
+        # las dos sellan la misma completada antigua con horas distintas: gana la primera en guardar
+        self.a.sellar_completadas(1000.0)
+        self.b.sellar_completadas(2000.0)
+        b1 = self.b.crear_tarea("b1", self.proyecto_id)
+        self.a.guardar()
+        self.b.guardar()
+        self.comprobar_iguales({"vieja", "b1"})
+        for instancia in (self.a, self.b):
+            vieja = [tarea for tarea in instancia.datos["tareas"] if tarea["titulo"] == "vieja"][0]
+            self.assertEqual(vieja["completada"], 1000.0)
+
+        # a archiva mientras b sigue creando y completando en lote
+        archivadas = self.a.archivar_completadas(1500.0)
+        self.assertEqual(archivadas, {"vieja"})
+        self.a.crear_tarea("a1", self.proyecto_id)
+        self.b.aplicar_lote([("crear_tarea", ("b2", self.proyecto_id)), ("cambiar_estado_tarea", (b1["id"], "completada"))], 3000.0)
+        self.b.guardar()
+        self.a.guardar()
+        self.comprobar_iguales({"b1", "b2", "a1"})
+        # la completada en el lote de b no entra en el archivo de a (es posterior)
+        self.assertEqual(self.a.repositorio.obtener_tarea(b1["id"])["completada"], 3000.0)
+
+        # el id de la archivada no se vuelve a dar a una tarea nueva
+        archivado = self.a.datos[CLAVE_ID_ARCHIVADO]
+        nueva = self.b.crear_tarea("b3", self.proyecto_id)
+        self.assertGreater(nueva["id"], archivado)
+        self.b.guardar()
+        self.comprobar_iguales({"b1", "b2", "a1", "b3"})
+
+
+if __name__ == "__main__":
+    unittest.main()